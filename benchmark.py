@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Benchmark - drives /collect, /challenge and /ws on a running collector at a
+target request rate and saves latency, throughput and error rates as JSON.
+
+Sessions are generated up front from the existing simulators, without sleeping:
+AdvancedHumanLikeAgent (human and scripted agent) runs on a virtual clock, and
+bot_simulator provides the perfect bot and the human-like payload. Each session
+becomes one /collect event and one drag-challenge trail. Requests follow an
+open-loop schedule, and latency is measured from each request's scheduled send
+time, so a slow collector shows up as latency instead of a lower request rate.
+/ws clients measure how long each record takes to reach them.
+
+    python benchmark.py --rps 200 --seconds 30 --ws-clients 4 --out bench.json
+    python benchmark.py --rps 200 --seconds 30 --baseline bench.json --max-regression 20
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+import websockets
+
+import bot_simulator
+from simulator import AdvancedHumanLikeAgent
+from trust_core.challenge import bezier_samples
+
+COLLECTOR_URL = "http://localhost:8080"
+KINDS = ('human', 'human_like', 'agent', 'perfect_bot')
+HUMAN_UA = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 Chrome/124.0'
+SID = '__SID__'  # replaced per request so every record can be matched on the feed
+
+class VirtualClock:
+    """time()/sleep() for AdvancedHumanLikeAgent that advance instantly."""
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def agent_event(human_like):
+    agent = AdvancedHumanLikeAgent('shopper', 'hunter2!', human_like=human_like, clock=VirtualClock())
+    agent.simulate_mouse_movement((random.randint(50, 400), random.randint(50, 400)), None, steps=random.randint(20, 60))
+    log = agent.run()
+    mouse = [{'x': e[1][0], 'y': e[1][1], 't': e[2] * 1000} for e in log if e[0] == 'mouse_move']
+    typed = agent.username + agent.password  # keystrokes are logged in typing order
+    stamps = [e[1] for e in log if e[0] == 'keystroke']
+    keys = [{'k': typed[i % len(typed)], 't': t * 1000} for i, t in enumerate(stamps)]
+    return {'behavior': {'mouse': mouse, 'keys': keys, 'paste_count': 0},
+            'env': {'ua': HUMAN_UA, 'flags': {}}}
+
+def simulator_event(payload):
+    flags = payload['env_flags']
+    return {'behavior': {'mouse': payload['mouse_movements'],
+                         'keys': [{'k': k['key'], 't': k['ts']} for k in payload['keystrokes']],
+                         'paste_count': 0},
+            'env': {'ua': flags['user_agent'], 'flags': {'headless': flags['headless']}}}
+
+def collect_event(kind):
+    if kind == 'human':
+        e = agent_event(True)
+    elif kind == 'agent':
+        e = agent_event(False)
+    elif kind == 'human_like':
+        e = simulator_event(bot_simulator.human_like_payload(SID))
+    else:
+        e = simulator_event(bot_simulator.perfect_bot_payload(SID))
+    amount = random.choice([20, 75, 120, 450, 1500, 5000])
+    return {'session_id': SID, 'ts': int(time.time() * 1000), 'channel': 'web', **e,
+            'journey': {'amount': str(amount), 'new_beneficiary': random.random() < 0.2}}
+
+def challenge_body(kind, points=120):
+    ps = {'start': {'x': 40, 'y': 180}, 'end': {'x': 600, 'y': 120},
+          'c1': {'x': random.randint(150, 250), 'y': 40}, 'c2': {'x': random.randint(380, 460), 'y': 320}}
+    xs, ys = bezier_samples(ps, points - 1)
+    if kind in ('agent', 'perfect_bot'):  # exact path, constant speed
+        trail = [{'x': float(x), 'y': float(y), 't': i * 10.0} for i, (x, y) in enumerate(zip(xs, ys))]
+    else:
+        t, trail = 0.0, []
+        for x, y in zip(xs, ys):
+            t += random.uniform(6, 22)
+            trail.append({'x': float(x) + random.gauss(0, 3), 'y': float(y) + random.gauss(0, 3), 't': t})
+    return {'session_id': SID, 'ts': int(time.time() * 1000), 'path_spec': ps, 'trail': trail,
+            'env_flags': {'headless': kind == 'perfect_bot'}}
+
+def build_pool(sessions, mix):
+    """Pre-serialized (kind, collect body, challenge body) so sending costs no encoding."""
+    kinds = random.choices(KINDS, weights=[mix[k] for k in KINDS], k=sessions)
+    return [(k, json.dumps(collect_event(k)).encode(), json.dumps(challenge_body(k)).encode()) for k in kinds]
+
+def pct(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * p))], 3)
+
+def summary(latencies, errors, seconds):
+    n = len(latencies) + errors
+    return {'requests': n, 'ok': len(latencies), 'errors': errors,
+            'error_rate': round(errors / n, 4) if n else 0.0,
+            'throughput_rps': round(len(latencies) / seconds, 1),
+            'latency_ms': {'p50': pct(latencies, .50), 'p95': pct(latencies, .95), 'p99': pct(latencies, .99),
+                           'max': round(max(latencies), 3) if latencies else None,
+                           'mean': round(sum(latencies) / len(latencies), 3) if latencies else None}}
+
+class Run:
+    def __init__(self, args):
+        self.args = args
+        self.run_id = f"bench{int(time.time())}"
+        self.latencies = {'collect': [], 'challenge': []}
+        self.errors = {'collect': 0, 'challenge': 0}
+        self.outcomes = {}  # kind -> {action or challenge_passed/failed: n}
+        self.sent = {}  # session_id -> scheduled send time, for /ws delivery latency
+        self.ws_latencies, self.ws_received, self.ws_errors = [], 0, 0
+        self.measuring = False
+        self.late = 0
+
+    def count(self, kind, key):
+        o = self.outcomes.setdefault(kind, {})
+        o[key] = o.get(key, 0) + 1
+
+    async def one(self, client, endpoint, kind, body, sid, scheduled):
+        try:
+            r = await client.post(f"{self.args.url}/{endpoint}", content=body.replace(SID.encode(), sid.encode()),
+                                  headers={'Content-Type': 'application/json'})
+            r.raise_for_status()
+            res = r.json()
+            if endpoint == 'collect' and not res.get('ok'):
+                raise RuntimeError(res.get('error'))
+        except Exception:
+            if self.measuring: self.errors[endpoint] += 1
+            return
+        if not self.measuring: return
+        self.latencies[endpoint].append((time.perf_counter() - scheduled) * 1000)
+        if endpoint == 'collect':
+            self.count(kind, (res.get('decision') or {}).get('action'))
+        else:
+            self.count(kind, 'challenge_passed' if res.get('passed') else 'challenge_failed')
+
+    async def ws_client(self, stop):
+        url = self.args.url.replace('http', 'ws', 1) + '/ws'
+        try:
+            async with websockets.connect(url, max_queue=None) as ws:
+                if self.args.ws_subscribe:
+                    await ws.send(self.args.ws_subscribe)
+                while not stop.is_set():
+                    try:
+                        msg = await asyncio.wait_for(ws.recv(), 0.5)
+                    except asyncio.TimeoutError:
+                        continue
+                    now = time.perf_counter()
+                    sid = json.loads(msg).get('session_id')
+                    scheduled = self.sent.get(sid)
+                    if scheduled is not None and self.measuring:
+                        self.ws_received += 1
+                        self.ws_latencies.append((now - scheduled) * 1000)
+        except Exception:
+            self.ws_errors += 1
+
+    async def drive(self, client, pool):
+        a = self.args
+        total = int(a.rps * (a.warmup + a.seconds))
+        warm = int(a.rps * a.warmup)
+        tasks = []
+        start = time.perf_counter()
+        for i in range(total):
+            scheduled = start + i / a.rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif delay < -0.05:
+                self.late += i >= warm
+            if i == warm:
+                self.measuring = True
+                measure_start = scheduled
+            kind, collect, challenge = pool[i % len(pool)]
+            endpoint, body = ('challenge', challenge) if random.random() < a.challenge_ratio else ('collect', collect)
+            sid = f"{self.run_id}-{kind}-{i}"
+            self.sent[sid] = scheduled
+            tasks.append(asyncio.create_task(self.one(client, endpoint, kind, body, sid, scheduled)))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - measure_start
+
+async def run(args):
+    random.seed(args.seed)
+    mix = dict(zip(KINDS, (float(x) for x in args.mix.split(','))))
+    t = time.perf_counter()
+    pool = build_pool(args.sessions, mix)
+    print(f"🧪 {len(pool)} sessions generated in {time.perf_counter() - t:.1f}s; "
+          f"driving {args.url} at {args.rps:g} rps for {args.seconds:g}s (+{args.warmup:g}s warmup), "
+          f"{args.challenge_ratio:.0%} challenges, {args.ws_clients} /ws clients")
+    bench = Run(args)
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        stop = asyncio.Event()
+        ws_tasks = [asyncio.create_task(bench.ws_client(stop)) for _ in range(args.ws_clients)]
+        await asyncio.sleep(0.2 if ws_tasks else 0)  # let the feed clients connect first
+        elapsed = await bench.drive(client, pool)
+        await asyncio.sleep(args.ws_drain if ws_tasks else 0)
+        stop.set()
+        await asyncio.gather(*ws_tasks)
+        try:
+            collector_stats = (await client.get(f"{args.url}/stats")).json()
+        except Exception as e:
+            collector_stats = {'error': str(e)}
+    ok = sum(len(v) for v in bench.latencies.values())
+    errors = sum(bench.errors.values())
+    return {
+        'label': args.label, 'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'config': {k: v for k, v in vars(args).items() if k not in ('out', 'baseline')},
+        'elapsed_s': round(elapsed, 3),
+        'achieved_rps': round((ok + errors) / elapsed, 1),
+        'late_sends': bench.late,
+        'endpoints': {name: summary(bench.latencies[name], bench.errors[name], elapsed) for name in bench.latencies},
+        'total': summary([x for v in bench.latencies.values() for x in v], errors, elapsed),
+        'ws': {'clients': args.ws_clients, 'errors': bench.ws_errors, 'received': bench.ws_received,
+               'expected': ok * args.ws_clients if not args.ws_subscribe else None,
+               'delivery_ms': {'p50': pct(bench.ws_latencies, .50), 'p95': pct(bench.ws_latencies, .95),
+                               'p99': pct(bench.ws_latencies, .99)}},
+        'outcomes': bench.outcomes,
+        'collector_stats': collector_stats,
+    }
+
+def compare(result, baseline, max_regression):
+    """Print p50/p95/p99 and throughput against a saved run; returns the regressions over the limit."""
+    regressions = []
+    print(f"📈 vs baseline {baseline.get('label') or baseline.get('started_at')}:")
+    for name, cur in result['endpoints'].items():
+        old = baseline.get('endpoints', {}).get(name)
+        if not old: continue
+        for p in ('p50', 'p95', 'p99'):
+            a, b = old['latency_ms'][p], cur['latency_ms'][p]
+            if not a or b is None: continue
+            change = (b - a) / a * 100
+            print(f"  {name:<10} {p}: {a:8.1f} -> {b:8.1f} ms ({change:+.1f}%)")
+            if max_regression is not None and change > max_regression:
+                regressions.append(f"{name} {p} {change:+.1f}%")
+        a, b = old['throughput_rps'], cur['throughput_rps']
+        print(f"  {name:<10} throughput: {a} -> {b} rps")
+    return regressions
+
+def report(result):
+    print("📊 Results:")
+    for name, s in [*result['endpoints'].items(), ('total', result['total'])]:
+        l = s['latency_ms']
+        fmt = lambda v: f"{v:7.1f}ms" if v is not None else "      -  "
+        print(f"{name:<10} n={s['requests']:<6} err={s['error_rate']:<7.2%} {s['throughput_rps']:7.1f}/s "
+              f"p50={fmt(l['p50'])} p95={fmt(l['p95'])} p99={fmt(l['p99'])}")
+    ws = result['ws']
+    if ws['clients']:
+        d = ws['delivery_ms']
+        print(f"{'ws':<10} received={ws['received']} expected={ws['expected']} errors={ws['errors']} "
+              f"delivery p50={d['p50']}ms p95={d['p95']}ms p99={d['p99']}ms")
+    print(f"achieved {result['achieved_rps']} rps, {result['late_sends']} sends more than 50ms late")
+    for kind, o in sorted(result['outcomes'].items()):
+        print(f"  {kind:<12} {o}")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--url', default=COLLECTOR_URL)
+    ap.add_argument('--rps', type=float, default=100, help='target requests per second, all endpoints together')
+    ap.add_argument('--seconds', type=float, default=20)
+    ap.add_argument('--warmup', type=float, default=2, help='seconds sent before measuring starts')
+    ap.add_argument('--challenge-ratio', type=float, default=0.2, help='fraction of requests that are /challenge')
+    ap.add_argument('--mix', default='0.4,0.2,0.2,0.2', help=f"session weights for {','.join(KINDS)}")
+    ap.add_argument('--sessions', type=int, default=500, help='distinct generated sessions, replayed round robin')
+    ap.add_argument('--ws-clients', type=int, default=2)
+    ap.add_argument('--ws-subscribe', help='subscription message sent by each /ws client, e.g. \'{"kinds": ["attempt"]}\'')
+    ap.add_argument('--ws-drain', type=float, default=1.0, help='seconds to wait for trailing /ws messages')
+    ap.add_argument('--connections', type=int, default=200)
+    ap.add_argument('--timeout', type=float, default=30)
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--label', default='', help='build or commit name stored with the results')
+    ap.add_argument('--out', default='benchmark.json')
+    ap.add_argument('--baseline', help='a previous --out file to compare against')
+    ap.add_argument('--max-regression', type=float, help='exit 1 if any percentile is this many %% slower than --baseline')
+    args = ap.parse_args()
+
+    result = asyncio.run(run(args))
+    report(result)
+    with open(args.out, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"💾 saved {args.out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.max_regression)
+        if regressions:
+            print(f"❌ regressions over {args.max_regression:g}%: {', '.join(regressions)}")
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -11,10 +11,8 @@ import random
 
 COLLECTOR_URL = "http://localhost:8080"
 
-def simulate_perfect_bot():
-    """Simulates a bot with perfect timing and movements"""
-    print("🤖 Simulating Perfect Bot...")
-    
+def perfect_bot_payload(session_id='bot_perfect'):
+    """A /behavioral_analysis payload with perfect timing and movements"""
     # Perfect keystroke timing
     keystrokes = []
     for i, key in enumerate(['h', 'e', 'l', 'l', 'o']):
@@ -40,9 +38,9 @@ def simulate_perfect_bot():
         {'type': 'click', 'ts': 1100, 'x': 200, 'y': 100}  # Exactly 100ms apart
     ]
     
-    response = requests.post(f"{COLLECTOR_URL}/behavioral_analysis", json={
+    return {
         'ts': int(time.time() * 1000),
-        'session_id': 'bot_perfect',
+        'session_id': session_id,
         'keystrokes': keystrokes,
         'mouse_movements': mouse_movements,
         'timing_events': timing_events,
@@ -52,17 +50,19 @@ def simulate_perfect_bot():
             'user_agent': 'HeadlessChrome/91.0.4472.124',
             'plugins_enabled': False
         }
-    })
-    
+    }
+
+def simulate_perfect_bot():
+    """Simulates a bot with perfect timing and movements"""
+    print("🤖 Simulating Perfect Bot...")
+    response = requests.post(f"{COLLECTOR_URL}/behavioral_analysis", json=perfect_bot_payload())
     result = response.json()
     print(f"Agent Probability: {result['agent_probability']}")
     print(f"Verdict: {result['verdict']}")
     return result
 
-def simulate_human_like():
-    """Simulates more human-like behavior with natural variations"""
-    print("👤 Simulating Human-like Behavior...")
-    
+def human_like_payload(session_id='human_like'):
+    """A /behavioral_analysis payload with natural variations"""
     # Variable keystroke timing
     keystrokes = []
     base_time = 1000
@@ -92,9 +92,9 @@ def simulate_human_like():
         {'type': 'click', 'ts': 1000 + random.randint(300, 800), 'x': 200, 'y': 100}
     ]
     
-    response = requests.post(f"{COLLECTOR_URL}/behavioral_analysis", json={
+    return {
         'ts': int(time.time() * 1000),
-        'session_id': 'human_like',
+        'session_id': session_id,
         'keystrokes': keystrokes,
         'mouse_movements': mouse_movements,
         'timing_events': timing_events,
@@ -104,8 +104,12 @@ def simulate_human_like():
             'user_agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
             'plugins_enabled': True
         }
-    })
-    
+    }
+
+def simulate_human_like():
+    """Simulates more human-like behavior with natural variations"""
+    print("👤 Simulating Human-like Behavior...")
+    response = requests.post(f"{COLLECTOR_URL}/behavioral_analysis", json=human_like_payload())
     result = response.json()
     print(f"Agent Probability: {result['agent_probability']}")
     print(f"Verdict: {result['verdict']}")
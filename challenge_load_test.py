@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Challenge Load Test - measures /collect tail latency alone and while
+heavy /challenge traffic runs against the same collector.
+
+Phase 1 sends /collect at a fixed rate on its own. Phase 2 repeats it while
+several workers post long drag trails to /challenge back to back. Compare the
+percentiles of the two phases; with EXECUTOR=process and spare cores for the
+workers (and for this script) they should be close.
+
+    python challenge_load_test.py --rps 50 --seconds 10 --challengers 8
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+from trust_core.challenge import bezier_samples
+
+COLLECTOR_URL = "http://localhost:8080"
+
+def attempt_event(i):
+    t0 = 1000.0
+    return {
+        'session_id': f'load_{i}', 'ts': int(time.time() * 1000), 'channel': 'web',
+        'env': {'ua': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/124.0', 'flags': {}},
+        'behavior': {
+            'mouse': [{'x': 100 + j * 3 + random.randint(-2, 2), 'y': 200 + random.randint(-4, 4), 't': t0 + j * 16.7} for j in range(200)],
+            'keys': [{'k': random.choice('abcdef'), 't': t0 + j * random.randint(80, 200)} for j in range(30)],
+            'paste_count': 0,
+        },
+        'journey': {'amount': '120', 'new_beneficiary': False},
+    }
+
+def heavy_challenge(points):
+    ps = {'start': {'x': 40, 'y': 180}, 'end': {'x': 600, 'y': 120}, 'c1': {'x': 200, 'y': 40}, 'c2': {'x': 420, 'y': 320}}
+    xs, ys = bezier_samples(ps, points - 1)
+    trail = [{'x': float(x) + random.gauss(0, 3), 'y': float(y) + random.gauss(0, 3), 't': i * 8.0 + random.random() * 6}
+             for i, (x, y) in enumerate(zip(xs, ys))]
+    return {'session_id': 'load_challenge', 'ts': int(time.time() * 1000), 'path_spec': ps, 'trail': trail, 'env_flags': {}}
+
+def pct(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+async def collect_phase(client, url, rps, seconds):
+    latencies, errors, tasks = [], 0, []
+
+    async def one(i):
+        nonlocal errors
+        t = time.perf_counter()
+        try:
+            r = await client.post(f"{url}/collect", json=attempt_event(i))
+            r.raise_for_status()
+            latencies.append((time.perf_counter() - t) * 1000)
+        except Exception:
+            errors += 1
+
+    start = time.perf_counter()
+    for i in range(int(rps * seconds)):
+        delay = start + i / rps - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(i)))
+    await asyncio.gather(*tasks)
+    return latencies, errors
+
+async def challenger(client, url, body, stop, done):
+    headers = {'Content-Type': 'application/json'}
+    while not stop.is_set():
+        try:
+            r = await client.post(f"{url}/challenge", content=body, headers=headers)
+            r.raise_for_status()
+            done[0] += 1
+        except Exception:
+            done[1] += 1
+
+def report(name, latencies, errors):
+    print(f"{name:<22} n={len(latencies):<5} err={errors:<3} "
+          f"p50={pct(latencies, .50):7.1f}ms p95={pct(latencies, .95):7.1f}ms p99={pct(latencies, .99):7.1f}ms")
+
+async def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--url', default=COLLECTOR_URL)
+    ap.add_argument('--rps', type=float, default=50)
+    ap.add_argument('--seconds', type=float, default=10)
+    ap.add_argument('--challengers', type=int, default=8)
+    ap.add_argument('--trail-points', type=int, default=2000)
+    args = ap.parse_args()
+
+    limits = httpx.Limits(max_connections=200, max_keepalive_connections=200)
+    async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+        print(f"🔍 /collect at {args.rps:g} rps for {args.seconds:g}s, then again with "
+              f"{args.challengers} challengers posting {args.trail_points}-point trails")
+        baseline = await collect_phase(client, args.url, args.rps, args.seconds)
+
+        # Serialized once so the load generator spends its CPU on sending, not encoding
+        body = json.dumps(heavy_challenge(args.trail_points)).encode()
+        stop, done = asyncio.Event(), [0, 0]
+        workers = [asyncio.create_task(challenger(client, args.url, body, stop, done)) for _ in range(args.challengers)]
+        loaded = await collect_phase(client, args.url, args.rps, args.seconds)
+        stop.set()
+        await asyncio.gather(*workers)
+
+        print("📊 Results:")
+        report('collect alone', *baseline)
+        report('collect + challenges', *loaded)
+        print(f"challenges completed={done[0]} errors={done[1]} ({done[0] / args.seconds:.1f}/s)")
+        stats = (await client.get(f"{args.url}/stats")).json()
+        print(f"executor: {stats.get('executor')}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
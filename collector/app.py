@@ -1,131 +1,484 @@
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Header, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import os, json, httpx, time, statistics, asyncio
+from fastapi.responses import JSONResponse, Response
+from contextlib import asynccontextmanager
+import os, json, httpx, time, asyncio, uuid
+from trust_core import detection, features, metrics, model, policy, tracing
+from trust_core import challenge as challenge_mod
+from trust_core.sessions import SessionStore
+from trust_core.online import TelemetryStore
+from event_writer import EventWriter, JsonlSink, SegmentSink
+from offload import Offloader
+from decision_cache import DecisionCache
+from shadow import ShadowEvaluator, load_shadow_configs
+from ws_fanout import Fanout
+from feed_bus import make_bus
 
 FEATURE_SVC = os.getenv('FEATURE_SVC', 'http://feature_svc:8000')
 MODELS_SVC = os.getenv('MODELS_SVC', 'http://models_svc:8000')
 POLICY_SVC = os.getenv('POLICY_SVC', 'http://policy_svc:8000')
 EVENTS_FILE = os.getenv('EVENTS_FILE', '/data/events.jsonl')
+# 'jsonl' appends to EVENTS_FILE; 'segments' writes a rotating msgpack log under EVENTS_DIR
+EVENTS_FORMAT = os.getenv('EVENTS_FORMAT', 'jsonl')
+EVENTS_DIR = os.getenv('EVENTS_DIR', '/data/events')
+SEGMENT_MAX_BYTES = int(os.getenv('SEGMENT_MAX_BYTES', str(64*1024*1024)))
+SEGMENT_MAX_AGE_S = float(os.getenv('SEGMENT_MAX_AGE_S', '3600'))
+RETENTION_SEGMENTS = int(os.getenv('RETENTION_SEGMENTS', '0'))
+RETENTION_AGE_S = float(os.getenv('RETENTION_AGE_S', '0'))
+# Bezier samples per challenge path (the curve is sampled at CHALLENGE_SAMPLES + 1 points)
+CHALLENGE_SAMPLES = int(os.getenv('CHALLENGE_SAMPLES', '100'))
+# CPU-bound work (challenge parsing and geometry) runs on 'process', 'thread' or 'inline' executors
+EXECUTOR = os.getenv('EXECUTOR', 'process')
+EXECUTOR_WORKERS = int(os.getenv('EXECUTOR_WORKERS', '0'))  # 0 = one per CPU
+# Event log durability: 'record' (fsync each), 'group' (fsync per batch) or 'os' (no fsync)
+EVENTS_DURABILITY = os.getenv('EVENTS_DURABILITY', 'group')
+EVENTS_BATCH_MAX = int(os.getenv('EVENTS_BATCH_MAX', '256'))
+EVENTS_BATCH_DELAY_MS = float(os.getenv('EVENTS_BATCH_DELAY_MS', '5'))
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', '10000'))
+# Live feed: per-client outbound queue size, what to do when it fills ('drop_oldest',
+# 'drop_newest' or 'evict') and how long a single send may take before the client is dropped
+WS_QUEUE_SIZE = int(os.getenv('WS_QUEUE_SIZE', '256'))
+WS_SLOW_POLICY = os.getenv('WS_SLOW_POLICY', 'drop_oldest')
+WS_SEND_TIMEOUT = float(os.getenv('WS_SEND_TIMEOUT', '5.0'))
+# Live-feed bus between collector processes: 'local' (one process) or 'unix' (all workers
+# or replicas sharing FEED_BUS_PATH on one host see the whole feed)
+FEED_BUS = os.getenv('FEED_BUS', 'local')
+FEED_BUS_PATH = os.getenv('FEED_BUS_PATH', '/tmp/collector-feed.sock')
+FEED_BUS_MAX_BUFFER = int(os.getenv('FEED_BUS_MAX_BUFFER', str(8*1024*1024)))
+# Per-session sliding windows (attempts, amounts, decisions, challenge outcomes) fed to scoring
+SESSION_STATE = os.getenv('SESSION_STATE', '1') == '1'
+SESSION_WINDOW_S = float(os.getenv('SESSION_WINDOW_S', '60'))
+SESSION_TTL_S = float(os.getenv('SESSION_TTL_S', '1800'))
+SESSION_MAX = int(os.getenv('SESSION_MAX', '100000'))
+SESSION_CAPACITY = int(os.getenv('SESSION_CAPACITY', '64'))
+# Streaming telemetry: per-session incremental behaviour features fed by /telemetry, used
+# by /collect for events marked behavior.streamed instead of featurizing a snapshot
+TELEMETRY_STREAM = os.getenv('TELEMETRY_STREAM', '1') == '1'
+TELEMETRY_TTL_S = float(os.getenv('TELEMETRY_TTL_S', '1800'))
+TELEMETRY_MAX_SESSIONS = int(os.getenv('TELEMETRY_MAX_SESSIONS', '100000'))
+# Content-addressed cache of features and decisions for repeated payloads; entries are
+# tied to the feature/model/policy versions. In http mode every stage response carries its
+# version, and the versions are also polled every DECISION_CACHE_POLL_S
+DECISION_CACHE = os.getenv('DECISION_CACHE', '0') == '1'
+DECISION_CACHE_SIZE = int(os.getenv('DECISION_CACHE_SIZE', '10000'))
+DECISION_CACHE_TTL_S = float(os.getenv('DECISION_CACHE_TTL_S', '300'))
+DECISION_CACHE_POLL_S = float(os.getenv('DECISION_CACHE_POLL_S', '1.0'))
+# Shadow evaluation: a JSON list of candidate configs (scoring weights and/or a policy rules
+# file) evaluated off the request path; attempts are shed when the queue is full
+SHADOW_CONFIG = os.getenv('SHADOW_CONFIG', '')
+SHADOW_QUEUE_SIZE = int(os.getenv('SHADOW_QUEUE_SIZE', '1000'))
+SHADOW_BATCH_MAX = int(os.getenv('SHADOW_BATCH_MAX', '256'))
+# 'http' calls feature/models/policy services; 'fused' runs the same stages in-process
+PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'http')
+# Request tracing: the fraction of /collect calls traced (0 = off); traces slower than
+# TRACE_SLOW_MS, with a stack sample every TRACE_PROFILE_MS (0 = no profile), are kept
+# in a ring buffer of TRACE_BUFFER entries behind /admin/traces
+TRACE_SAMPLE = float(os.getenv('TRACE_SAMPLE', '0'))
+TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', '250'))
+TRACE_PROFILE_MS = float(os.getenv('TRACE_PROFILE_MS', '5'))
+TRACE_BUFFER = int(os.getenv('TRACE_BUFFER', '100'))
+# Comma-separated CIDRs of internal callers whose X-Trace-Id is honoured (always traced, spans
+# only); other clients' IDs are ignored and TRACE_SAMPLE applies. Empty = trust no one.
+TRACE_TRUSTED_NETS = [n.strip() for n in os.getenv('TRACE_TRUSTED_NETS', '').split(',') if n.strip()]
 
-app = FastAPI(title="Collector + WS")
-app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+# Downstream HTTP client: one pooled client per process, reused across requests
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_KEEPALIVE = int(os.getenv('HTTP_MAX_KEEPALIVE', '20'))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '30'))
+HTTP_POOL_TIMEOUT = float(os.getenv('HTTP_POOL_TIMEOUT', '1.0'))
+HTTP2 = os.getenv('HTTP2', '0') == '1'
+HOP_TIMEOUTS = {
+    'featurize': float(os.getenv('FEATURE_TIMEOUT', '2.0')),
+    'score': float(os.getenv('MODELS_TIMEOUT', '1.0')),
+    'decide': float(os.getenv('POLICY_TIMEOUT', '1.0')),
+}
 
-class WSManager:
+class HopStats:
+    """Per-hop latency counters plus pool saturation for the shared client."""
     def __init__(self):
-        self.active = set()
-        self.lock = asyncio.Lock()
-    async def connect(self, ws: WebSocket):
-        await ws.accept()
-        async with self.lock:
-            self.active.add(ws)
-    async def disconnect(self, ws: WebSocket):
-        async with self.lock:
-            self.active.discard(ws)
-    async def broadcast(self, message: dict):
-        data = json.dumps(message)
-        async with self.lock:
-            dead = []
-            for ws in list(self.active):
-                try:
-                    await ws.send_text(data)
-                except Exception:
-                    dead.append(ws)
-            for ws in dead:
-                self.active.discard(ws)
-
-ws_manager = WSManager()
+        self.hops = {name: {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0} for name in HOP_TIMEOUTS}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.pool_timeouts = 0
+    def start(self):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+    def finish(self, hop: str, ms: float, ok: bool):
+        self.in_flight -= 1
+        h = self.hops[hop]
+        h['count'] += 1
+        h['total_ms'] += ms
+        h['max_ms'] = max(h['max_ms'], ms)
+        if not ok: h['errors'] += 1
+    def snapshot(self):
+        hops = {name: {**h, 'avg_ms': round(h['total_ms']/h['count'], 3) if h['count'] else 0.0,
+                       'total_ms': round(h['total_ms'], 3), 'max_ms': round(h['max_ms'], 3)}
+                for name, h in self.hops.items()}
+        return {'hops': hops,
+                'pool': {'max_connections': HTTP_MAX_CONNECTIONS, 'max_keepalive': HTTP_MAX_KEEPALIVE,
+                         'in_flight': self.in_flight, 'peak_in_flight': self.peak_in_flight,
+                         'saturation': round(self.in_flight/HTTP_MAX_CONNECTIONS, 3),
+                         'pool_timeouts': self.pool_timeouts, 'http2': HTTP2},
+                'mode': PIPELINE_MODE}
+
+hop_stats = HopStats()
+tracer = tracing.Tracer(TRACE_SAMPLE, TRACE_SLOW_MS, TRACE_PROFILE_MS, TRACE_BUFFER, TRACE_TRUSTED_NETS)
+decision_cache = DecisionCache(DECISION_CACHE_SIZE, DECISION_CACHE_TTL_S) if DECISION_CACHE else None
+session_store = SessionStore(window_s=SESSION_WINDOW_S, ttl_s=SESSION_TTL_S, max_sessions=SESSION_MAX,
+                             capacity=SESSION_CAPACITY) if SESSION_STATE else None
+telemetry_store = TelemetryStore(TELEMETRY_TTL_S, TELEMETRY_MAX_SESSIONS) if TELEMETRY_STREAM else None
+offloader = Offloader(EXECUTOR, EXECUTOR_WORKERS)
+http_client: httpx.AsyncClient = None
+def _event_sink():
+    if EVENTS_FORMAT == 'segments':
+        return SegmentSink(EVENTS_DIR, max_bytes=SEGMENT_MAX_BYTES, max_age_s=SEGMENT_MAX_AGE_S,
+                           retention_segments=RETENTION_SEGMENTS, retention_age_s=RETENTION_AGE_S)
+    return JsonlSink(EVENTS_FILE)
+
+event_writer = EventWriter(_event_sink(), durability=EVENTS_DURABILITY, max_batch=EVENTS_BATCH_MAX,
+                           max_delay_ms=EVENTS_BATCH_DELAY_MS, queue_size=EVENTS_QUEUE_SIZE)
+# Shadow records are best effort: they may use at most half the writer queue and are shed
+# beyond that, so a lagging evaluator never makes /collect wait for queue space
+shadow = ShadowEvaluator(load_shadow_configs(SHADOW_CONFIG),
+                         lambda rec: event_writer.offer(rec, headroom=EVENTS_QUEUE_SIZE//2),
+                         queue_size=SHADOW_QUEUE_SIZE, max_batch=SHADOW_BATCH_MAX) if SHADOW_CONFIG else None
+
+# Hot-path timings go to pre-bound histogram children; everything already counted in a
+# stats() dict is read at scrape time instead
+STAGE = {name: metrics.STAGE_SECONDS.labels(name)
+         for name in ('featurize', 'score', 'decide', 'session', 'pipeline', 'event_write', 'publish', 'challenge',
+                      'telemetry_ingest', 'stream_features', 'behavioral_analysis', 'contextual_challenge')}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client
+    http_client = httpx.AsyncClient(
+        http2=HTTP2,
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY),
+        timeout=httpx.Timeout(5.0, pool=HTTP_POOL_TIMEOUT))
+    await event_writer.start()
+    offloader.start()
+    await feed_bus.start()
+    if shadow is not None:
+        await shadow.start()
+    version_watch = asyncio.create_task(_watch_versions()) if decision_cache is not None and PIPELINE_MODE != 'fused' else None
+    try:
+        yield
+    finally:
+        if version_watch is not None:
+            version_watch.cancel()
+        if shadow is not None:
+            await shadow.stop()
+        await feed_bus.stop()
+        await event_writer.stop()
+        offloader.shutdown()
+        await http_client.aclose()
+        http_client = None
+
+app = FastAPI(title="Collector + WS", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+app.add_middleware(metrics.ASGIMetrics)
+
+ws_fanout = Fanout(queue_size=WS_QUEUE_SIZE, slow_policy=WS_SLOW_POLICY, send_timeout=WS_SEND_TIMEOUT)
+feed_bus = make_bus(FEED_BUS, ws_fanout.publish, path=FEED_BUS_PATH, max_buffer=FEED_BUS_MAX_BUFFER)
+
+def _register_callbacks():
+    cb = metrics.callback
+    cb('trust_downstream_in_flight', 'Calls to feature/models/policy in flight', 'gauge', lambda: hop_stats.in_flight)
+    cb('trust_downstream_errors_total', 'Failed calls to feature/models/policy', 'counter',
+       lambda: {name: h['errors'] for name, h in hop_stats.hops.items()}, ['hop'])
+    cb('trust_downstream_pool_timeouts_total', 'Downstream calls that timed out waiting for a connection', 'counter',
+       lambda: hop_stats.pool_timeouts)
+    cb('trust_event_queue_depth', 'Records waiting for the event writer', 'gauge', lambda: event_writer.queue.qsize())
+    cb('trust_event_records_total', 'Records written to the event log', 'counter',
+       lambda: event_writer.counters['records'])
+    cb('trust_event_fsyncs_total', 'fsync calls on the event log', 'counter', lambda: event_writer.counters['fsyncs'])
+    cb('trust_event_errors_total', 'Failed event log batches', 'counter', lambda: event_writer.counters['errors'])
+    cb('trust_ws_subscribers', 'Connected /ws clients', 'gauge', lambda: len(ws_fanout.subscribers))
+    cb('trust_ws_queue_depth', 'Messages queued for /ws clients, all clients together', 'gauge',
+       lambda: sum(len(s.queue) for s in ws_fanout.subscribers))
+    cb('trust_ws_queue_depth_max', 'Longest /ws client queue', 'gauge',
+       lambda: max((len(s.queue) for s in ws_fanout.subscribers), default=0))
+    cb('trust_ws_messages_total', '/ws messages by outcome', 'counter',
+       lambda: {k: ws_fanout.counters[k] for k in ('sent', 'dropped', 'evicted', 'filtered', 'sampled_out', 'send_errors')},
+       ['outcome'])
+    cb('trust_feed_bus_dropped_total', 'Feed frames not delivered to other collector processes', 'counter',
+       lambda: feed_bus.counters.get('dropped', 0))
+    cb('trust_executor_queue_depth', 'Tasks waiting for the offload executor', 'gauge', lambda: offloader.queue_depth())
+    cb('trust_executor_in_flight', 'Tasks running on the offload executor', 'gauge', lambda: offloader.in_flight)
+    if session_store is not None:
+        cb('trust_sessions', 'Sessions with state', 'gauge', lambda: len(session_store.sessions))
+    if telemetry_store is not None:
+        cb('trust_telemetry_sessions', 'Sessions with streamed telemetry', 'gauge', lambda: len(telemetry_store.sessions))
+        cb('trust_telemetry_chunks_total', 'Telemetry chunks by outcome', 'counter',
+           lambda: {k: telemetry_store.counters[k] for k in ('chunks', 'duplicates', 'errors')}, ['outcome'])
+    if decision_cache is not None:
+        cb('trust_decision_cache_lookups_total', 'Decision cache lookups by level and result', 'counter',
+           lambda: {(level, r): getattr(decision_cache, level).counters[r]
+                    for level in ('features', 'decisions') for r in ('hits', 'misses')}, ['level', 'result'])
+    if shadow is not None:
+        cb('trust_shadow_queue_depth', 'Attempts waiting for shadow evaluation', 'gauge', lambda: shadow.queue.qsize())
+        cb('trust_shadow_shed_total', 'Attempts not shadow-evaluated because the queue was full', 'counter',
+           lambda: shadow.counters['shed'])
+
+_register_callbacks()
 
 @app.websocket('/ws')
 async def ws_endpoint(ws: WebSocket):
-    await ws_manager.connect(ws)
+    await ws.accept()
+    sub = ws_fanout.add(ws)
     try:
         while True:
-            await ws.receive_text()  # keepalive
+            ws_fanout.handle_message(sub, await ws.receive_text())
     except WebSocketDisconnect:
-        await ws_manager.disconnect(ws)
+        pass
     except Exception:
-        await ws_manager.disconnect(ws)
+        pass
+    finally:
+        await ws_fanout.remove(sub)
+
+async def _hop(name: str, url: str, body: dict):
+    t0 = time.perf_counter()
+    hop_stats.start()
+    ok = False
+    headers = tracing.headers()  # None unless this request is traced
+    try:
+        with tracing.span(name) as sp:
+            r = await http_client.post(url, json=body, headers=headers,
+                                       timeout=httpx.Timeout(HOP_TIMEOUTS[name], pool=HTTP_POOL_TIMEOUT))
+            if headers: sp.set('server_ms', tracing.server_ms(r.headers))
+            r.raise_for_status()
+        ok = True
+        if decision_cache is not None:
+            decision_cache.observe(name, r.headers.get('x-version'))
+        return r.json()
+    except httpx.PoolTimeout:
+        hop_stats.pool_timeouts += 1
+        raise
+    finally:
+        hop_stats.finish(name, (time.perf_counter()-t0)*1000, ok)
+        STAGE[name].since(t0)
+
+def _local(name: str, fn, body: dict):
+    t0 = time.perf_counter()
+    hop_stats.start()
+    ok = False
+    try:
+        with tracing.span(name):
+            out = fn(body)
+        ok = True
+        return out
+    finally:
+        hop_stats.finish(name, (time.perf_counter()-t0)*1000, ok)
+        STAGE[name].since(t0)
+
+def _with_session(event: dict, f: dict):
+    if session_store is None: return f
+    t0 = time.perf_counter()
+    with tracing.span('session'):
+        sess = session_store.observe_attempt(event.get('session_id'), f.get('amount'))
+    STAGE['session'].since(t0)
+    return {**f, **sess}
+
+async def _watch_versions():
+    """Keep decision_cache keyed to the versions the downstream services report."""
+    urls = (f"{FEATURE_SVC}/version", f"{MODELS_SVC}/version", f"{POLICY_SVC}/version")
+    while True:
+        try:
+            rs = await asyncio.gather(*(http_client.get(u, timeout=1.0) for u in urls))
+            for r in rs: r.raise_for_status()
+            decision_cache.set_versions(tuple(r.json()['version'] for r in rs))
+        except Exception:
+            decision_cache.set_versions(None)  # unknown versions: bypass rather than serve stale entries
+        await asyncio.sleep(DECISION_CACHE_POLL_S)
+
+def _streamed_features(event: dict):
+    """Features for an event marked ``behavior.streamed``, from the session's telemetry; None otherwise.
+
+    Points still in the event are ingested first, as the session's final chunk. Beyond
+    that only env and journey are featurized here; the behaviour part is already
+    aggregated, so this is constant time whatever the session's length.
+    """
+    b = event.get('behavior') or {}
+    if telemetry_store is None or not b.get('streamed'): return None
+    t0 = time.perf_counter()
+    with tracing.span('stream_features'):
+        if b.get('mouse') or b.get('keys') or b.get('packed'):
+            try: _ingest({**b, 'session_id': event.get('session_id')})  # the client's last, still unsent chunk
+            except (ValueError, TypeError, KeyError): pass  # counted as an error; decide on what has arrived
+        f = features.featurize({**event, 'behavior': {'paste_count': b.get('paste_count', 0)}})
+        streamed = telemetry_store.features(event.get('session_id'))
+        if streamed is not None:
+            f.update(streamed, paste_count=max(streamed['paste_count'], f['paste_count']))
+    STAGE['stream_features'].since(t0)
+    return f
+
+async def _featurize(event: dict):
+    if PIPELINE_MODE == 'fused':
+        return _local('featurize', features.featurize, event)
+    return await _hop('featurize', f"{FEATURE_SVC}/featurize", event)
+
+async def _score_decide(f: dict):
+    # Policy rules may test features as well as scores, so both go to decide
+    if PIPELINE_MODE == 'fused':
+        s = _local('score', model.scorer().score, f)
+        return s, _local('decide', policy.decide, {**s, 'features': f})
+    s = await _hop('score', f"{MODELS_SVC}/score", f)
+    return s, await _hop('decide', f"{POLICY_SVC}/decide", {**s, 'features': f})
 
 async def pipeline(event: dict):
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        f = (await client.post(f"{FEATURE_SVC}/featurize", json=event)).json()
-        s = (await client.post(f"{MODELS_SVC}/score", json=f)).json()
-        d = (await client.post(f"{POLICY_SVC}/decide", json=s)).json()
-        return f, s, d
+    """Returns (features, scored, decision, cached) where cached says which stages came from decision_cache."""
+    cache = decision_cache
+    if cache is not None and PIPELINE_MODE == 'fused':
+        cache.set_versions((features.VERSION, model.scorer().version, policy.version()))
+    streamed = _streamed_features(event)
+    if cache is None or not cache.active:
+        f = _with_session(event, streamed if streamed is not None else await _featurize(event))
+        s, d = await _score_decide(f)
+        cached = None
+    else:
+        # streamed events all look alike (no points), so they never use the features level
+        if streamed is not None:
+            f, cached = streamed, None
+        else:
+            fkey = cache.features_key(event)
+            f = cache.features.get(fkey)
+            cached = 'features' if f is not None else None
+            if f is None:
+                gen = cache.generation
+                f = await _featurize(event)
+                if cache.generation == gen: cache.features.put(fkey, f)
+        f = _with_session(event, f)
+        dkey = cache.decision_key(f)
+        hit = cache.decisions.get(dkey)
+        if hit is not None:
+            (s, d), cached = hit, 'decision'
+        else:
+            # a version change seen by this or a concurrent miss clears the cache; a result
+            # that straddled it is not stored
+            gen = cache.generation
+            s, d = await _score_decide(f)
+            if cache.generation == gen: cache.decisions.put(dkey, (s, d))
+    if session_store is not None:
+        session_store.record_decision(event.get('session_id'), d.get('action'))
+    return f, s, d, cached
 
 @app.post('/collect')
-async def collect(event: dict):
+async def collect(event: dict, request: Request, x_trace_id: str = Header(None)):
     t0 = time.time()
+    trace = tracer.begin('collect', x_trace_id, request.client.host if request.client else None)
     try:
-        features, scored, decision = await pipeline(event)
+        t1 = time.perf_counter()
+        with tracing.span('pipeline'):
+            features, scored, decision, cached = await pipeline(event)
+        STAGE['pipeline'].since(t1)
+        metrics.DECISIONS.labels(decision.get('action')).inc()
         record = {
             'kind': 'attempt',
+            'id': uuid.uuid4().hex,
             'ts': event.get('ts'),
             'session_id': event.get('session_id'),
             'channel': event.get('channel'),
             'features': features,
             'scores': scored.get('scores', {}),
             'risk_score': scored.get('risk_score'),
+            'model_version': scored.get('model_version'),
             'decision': decision,
             'latency_ms': int((time.time()-t0)*1000)
         }
-        os.makedirs(os.path.dirname(EVENTS_FILE), exist_ok=True)
-        with open(EVENTS_FILE, 'a') as f:
-            f.write(json.dumps(record) + '')
-            f.flush(); os.fsync(f.fileno())
-        await ws_manager.broadcast(record)
-        return JSONResponse({ 'ok': True, **record })
+        if decision_cache is not None:
+            record['cached'] = cached
+        t1 = time.perf_counter()
+        with tracing.span('event_write'):
+            await event_writer.write(record)
+        t2 = time.perf_counter()
+        STAGE['event_write'].observe(t2 - t1)
+        with tracing.span('publish'):
+            feed_bus.publish(record)
+            if shadow is not None:
+                shadow.submit(record, features)
+        STAGE['publish'].since(t2)
+        if trace is not None:
+            trace.attrs.update(session_id=record['session_id'], action=decision.get('action'), cached=cached)
+        return JSONResponse({ 'ok': True, **record },
+                            headers={'X-Trace-Id': trace.id} if trace is not None else None)
     except Exception as e:
+        if trace is not None:
+            trace.attrs['error'] = str(e)
         return JSONResponse({ 'ok': False, 'error': str(e) }, status_code=500)
+    finally:
+        tracer.end(trace)
 
-# Challenge verification
+# Streaming telemetry
 
-def _nearest_dist(p, samples):
-    best = 1e9
-    for s in samples:
-        dx = p['x']-s['x']; dy = p['y']-s['y']
-        d = (dx*dx+dy*dy)**0.5
-        if d < best: best = d
-    return best
+def _ingest(chunk):
+    if not isinstance(chunk, dict):
+        raise ValueError("telemetry chunks must be JSON objects")
+    t0 = time.perf_counter()
+    out = telemetry_store.ingest(chunk.get('session_id'), chunk)
+    STAGE['telemetry_ingest'].since(t0)
+    return out
+
+@app.post('/telemetry')
+async def telemetry(request: Request):
+    """One JSON chunk, or newline-delimited chunks streamed in a chunked request body."""
+    if telemetry_store is None:
+        return JSONResponse({'error': 'streaming telemetry is disabled'}, status_code=404)
+    buf, last, n = b'', {}, 0
+    try:
+        # chunks are ingested as their lines arrive, not after the whole body
+        async for data in request.stream():
+            *lines, buf = (buf + data).split(b'\n')
+            for line in lines:
+                if line.strip():
+                    last = _ingest(json.loads(line)); n += 1
+        if buf.strip():
+            last = _ingest(json.loads(buf)); n += 1
+    except (ValueError, TypeError, KeyError) as e:
+        return JSONResponse({'error': str(e), 'accepted': n}, status_code=422)
+    return {'accepted': n, **last}
+
+@app.websocket('/telemetry/ws')
+async def telemetry_ws(ws: WebSocket):
+    """One chunk per message; errors are reported back, successes are not acknowledged."""
+    await ws.accept()
+    if telemetry_store is None:
+        await ws.close(code=1008)
+        return
+    try:
+        while True:
+            msg = await ws.receive_text()
+            try:
+                _ingest(json.loads(msg))
+            except (ValueError, TypeError, KeyError) as e:
+                await ws.send_text(json.dumps({'error': str(e)}))
+    except WebSocketDisconnect:
+        pass
+
+# Challenge verification
 
 @app.post('/challenge')
-async def challenge(payload: dict):
-    ts = payload.get('ts')
-    session_id = payload.get('session_id')
-    trail = payload.get('trail', [])
-    flags = payload.get('env_flags') or {}
-    ps = payload.get('path_spec') or {}
-    start, end, c1, c2 = ps.get('start'), ps.get('end'), ps.get('c1'), ps.get('c2')
-    samples = []
-    if start and end and c1 and c2:
-        for k in range(0,101):
-            t = k/100.0
-            x = (1-t)**3*start['x'] + 3*(1-t)**2*t*c1['x'] + 3*(1-t)*t**2*c2['x'] + t**3*end['x']
-            y = (1-t)**3*start['y'] + 3*(1-t)**2*t*c1['y'] + 3*(1-t)*t**2*c2['y'] + t**3*end['y']
-            samples.append({'x':x,'y':y})
-    if not trail:
-        return JSONResponse({'passed': False, 'reason': 'no_trail'})
-    dists = [_nearest_dist(p, samples) for p in trail]
-    median_dev = sorted(dists)[len(dists)//2]
-    ts_arr = [p['t'] for p in trail]
-    xs = [p['x'] for p in trail]
-    ys = [p['y'] for p in trail]
-    if len(ts_arr) < 3:
-        return JSONResponse({'passed': False, 'reason': 'too_short'})
-    dt = [max(1, ts_arr[i]-ts_arr[i-1]) for i in range(1, len(ts_arr))]
-    dx = [xs[i]-xs[i-1] for i in range(1, len(xs))]
-    dy = [ys[i]-ys[i-1] for i in range(1, len(ys))]
-    vel = [ (dx[i]**2+dy[i]**2)**0.5 / (dt[i]/1000.0) for i in range(len(dt)) ]
-    mean_v = sum(vel)/len(vel)
-    std_v = statistics.pstdev(vel) if len(vel)>1 else 0.0
-    tremor = std_v / (mean_v + 1e-6)
-
-    passed = (median_dev <= 12.0) and (tremor >= 0.2)
-
-    # Downsample trail for replay storage
-    trail_sample = [{ 'x': p['x'], 'y': p['y'] } for i,p in enumerate(trail) if i % 4 == 0][:800]
+async def challenge(request: Request):
+    # Parsing the trail and the geometry both run on the offload executor, so long
+    # trails do not stall the event loop; only the raw body crosses over.
+    body = await request.body()
+    t0 = time.perf_counter()
+    try:
+        c = await offloader.run(challenge_mod.verify_body, body, CHALLENGE_SAMPLES)
+    except ValueError as e:
+        return JSONResponse({'passed': False, 'error': str(e)}, status_code=422)
+    finally:
+        STAGE['challenge'].since(t0)
+    result = c['result']
+    if result['reason']:
+        return JSONResponse({'passed': False, 'reason': result['reason']})
+    median_dev, tremor, passed = result['median_dev'], result['tremor'], result['passed']
+    ts, session_id, flags, ps, trail_sample = c['ts'], c['session_id'], c['flags'], c['path_spec'], c['trail_sample']
+    if session_store is not None:
+        session_store.record_challenge(session_id, passed)
 
     record = {
         'kind': 'challenge',
@@ -138,13 +491,92 @@ async def challenge(payload: dict):
         'path_spec': ps,
         'trail_sample': trail_sample
     }
-    os.makedirs(os.path.dirname(EVENTS_FILE), exist_ok=True)
-    with open(EVENTS_FILE, 'a') as f:
-        f.write(json.dumps(record) + '')
-        f.flush(); os.fsync(f.fileno())
-    await ws_manager.broadcast(record)
+    await event_writer.write(record)
+    feed_bus.publish(record)
     return JSONResponse({ 'passed': passed, 'metrics': record })
 
+# Agent detection
+
+@app.post('/behavioral_analysis')
+async def behavioral_analysis(event: dict):
+    # One session's points are small enough (well under a millisecond) to analyse inline.
+    t0 = time.perf_counter()
+    try:
+        result = detection.analyze(event)
+    except ValueError as e:
+        return JSONResponse({'error': f'malformed session payload: {e}'}, status_code=422)
+    finally:
+        STAGE['behavioral_analysis'].since(t0)
+    record = detection.record(event, result)
+    await event_writer.write(record)
+    feed_bus.publish(record)
+    return record
+
+@app.post('/behavioral_analysis_batch')
+async def behavioral_analysis_batch(request: Request):
+    """A JSON list of sessions, analysed in one vectorized pass on the offload executor."""
+    body = await request.body()
+    t0 = time.perf_counter()
+    try:
+        records = await offloader.run(detection.analyze_body, body)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=422)
+    finally:
+        STAGE['behavioral_analysis'].since(t0)
+    await asyncio.gather(*(event_writer.write(r) for r in records))  # queued together, so they share fsyncs
+    for record in records:
+        feed_bus.publish(record)
+    return {'results': records}
+
+@app.post('/contextual_challenge')
+async def contextual_challenge(event: dict):
+    t0 = time.perf_counter()
+    try:
+        result = detection.evaluate_challenge(event)
+    except (ValueError, TypeError) as e:
+        return JSONResponse({'passed': False, 'error': str(e)}, status_code=422)
+    finally:
+        STAGE['contextual_challenge'].since(t0)
+    session_id = event.get('session_id')
+    if session_store is not None:
+        session_store.record_challenge(session_id, result['passed'])
+    record = {'kind': 'contextual_challenge', 'ts': event.get('ts') or int(time.time()*1000),
+              'session_id': session_id, **result}
+    await event_writer.write(record)
+    feed_bus.publish(record)
+    return record
+
 @app.get('/')
 async def root():
     return {"status":"collector up", "ws":"/ws"}
+
+# Slow-request traces
+
+@app.get('/admin/traces')
+async def admin_traces(limit: int = 20, min_ms: float = 0.0):
+    return {'tracer': tracer.stats(), 'traces': tracer.traces(limit, min_ms)}
+
+@app.get('/admin/traces/{trace_id}')
+async def admin_trace(trace_id: str):
+    tr = tracer.get(trace_id)
+    if tr is None:
+        return JSONResponse({'error': 'unknown or expired trace'}, status_code=404)
+    return tr
+
+@app.post('/admin/traces/config')
+async def admin_trace_config(cfg: dict):
+    tracer.configure(cfg.get('sample'), cfg.get('slow_ms'))
+    return tracer.stats()
+
+@app.get('/metrics')
+async def prometheus():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get('/stats')
+async def stats():
+    return {**hop_stats.snapshot(), 'event_writer': event_writer.stats(), 'executor': offloader.stats(),
+            'ws': ws_fanout.stats(), 'feed_bus': feed_bus.stats(),
+            'sessions': session_store.stats() if session_store is not None else None,
+            'telemetry': telemetry_store.stats() if telemetry_store is not None else None,
+            'decision_cache': decision_cache.stats() if decision_cache is not None else None,
+            'shadow': shadow.stats() if shadow is not None else None, 'tracing': tracer.stats()}
@@ -0,0 +1,99 @@
+import collections, hashlib, json, time
+
+def canonical_hash(obj) -> bytes:
+    """128-bit digest of ``obj``'s canonical JSON (sorted keys, no whitespace)."""
+    data = json.dumps(obj, sort_keys=True, separators=(',', ':'), default=str).encode()
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+class TTLCache:
+    """Bounded LRU map whose entries also expire ``ttl_s`` seconds after insertion."""
+    def __init__(self, max_entries: int, ttl_s: float, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.clock = clock
+        self.entries = collections.OrderedDict()  # key -> (expires, value), least recent first
+        self.counters = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0}
+
+    def get(self, key):
+        e = self.entries.get(key)
+        if e is None:
+            self.counters['misses'] += 1
+            return None
+        if e[0] < self.clock():
+            del self.entries[key]
+            self.counters['expired'] += 1
+            self.counters['misses'] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.counters['hits'] += 1
+        return e[1]
+
+    def put(self, key, value):
+        self.entries[key] = (self.clock() + self.ttl_s, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.counters['evicted'] += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        c = self.counters
+        lookups = c['hits'] + c['misses']
+        return {**c, 'entries': len(self.entries), 'max_entries': self.max_entries,
+                'hit_rate': round(c['hits']/lookups, 4) if lookups else 0.0}
+
+class DecisionCache:
+    """Content-addressed cache for the featurize -> score -> decide pipeline.
+
+    Two levels, so repeat payloads skip as much work as is still valid:
+      - ``features``: canonical hash of the event's behaviour, env and journey -> features.
+      - ``decisions``: canonical hash of the full feature vector -> (scored, decision).
+        The vector includes per-session ``sess_*`` aggregates when session state is on,
+        so a cached decision is only reused for an identical session picture.
+
+    Keys are only valid for one ``(features, model, policy)`` version triple. When
+    ``set_versions`` sees a new triple, or ``observe`` sees a stage report a version other
+    than the cached one, both levels are cleared. While the versions are unknown (``None``)
+    the cache is bypassed. ``generation`` changes on every clear: a result computed while
+    it changed may come from either version, so callers only store it if it did not.
+    """
+    STAGES = ('featurize', 'score', 'decide')
+
+    def __init__(self, max_entries: int = 10000, ttl_s: float = 300.0):
+        self.features = TTLCache(max_entries, ttl_s)
+        self.decisions = TTLCache(max_entries, ttl_s)
+        self.versions = None
+        self.invalidations = 0
+        self.generation = 0
+
+    @property
+    def active(self):
+        return self.versions is not None
+
+    def set_versions(self, versions):
+        if versions != self.versions:
+            if self.versions is not None:
+                self.invalidations += 1
+            self.features.clear()
+            self.decisions.clear()
+            self.versions = versions
+            self.generation += 1
+
+    def observe(self, stage: str, version):
+        """A stage response reported ``version``; clears the cache if it is not the cached one."""
+        if self.versions is None or version is None: return
+        i = self.STAGES.index(stage)
+        if self.versions[i] != version:
+            self.set_versions((*self.versions[:i], version, *self.versions[i+1:]))
+
+    def features_key(self, event: dict):
+        return canonical_hash([event.get('behavior'), event.get('env'), event.get('journey')])
+
+    def decision_key(self, f: dict):
+        return canonical_hash(f)
+
+    def stats(self):
+        return {'active': self.active, 'versions': self.versions, 'invalidations': self.invalidations,
+                'features': self.features.stats(), 'decisions': self.decisions.stats()}
@@ -0,0 +1,166 @@
+import asyncio, json, os, time
+from trust_core import eventstore, metrics
+
+DURABILITY_MODES = ('record', 'group', 'os')
+
+COMMIT_SECONDS = metrics.histogram('trust_event_commit_seconds', 'Event log batch commit time, as seen by waiting callers')
+ENCODE_SECONDS = metrics.histogram('trust_event_encode_seconds', 'Event log batch serialization time')
+APPEND_SECONDS = metrics.histogram('trust_event_append_seconds', 'Event log batch write time, including fsync')
+BATCH_RECORDS = metrics.histogram('trust_event_batch_records', 'Records per event log batch',
+                                  buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024))
+
+class JsonlSink:
+    """Appends newline-delimited JSON to a single file."""
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    def encode(self, record: dict):
+        return json.dumps(record) + '\n'
+    def append(self, records, payloads, sync: str):
+        fsyncs = 0
+        with open(self.path, 'a') as f:
+            if sync == 'record':
+                for line in payloads:
+                    f.write(line)
+                    f.flush(); os.fsync(f.fileno())
+                    fsyncs += 1
+            else:
+                f.write(''.join(payloads))
+                if sync == 'group':
+                    f.flush(); os.fsync(f.fileno())
+                    fsyncs += 1
+        return fsyncs
+    def close(self):
+        pass
+
+class SegmentSink:
+    """Appends msgpack frames to a rotating segment log (see trust_core.eventstore)."""
+    def __init__(self, root: str, **kwargs):
+        self.root = root
+        self.kwargs = kwargs
+        self.writer = None
+    def encode(self, record: dict):
+        return eventstore.encode(record)
+    def append(self, records, payloads, sync: str):
+        if self.writer is None:
+            self.writer = eventstore.SegmentWriter(self.root, **self.kwargs)
+        return self.writer.append(records, payloads, sync)
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+class EventWriter:
+    """Background appender for the events log.
+
+    Records go through a bounded queue to a single writer task, which drains up to
+    ``max_batch`` records or waits ``max_delay_ms``, whichever comes first, then writes
+    the batch from a worker thread so the event loop never blocks on the disk. Records
+    are serialized in that thread too, once per batch.
+
+    Durability modes:
+      - ``record``: fsync after every record; callers wait for their own fsync.
+      - ``group``:  one fsync per batch; callers wait for the batch fsync (group commit).
+      - ``os``:     no fsync, the OS page cache decides; callers return once queued.
+    """
+    def __init__(self, sink, durability: str = 'group', max_batch: int = 256,
+                 max_delay_ms: float = 5.0, queue_size: int = 10000):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}, got {durability!r}")
+        self.sink = sink
+        self.durability = durability
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms/1000.0
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task = None
+        self.counters = {'records': 0, 'batches': 0, 'fsyncs': 0, 'errors': 0,
+                         'queue_full_waits': 0, 'peak_queue_depth': 0,
+                         'write_ms_total': 0.0, 'write_ms_max': 0.0}
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued, then stop the writer task."""
+        if self.task is None: return
+        await self.queue.put(None)
+        await self.task
+        self.task = None
+        await asyncio.to_thread(self.sink.close)
+
+    async def write(self, record: dict):
+        """Queue a record; waits for durability unless the mode is ``os``."""
+        fut = asyncio.get_running_loop().create_future() if self.durability != 'os' else None
+        if self.queue.full():
+            self.counters['queue_full_waits'] += 1
+        await self.queue.put((record, fut))
+        self.counters['peak_queue_depth'] = max(self.counters['peak_queue_depth'], self.queue.qsize())
+        if fut is not None:
+            await fut
+
+    def offer(self, record: dict, headroom: int = 0) -> bool:
+        """Queue a best-effort record without waiting; False if it was not queued.
+
+        The record is refused unless at least ``headroom`` slots stay free after it, so
+        background writers cannot take the queue space that request handlers rely on.
+        """
+        if self.queue.qsize() + 1 + headroom > self.queue.maxsize:
+            return False
+        self.queue.put_nowait((record, None))
+        self.counters['peak_queue_depth'] = max(self.counters['peak_queue_depth'], self.queue.qsize())
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None: break
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                try:
+                    item = self.queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self.queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._commit(batch)
+
+    async def _commit(self, batch):
+        t0 = time.perf_counter()
+        try:
+            fsyncs = await asyncio.to_thread(self._append, [r for r, _ in batch])
+            err = None
+        except Exception as e:
+            fsyncs, err = 0, e
+            self.counters['errors'] += 1
+        ms = (time.perf_counter()-t0)*1000
+        COMMIT_SECONDS.observe(ms/1000)
+        BATCH_RECORDS.observe(len(batch))
+        c = self.counters
+        c['records'] += len(batch); c['batches'] += 1; c['fsyncs'] += fsyncs
+        c['write_ms_total'] += ms; c['write_ms_max'] = max(c['write_ms_max'], ms)
+        for _, fut in batch:
+            if fut is None or fut.done(): continue
+            if err is None: fut.set_result(None)
+            else: fut.set_exception(err)
+
+    def _append(self, records):
+        t0 = time.perf_counter()
+        payloads = [self.sink.encode(r) for r in records]
+        t1 = time.perf_counter()
+        ENCODE_SECONDS.observe(t1 - t0)
+        fsyncs = self.sink.append(records, payloads, self.durability)
+        APPEND_SECONDS.since(t1)
+        return fsyncs
+
+    def stats(self):
+        c = self.counters
+        return {**c, 'durability': self.durability, 'queue_depth': self.queue.qsize(),
+                'queue_capacity': self.queue.maxsize,
+                'avg_batch': round(c['records']/c['batches'], 2) if c['batches'] else 0.0,
+                'write_ms_total': round(c['write_ms_total'], 3), 'write_ms_max': round(c['write_ms_max'], 3)}
@@ -0,0 +1,190 @@
+import asyncio, fcntl, json, os, struct
+
+FEED_BUS_KINDS = ('local', 'unix')
+FRAME = struct.Struct('<I')  # payload length
+
+class LocalBus:
+    """Single-process bus: published messages go straight to the local fan-out."""
+    def __init__(self, deliver):
+        self.deliver = deliver
+        self.counters = {'published': 0}
+    async def start(self):
+        pass
+    async def stop(self):
+        pass
+    def publish(self, message: dict):
+        self.counters['published'] += 1
+        self.deliver(message)
+    def stats(self):
+        return {**self.counters, 'kind': 'local'}
+
+class UnixSocketBus:
+    """Shares the live feed between collector processes on one host over a Unix socket.
+
+    Every process runs the same code. Whichever one holds an exclusive ``flock`` on
+    ``path + '.lock'`` is the hub: it listens on ``path`` and relays each frame to every
+    other connected process. The rest connect to it as peers. If the hub exits, the lock
+    is released and the peers race for it again, so there is no broker to run.
+
+    ``publish`` never waits: the message is delivered to the local fan-out at once and
+    its JSON frame is handed to the socket's write buffer. The message is serialized
+    once, only when there is a process to send it to, and the same JSON is passed to
+    the fan-out (as are frames received from other processes). A peer whose buffer is over
+    ``max_buffer`` bytes, or a process with no connection at that moment, misses the
+    frame (counted as ``dropped``); the feed is best-effort, the event log is not.
+    """
+    def __init__(self, deliver, path: str, max_buffer: int = 8*1024*1024, retry_s: float = 0.5):
+        self.deliver = deliver
+        self.path = path
+        self.max_buffer = max_buffer
+        self.retry_s = retry_s
+        self.role = None      # 'hub' or 'peer' while connected
+        self.lock_fd = None
+        self.server = None
+        self.peers = set()    # hub: writers to connected peers
+        self.upstream = None  # peer: writer to the hub
+        self.task = None
+        self.counters = {'published': 0, 'received': 0, 'relayed': 0, 'dropped': 0,
+                         'decode_errors': 0, 'elections': 0, 'reconnects': 0}
+
+    async def start(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self._teardown()
+
+    def publish(self, message: dict):
+        self.counters['published'] += 1
+        if self.role == 'hub' and not self.peers:
+            self.deliver(message)
+            return
+        if self.role != 'hub' and self.upstream is None:
+            self.counters['dropped'] += 1
+            self.deliver(message)
+            return
+        data = json.dumps(message)
+        self.deliver(message, data)
+        payload = data.encode()
+        frame = FRAME.pack(len(payload)) + payload
+        if self.role == 'hub':
+            self._send_all(frame, None)
+        else:
+            self._send(self.upstream, frame)
+
+    def _send(self, writer, frame) -> bool:
+        if writer.is_closing() or writer.transport.get_write_buffer_size() > self.max_buffer:
+            self.counters['dropped'] += 1
+            return False
+        writer.write(frame)
+        return True
+
+    def _send_all(self, frame, exclude):
+        for w in list(self.peers):
+            if w is not exclude and self._send(w, frame):
+                self.counters['relayed'] += 1
+
+    def _on_frame(self, payload):
+        self.counters['received'] += 1
+        try:
+            data = payload.decode()
+            message = json.loads(data)
+        except ValueError:
+            self.counters['decode_errors'] += 1
+            return
+        self.deliver(message, data)
+
+    async def _read_frames(self, reader, on_frame):
+        while True:
+            head = await reader.readexactly(FRAME.size)
+            (n,) = FRAME.unpack(head)
+            on_frame(await reader.readexactly(n))
+
+    def _try_lock(self) -> bool:
+        fd = os.open(self.path + '.lock', os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self.lock_fd = fd
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                if self._try_lock():
+                    self.counters['elections'] += 1
+                    await self._serve()
+                else:
+                    await self._follow()
+            except asyncio.CancelledError:
+                raise
+            except (OSError, asyncio.IncompleteReadError):
+                pass
+            await self._teardown()
+            self.counters['reconnects'] += 1
+            await asyncio.sleep(self.retry_s)
+
+    async def _serve(self):
+        try:
+            os.unlink(self.path)  # stale socket from a previous hub
+        except FileNotFoundError:
+            pass
+        self.server = await asyncio.start_unix_server(self._on_peer, path=self.path)
+        self.role = 'hub'
+        await asyncio.Event().wait()  # serve until cancelled
+
+    async def _on_peer(self, reader, writer):
+        self.peers.add(writer)
+        def relay(payload):
+            self._on_frame(payload)
+            self._send_all(FRAME.pack(len(payload)) + payload, writer)
+        try:
+            await self._read_frames(reader, relay)
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.peers.discard(writer)
+            writer.close()
+
+    async def _follow(self):
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        self.upstream, self.role = writer, 'peer'
+        await self._read_frames(reader, self._on_frame)
+
+    async def _teardown(self):
+        self.role = None
+        if self.upstream is not None:
+            self.upstream.close()
+            self.upstream = None
+        for w in list(self.peers):
+            w.close()
+        self.peers.clear()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self.lock_fd is not None:
+            os.close(self.lock_fd)  # releases the flock; peers elect a new hub
+            self.lock_fd = None
+
+    def stats(self):
+        return {**self.counters, 'kind': 'unix', 'path': self.path, 'role': self.role,
+                'peers': len(self.peers) if self.role == 'hub' else None}
+
+def make_bus(kind: str, deliver, path: str, max_buffer: int = 8*1024*1024):
+    """``deliver(message, data=None)`` is called with every message, local or remote (normally
+    ``Fanout.publish``); ``data`` is the message's JSON when the bus already has it."""
+    if kind not in FEED_BUS_KINDS:
+        raise ValueError(f"feed bus must be one of {FEED_BUS_KINDS}, got {kind!r}")
+    if kind == 'unix':
+        return UnixSocketBus(deliver, path, max_buffer=max_buffer)
+    return LocalBus(deliver)
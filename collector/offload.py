@@ -0,0 +1,64 @@
+import asyncio, multiprocessing, os, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+EXECUTOR_KINDS = ('inline', 'thread', 'process')
+
+class Offloader:
+    """Runs CPU-bound callables off the event loop and keeps queue/latency counters.
+
+    ``process`` gives real parallelism, but callables and arguments must be picklable
+    (module-level functions). ``thread`` keeps the loop responsive but shares the GIL.
+    ``inline`` runs on the loop itself, which is mainly useful for comparison.
+    """
+    def __init__(self, kind: str = 'process', workers: int = 0):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"executor must be one of {EXECUTOR_KINDS}, got {kind!r}")
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = None
+        self.in_flight = 0
+        self.counters = {'submitted': 0, 'completed': 0, 'errors': 0, 'peak_queue_depth': 0,
+                         'latency_ms_total': 0.0, 'latency_ms_max': 0.0}
+
+    def start(self):
+        if self.kind == 'process':
+            # spawn, not fork: the parent already runs threads (event writer, to_thread)
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        elif self.kind == 'thread':
+            self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix='offload')
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+
+    async def run(self, fn, *args):
+        c = self.counters
+        c['submitted'] += 1
+        self.in_flight += 1
+        c['peak_queue_depth'] = max(c['peak_queue_depth'], self.queue_depth())
+        t0 = time.perf_counter()
+        try:
+            if self.pool is None:
+                return fn(*args)
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        except Exception:
+            c['errors'] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            ms = (time.perf_counter()-t0)*1000
+            c['completed'] += 1
+            c['latency_ms_total'] += ms
+            c['latency_ms_max'] = max(c['latency_ms_max'], ms)
+
+    def queue_depth(self):
+        """Tasks waiting for a free worker."""
+        return max(0, self.in_flight - self.workers)
+
+    def stats(self):
+        c = self.counters
+        return {**c, 'kind': self.kind, 'workers': self.workers, 'in_flight': self.in_flight,
+                'queue_depth': self.queue_depth(),
+                'latency_ms_avg': round(c['latency_ms_total']/c['completed'], 3) if c['completed'] else 0.0,
+                'latency_ms_total': round(c['latency_ms_total'], 3), 'latency_ms_max': round(c['latency_ms_max'], 3)}
@@ -0,0 +1,147 @@
+import asyncio, json, os, time
+from trust_core import model, policy
+
+class ShadowConfig:
+    """One candidate configuration: a model artifact, scoring weights and/or a policy rules file.
+
+    Missing parts fall back to the live ones: with neither ``model`` nor ``weights`` the live
+    scores are reused, and without ``policy_rules`` the live rules decide. A rules file is
+    hot-reloaded like the live one.
+    """
+    def __init__(self, name: str, weights: dict = None, policy_rules: str = None, reload_s: float = 1.0,
+                 model_path: str = None):
+        self.name = name
+        self.scorer = None
+        if model_path:
+            self.scorer = model.Scorer(model.IsolationForestModel.load(model_path), weights=weights)
+        elif weights is not None:
+            self.scorer = model.Scorer(weights=weights)
+        self.rules = policy.RuleSet(policy_rules, reload_s) if policy_rules else None
+
+    def evaluate(self, live_scored: dict, f: dict):
+        s = self.scorer.score(f) if self.scorer is not None else live_scored
+        rules = self.rules.current() if self.rules is not None else policy.ruleset().current()
+        return s, rules.decide({**s, 'features': f})
+
+def load_shadow_configs(path: str, reload_s: float = 1.0):
+    """Read ``[{"name": ..., "model": "m.npz", "weights": {...}, "policy_rules": "r.json"}, ...]``.
+
+    Relative paths are resolved against the config file's directory.
+    """
+    with open(path) as f:
+        specs = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    configs = []
+    def resolve(p):
+        return os.path.join(base, p) if p and not os.path.isabs(p) else p
+    for spec in specs:
+        configs.append(ShadowConfig(spec['name'], spec.get('weights'), resolve(spec.get('policy_rules')), reload_s,
+                                    resolve(spec.get('model'))))
+    if len({c.name for c in configs}) != len(configs):
+        raise ValueError("shadow config names must be unique")
+    return configs
+
+class ShadowEvaluator:
+    """Evaluates shadow configurations for live attempts without touching /collect latency.
+
+    ``submit`` only enqueues; when the bounded queue is full the attempt is shed (counted,
+    never waited for). A background task drains up to ``max_batch`` attempts at a time and
+    evaluates them in a worker thread, then hands one ``shadow`` record per attempt to
+    ``sink``. The worker only builds records; counters and per-config agreement are
+    updated on the event loop, where ``stats`` reads them. The record carries the attempt's ``id``, the live action and every shadow's
+    decision. ``sink`` must not block: it returns False when the record cannot be taken
+    (``EventWriter.offer``), and the result is shed rather than slowing the writer that
+    /collect waits on.
+    """
+    def __init__(self, configs, sink, queue_size: int = 1000, max_batch: int = 256):
+        self.configs = configs
+        self.sink = sink
+        self.max_batch = max_batch
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task = None
+        self.counters = {'submitted': 0, 'shed': 0, 'evaluated': 0, 'errors': 0,
+                         'lag_ms_total': 0.0, 'lag_ms_max': 0.0, 'eval_ms_total': 0.0}
+        self.per_config = {c.name: {'evaluated': 0, 'agree': 0, 'transitions': {}} for c in configs}
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None: return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    def submit(self, record: dict, f: dict) -> bool:
+        self.counters['submitted'] += 1
+        try:
+            self.queue.put_nowait((time.perf_counter(), record, f))
+        except asyncio.QueueFull:
+            self.counters['shed'] += 1
+            return False
+        return True
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            t0 = time.perf_counter()
+            try:
+                out = await asyncio.to_thread(self._evaluate, batch)
+            except Exception:
+                self.counters['errors'] += len(batch)
+                continue
+            c = self.counters
+            c['eval_ms_total'] += (time.perf_counter()-t0)*1000
+            now = time.perf_counter()
+            for (queued, _, _), rec in zip(batch, out):
+                lag = (now-queued)*1000
+                c['evaluated'] += 1
+                c['lag_ms_total'] += lag
+                c['lag_ms_max'] = max(c['lag_ms_max'], lag)
+                rec['lag_ms'] = round(lag, 3)
+                self._tally(rec)
+            for rec in out:
+                if not self.sink(rec): c['shed'] += 1
+
+    def _evaluate(self, batch):
+        out = []
+        for _, record, f in batch:
+            live = record.get('decision') or {}
+            live_scored = {'scores': record.get('scores', {}), 'risk_score': record.get('risk_score')}
+            shadows = {}
+            for cfg in self.configs:
+                s, d = cfg.evaluate(live_scored, f)
+                agree = d.get('action') == live.get('action')
+                shadows[cfg.name] = {'action': d.get('action'), 'reasons': d.get('reasons'),
+                                     'risk_score': s.get('risk_score'), 'model_version': s.get('model_version'),
+                                     'agree': agree}
+            out.append({'kind': 'shadow', 'ts': record.get('ts'), 'session_id': record.get('session_id'),
+                        'attempt_id': record.get('id'),
+                        'live': {'action': live.get('action'), 'risk_score': record.get('risk_score')},
+                        'shadows': shadows})
+        return out
+
+    def _tally(self, rec):
+        live = rec['live']['action']
+        for name, sh in rec['shadows'].items():
+            pc = self.per_config[name]
+            pc['evaluated'] += 1
+            pc['agree'] += sh['agree']
+            if not sh['agree']:
+                key = f"{live}->{sh['action']}"
+                pc['transitions'][key] = pc['transitions'].get(key, 0) + 1
+
+    def stats(self):
+        c = self.counters
+        n = c['evaluated']
+        configs = {name: {**pc, 'transitions': dict(pc['transitions']), 'agreement': round(pc['agree']/pc['evaluated'], 4) if pc['evaluated'] else None}
+                   for name, pc in self.per_config.items()}
+        return {**c, 'queue_depth': self.queue.qsize(), 'queue_capacity': self.queue.maxsize,
+                'lag_ms_avg': round(c['lag_ms_total']/n, 3) if n else 0.0,
+                'lag_ms_total': round(c['lag_ms_total'], 3), 'lag_ms_max': round(c['lag_ms_max'], 3),
+                'eval_ms_total': round(c['eval_ms_total'], 3), 'configs': configs}
@@ -0,0 +1,238 @@
+import asyncio, collections, json, random
+
+SLOW_POLICIES = ('drop_oldest', 'drop_newest', 'evict')
+
+SUBSCRIPTION_KEYS = ('kinds', 'actions', 'session_id', 'min_risk', 'fields', 'sample')
+
+def _str_list(spec, key):
+    v = spec.get(key)
+    if v is None: return None
+    if isinstance(v, str): v = [v]
+    if not isinstance(v, list) or not all(isinstance(x, str) for x in v):
+        raise ValueError(f"{key} must be a string or a list of strings")
+    return tuple(sorted(set(v)))
+
+class Subscription:
+    """What a /ws client wants: a filter, a field projection and a sampling rate.
+
+    Built from the client's subscription message, e.g.
+    ``{"kinds": ["attempt"], "actions": ["deny"], "min_risk": 0.8, "fields": ["ts", "session_id",
+    "decision.action"], "sample": 0.01}``. Every key is optional; an empty message selects the
+    full feed. ``actions`` and ``min_risk`` only match records that carry ``decision.action`` /
+    ``risk_score``. ``fields`` are top-level keys or ``parent.child`` paths.
+    Identical subscriptions compare equal by ``key``, so the fan-out filters and
+    serializes once per distinct subscription rather than once per client.
+    """
+    def __init__(self, spec: dict = None):
+        spec = spec or {}
+        unknown = set(spec) - set(SUBSCRIPTION_KEYS)
+        if unknown:
+            raise ValueError(f"unknown subscription keys: {sorted(unknown)}")
+        self.kinds = _str_list(spec, 'kinds')
+        self.actions = _str_list(spec, 'actions')
+        self.session_id = spec.get('session_id')
+        if self.session_id is not None and not isinstance(self.session_id, str):
+            raise ValueError("session_id must be a string")
+        self.min_risk = spec.get('min_risk')
+        if self.min_risk is not None and (isinstance(self.min_risk, bool) or not isinstance(self.min_risk, (int, float))):
+            raise ValueError("min_risk must be a number")
+        self.fields = _str_list(spec, 'fields')
+        self.paths = [f.split('.', 1) for f in self.fields] if self.fields else None
+        self.sample = spec.get('sample', 1.0)
+        if isinstance(self.sample, bool) or not isinstance(self.sample, (int, float)) or not 0 < self.sample <= 1:
+            raise ValueError("sample must be a number in (0, 1]")
+        self.key = (self.kinds, self.actions, self.session_id, self.min_risk, self.fields, self.sample)
+
+    def spec(self):
+        return {k: (list(v) if isinstance(v, tuple) else v) for k, v in zip(SUBSCRIPTION_KEYS, self.key) if v is not None}
+
+    def matches(self, record: dict) -> bool:
+        if self.kinds is not None and record.get('kind') not in self.kinds: return False
+        if self.session_id is not None and record.get('session_id') != self.session_id: return False
+        if self.actions is not None:
+            d = record.get('decision')
+            if not isinstance(d, dict) or d.get('action') not in self.actions: return False
+        if self.min_risk is not None:
+            r = record.get('risk_score')
+            if not isinstance(r, (int, float)) or r < self.min_risk: return False
+        return True
+
+    def project(self, record: dict) -> dict:
+        if self.paths is None: return record
+        out = {}
+        for p in self.paths:
+            if len(p) == 1:
+                if p[0] in record: out[p[0]] = record[p[0]]
+                continue
+            parent = record.get(p[0])
+            if isinstance(parent, dict) and p[1] in parent:
+                out.setdefault(p[0], {})[p[1]] = parent[p[1]]
+        return out
+
+ALL = Subscription()
+
+class Subscriber:
+    """One /ws client: a bounded outbound queue drained by its own writer task."""
+    def __init__(self, ws, queue_size: int):
+        self.ws = ws
+        self.subscription = ALL
+        self.queue = collections.deque()
+        self.queue_size = queue_size
+        self.ready = asyncio.Event()
+        self.task = None
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+
+class Fanout:
+    """Live-feed broadcaster that never waits on client I/O.
+
+    ``publish`` serializes a message once and appends the same string to the queue of
+    every subscriber that wants it; it is synchronous, so callers such as /collect cannot be held
+    up by a slow socket. Each subscriber's writer task sends from its queue, giving up
+    on a send after ``send_timeout`` seconds.
+
+    Subscribers are grouped by ``Subscription``: a record is matched, projected and
+    serialized once per group, and sampling is then applied per client.
+
+    When a subscriber's queue is full, ``slow_policy`` decides what happens:
+      - ``drop_oldest``: discard the oldest queued message (the client sees the freshest feed).
+      - ``drop_newest``: discard the new message.
+      - ``evict``:       close the connection; the client is expected to reconnect.
+    """
+    def __init__(self, queue_size: int = 256, slow_policy: str = 'drop_oldest', send_timeout: float = 5.0):
+        if slow_policy not in SLOW_POLICIES:
+            raise ValueError(f"slow_policy must be one of {SLOW_POLICIES}, got {slow_policy!r}")
+        self.queue_size = queue_size
+        self.slow_policy = slow_policy
+        self.send_timeout = send_timeout
+        self.subscribers = set()
+        self.groups = {}  # Subscription.key -> (Subscription, set of Subscriber)
+        self.counters = {'published': 0, 'sent': 0, 'dropped': 0, 'evicted': 0,
+                         'send_errors': 0, 'peak_queue_depth': 0, 'filtered': 0, 'sampled_out': 0}
+
+    def add(self, ws) -> Subscriber:
+        sub = Subscriber(ws, self.queue_size)
+        sub.task = asyncio.create_task(self._writer(sub))
+        self.subscribers.add(sub)
+        self._join(sub, ALL)
+        return sub
+
+    def _join(self, sub: Subscriber, subscription: Subscription):
+        self._leave(sub)
+        sub.subscription = subscription
+        self.groups.setdefault(subscription.key, (subscription, set()))[1].add(sub)
+
+    def _leave(self, sub: Subscriber):
+        g = self.groups.get(sub.subscription.key)
+        if g is None: return
+        g[1].discard(sub)
+        if not g[1]: del self.groups[sub.subscription.key]
+
+    def handle_message(self, sub: Subscriber, text: str):
+        """Apply a client message: a JSON object replaces the subscription; other text is a keepalive."""
+        if sub.closed: return
+        try:
+            spec = json.loads(text)
+        except ValueError:
+            return
+        if not isinstance(spec, dict): return
+        try:
+            subscription = Subscription(spec)
+        except ValueError as e:
+            self._enqueue(sub, json.dumps({'error': str(e)}))
+            return
+        self._join(sub, subscription)
+        self._enqueue(sub, json.dumps({'subscribed': subscription.spec()}))
+
+    async def remove(self, sub: Subscriber):
+        self._detach(sub)
+        if sub.task is not None and sub.task is not asyncio.current_task():
+            sub.task.cancel()
+            try:
+                await sub.task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def _detach(self, sub: Subscriber):
+        sub.closed = True
+        sub.queue.clear()
+        if sub in self.subscribers:
+            self.subscribers.discard(sub)
+            self._leave(sub)
+
+    def publish(self, message: dict, data: str = None):
+        """Queue ``message`` for matching clients. ``data`` is its JSON, if the caller already has it."""
+        if not self.subscribers: return
+        c = self.counters
+        c['published'] += 1
+        for subscription, subs in list(self.groups.values()):
+            if not subscription.matches(message):
+                c['filtered'] += len(subs)
+                continue
+            if subscription.paths is None:
+                if data is None: data = json.dumps(message)
+                out = data
+            else:
+                out = json.dumps(subscription.project(message))
+            for sub in list(subs):
+                if subscription.sample < 1 and random.random() >= subscription.sample:
+                    c['sampled_out'] += 1
+                    continue
+                self._enqueue(sub, out)
+
+    def _enqueue(self, sub: Subscriber, data: str):
+        c = self.counters
+        q = sub.queue
+        if len(q) >= sub.queue_size:
+            if self.slow_policy == 'evict':
+                self._evict(sub)
+                return
+            sub.dropped += 1
+            c['dropped'] += 1
+            if self.slow_policy == 'drop_newest':
+                return
+            q.popleft()
+        q.append(data)
+        c['peak_queue_depth'] = max(c['peak_queue_depth'], len(q))
+        sub.ready.set()
+
+    def _evict(self, sub: Subscriber):
+        self.counters['evicted'] += 1
+        self._detach(sub)
+        sub.task.cancel()
+        asyncio.create_task(self._close(sub.ws, 1013))  # 1013: try again later
+
+    async def _close(self, ws, code: int):
+        try:
+            await asyncio.wait_for(ws.close(code=code), self.send_timeout)
+        except Exception:
+            pass
+
+    async def _writer(self, sub: Subscriber):
+        c = self.counters
+        while not sub.closed:
+            if not sub.queue:
+                sub.ready.clear()
+                await sub.ready.wait()
+                continue
+            data = sub.queue.popleft()
+            try:
+                await asyncio.wait_for(sub.ws.send_text(data), self.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                c['send_errors'] += 1
+                self._detach(sub)
+                await self._close(sub.ws, 1011)
+                return
+            sub.sent += 1
+            c['sent'] += 1
+
+    def stats(self):
+        depths = [len(s.queue) for s in self.subscribers]
+        return {**self.counters, 'subscribers': len(depths), 'subscriptions': len(self.groups),
+                'slow_policy': self.slow_policy,
+                'queue_capacity': self.queue_size, 'queue_depth_total': sum(depths),
+                'queue_depth_max': max(depths, default=0),
+                'client_dropped_max': max((s.dropped for s in self.subscribers), default=0)}
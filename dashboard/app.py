@@ -1,34 +1,37 @@
 
 import streamlit as st
 import pandas as pd
-import json
+import os
 from pathlib import Path
 import plotly.graph_objects as go
+import pyarrow.dataset as ds
+from event_tail import JsonlTail, SegmentTail
+from trust_core import analytics, challenge
 
 st.set_page_config(page_title='Trust Demo Dashboard', layout='wide')
 st.title('Layer-by-Layer Security – Local Demo')
 
-EVENTS_PATH = Path('/data/events.jsonl')
+EVENTS_PATH = Path(os.getenv('EVENTS_FILE', '/data/events.jsonl'))
+EVENTS_FORMAT = os.getenv('EVENTS_FORMAT', 'jsonl')
+EVENTS_DIR = os.getenv('EVENTS_DIR', '/data/events')
+# When set, metrics come from the Parquet partitions written by `python -m trust_core.analytics`
+ANALYTICS_DIR = os.getenv('ANALYTICS_DIR', '')
+
+RETENTION_ROWS = int(os.getenv('DASHBOARD_RETENTION_ROWS', '200000'))
+RETENTION_S = float(os.getenv('DASHBOARD_RETENTION_S', '0'))
+
+@st.cache_resource
+def event_tail():
+    # One loader per process, shared by all browser sessions; it keeps its read position.
+    if EVENTS_FORMAT == 'segments':
+        return SegmentTail(EVENTS_DIR, retention_rows=RETENTION_ROWS, retention_s=RETENTION_S)
+    return JsonlTail(EVENTS_PATH, retention_rows=RETENTION_ROWS, retention_s=RETENTION_S)
 
-@st.cache_data(ttl=2)
 def load_events():
-    if not EVENTS_PATH.exists():
-        return pd.DataFrame()
-    rows = []
-    with open(EVENTS_PATH, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                rows.append(json.loads(line))
-            except Exception:
-                # skip partial/corrupt lines
-                continue
-    if not rows:
-        return pd.DataFrame()
-    df = pd.DataFrame(rows)
-    return df
+    return event_tail().poll()
+
+ALL_KINDS = ['attempt', 'challenge', 'behavioral_analysis', 'contextual_challenge']
+CHALLENGE_KINDS = ['challenge', 'contextual_challenge']
 
 with st.sidebar:
     st.markdown("**How to use**")
@@ -37,63 +40,77 @@ with st.sidebar:
     st.markdown("3. If step-up prompts, complete the behavioral challenge.")
     st.markdown("4. Toggle simulator flags to see Bot Context change.")
     st.divider()
-    # Get all available event kinds from data
-    all_kinds = ['attempt', 'challenge', 'behavioral_analysis', 'contextual_challenge']
-    kind_filter = st.multiselect('Show event kinds', options=all_kinds, default=all_kinds)
-    if st.button('Refresh'):
-        st.cache_data.clear()
+    kind_filter = st.multiselect('Show event kinds', options=ALL_KINDS, default=ALL_KINDS)
+    st.button('Refresh')  # reruns the script; the loader picks up new events
 
-try:
+def _sub(row, name):
+    # Nested dicts are flattened to name_key columns unless they hold nested structures
+    v = row.get(name)
+    if isinstance(v, dict): return v
+    return {k: (x.tolist() if hasattr(x, 'tolist') else x) for k, x in analytics.unflatten(row, name).items()}
+
+def loader_view(kinds):
     df = load_events()
+    if df.empty or 'kind' not in df.columns:
+        return None
+    if 'ts' in df.columns:
+        df = df.sort_values('ts', ascending=False)
+    df = df[df['kind'].isin(kinds)]
+    attempts = df[df['kind']=='attempt']
+    challenges = df[df['kind'].isin(CHALLENGE_KINDS)]
+    behavioral = df[df['kind']=='behavioral_analysis']
+    agents = int((behavioral['verdict'] == 'agent').sum()) if 'verdict' in behavioral.columns else 0
+    return {'total': len(df), 'attempts': len(attempts), 'challenges': len(challenges), 'agents': agents}, attempts, challenges, behavioral
+
+@st.cache_data(ttl=2)
+def columnar_view(kinds):
+    d = analytics.dataset(ANALYTICS_DIR)
+    if d is None:
+        return None
+    kind = ds.field('kind')
+    def of(ks): return kind.isin([k for k in ks if k in kinds])
+    agents = analytics.count(d, of(['behavioral_analysis']) & (ds.field('verdict') == 'agent')) if 'verdict' in d.schema.names else 0
+    counts = {'total': analytics.count(d, of(ALL_KINDS)), 'attempts': analytics.count(d, of(['attempt'])),
+              'challenges': analytics.count(d, of(CHALLENGE_KINDS)), 'agents': agents}
+    return (counts, analytics.latest(d, 20, of(['attempt'])), analytics.latest(d, 20, of(CHALLENGE_KINDS)),
+            analytics.latest(d, 20, of(['behavioral_analysis'])))
+
+kinds = tuple(kind_filter or ALL_KINDS)
+try:
+    view = columnar_view(kinds) if ANALYTICS_DIR else loader_view(kinds)
 except Exception as e:
     st.error(f'Error loading events: {e}')
-    df = pd.DataFrame()
+    view = None
 
-if df.empty:
+if view is None:
     st.info('No events yet. Submit a payment from http://localhost:3000')
 else:
-    if 'ts' in df.columns:
-        try:
-            df['ts'] = pd.to_datetime(df['ts'], unit='ms', errors='coerce', utc=True)
-            df = df.sort_values('ts', ascending=False)
-        except Exception:
-            # Fallback to simple timestamp handling
-            df['ts'] = pd.to_datetime(df['ts'], errors='coerce')
-            df = df.sort_values('ts', ascending=False)
-
-    if kind_filter:
-        df = df[df['kind'].isin(kind_filter)]
+    counts, attempts, challenges, behavioral = view
 
     colA, colB, colC, colD = st.columns(4)
-    attempts = df[df['kind']=='attempt'] if 'kind' in df.columns else pd.DataFrame()
-    challenges = df[df['kind'].isin(['challenge', 'contextual_challenge'])] if 'kind' in df.columns else pd.DataFrame()
-    behavioral = df[df['kind']=='behavioral_analysis'] if 'kind' in df.columns else pd.DataFrame()
-    
     with colA:
-        st.metric('Total Events', len(df))
+        st.metric('Total Events', counts['total'])
     with colB:
-        st.metric('Attempts', len(attempts))
+        st.metric('Attempts', counts['attempts'])
     with colC:
-        st.metric('Challenges', len(challenges))
+        st.metric('Challenges', counts['challenges'])
     with colD:
-        agent_detected = len(behavioral[behavioral['verdict'] == 'agent']) if not behavioral.empty and 'verdict' in behavioral.columns else 0
-        st.metric('Agents Detected', agent_detected)
+        st.metric('Agents Detected', counts['agents'])
 
     if not attempts.empty:
-        attempts = attempts.copy()
-        attempts['action'] = attempts['decision'].apply(lambda d: d.get('action') if isinstance(d, dict) else None)
         st.subheader('Recent Attempts')
-        st.dataframe(attempts[['ts','risk_score','action','latency_ms','scores']].head(20), use_container_width=True)
+        attempt_cols = ['ts','risk_score','decision_action','latency_ms','scores_bot_context','scores_human_motoric','scores_contextual_risk']
+        st.dataframe(attempts[[c for c in attempt_cols if c in attempts.columns]].head(20).rename(columns={'decision_action': 'action'}), use_container_width=True)
         latest = attempts.iloc[0]
         st.subheader('Latest Attempt – Layer Scores')
-        scores = latest.get('scores', {}) if isinstance(latest.get('scores'), dict) else {}
+        scores = _sub(latest, 'scores')
         c1,c2,c3 = st.columns(3)
         c1.metric('Bot Context', scores.get('bot_context',0))
         c2.metric('Human Motoric', scores.get('human_motoric',0))
         c3.metric('Contextual Risk', scores.get('contextual_risk',0))
-        st.json(latest.get('decision', {}))
+        st.json(_sub(latest, 'decision'))
         with st.expander('Raw Features'):
-            st.json(latest.get('features', {}))
+            st.json(_sub(latest, 'features'))
 
     # Show behavioral analysis results
     if not behavioral.empty:
@@ -114,12 +131,8 @@ else:
             st.metric('Confidence', f"{latest_behavioral.get('confidence', 0):.3f}")
         
         with st.expander('Detailed Analysis'):
-            st.json({
-                'keystroke_analysis': latest_behavioral.get('keystroke_analysis', {}),
-                'mouse_analysis': latest_behavioral.get('mouse_analysis', {}),
-                'timing_analysis': latest_behavioral.get('timing_analysis', {}),
-                'automation_analysis': latest_behavioral.get('automation_analysis', {})
-            })
+            st.json({name: _sub(latest_behavioral, name) for name in
+                     ['keystroke_analysis', 'mouse_analysis', 'timing_analysis', 'automation_analysis']})
     
     if not challenges.empty:
         st.subheader('Recent Challenges')
@@ -143,18 +156,10 @@ else:
             latest_chal = canvas_challenges.iloc[0]
             with st.expander('Replay latest canvas challenge (static plot)'):
                 ps = latest_chal.get('path_spec') if isinstance(latest_chal.get('path_spec'), dict) else None
-                trail = latest_chal.get('trail_sample') if isinstance(latest_chal.get('trail_sample'), list) else []
+                trail = latest_chal.get('trail_sample')
+                trail = list(trail) if isinstance(trail, list) or hasattr(trail, 'tolist') else []
                 if ps and trail:
-                    # Reconstruct bezier samples
-                    def bezier_points(start, end, c1, c2, steps=100):
-                        xs, ys = [], []
-                        for k in range(steps+1):
-                            t = k/steps
-                            x = (1-t)**3*start['x'] + 3*(1-t)**2*t*c1['x'] + 3*(1-t)*t**2*c2['x'] + t**3*end['x']
-                            y = (1-t)**3*start['y'] + 3*(1-t)**2*t*c1['y'] + 3*(1-t)*t**2*c2['y'] + t**3*end['y']
-                            xs.append(x); ys.append(y)
-                        return xs, ys
-                    xs, ys = bezier_points(ps['start'], ps['end'], ps['c1'], ps['c2'])
+                    xs, ys = challenge.bezier_samples(ps)
                     fig = go.Figure()
                     fig.add_trace(go.Scatter(x=xs, y=ys, mode='lines', name='Ideal Path', line=dict(color='#22d3ee')))
                     fig.add_trace(go.Scatter(x=[p['x'] for p in trail], y=[p['y'] for p in trail], mode='lines+markers', name='Your Trail', line=dict(color='#10b981'), marker=dict(size=4)))
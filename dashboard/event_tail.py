@@ -0,0 +1,122 @@
+"""Incremental event loaders for the dashboard.
+
+Each loader remembers where it stopped reading and, on ``poll()``, parses only records
+appended since then and appends them to a cached DataFrame. Records are flattened into
+typed columns (see ``trust_core.analytics.flatten``) as they arrive. History is capped to the last
+``retention_rows`` rows and, if set, to records from the last ``retention_s`` seconds.
+"""
+import json, os, threading
+import pandas as pd
+from trust_core import analytics, eventstore
+
+class _Tail:
+    def __init__(self, retention_rows: int = 200_000, retention_s: float = 0):
+        self.retention_rows = retention_rows
+        self.retention_s = retention_s
+        self.df = pd.DataFrame()
+        self.lock = threading.Lock()
+
+    def _reset(self):
+        self.df = pd.DataFrame()
+
+    def _append(self, rows):
+        if rows:
+            new = pd.DataFrame([analytics.flatten(r) for r in rows])
+            if 'ts' in new.columns:
+                new['ts'] = pd.to_datetime(new['ts'], utc=True)
+            self.df = new if self.df.empty else pd.concat([self.df, new], ignore_index=True, copy=False)
+        if self.retention_s and 'ts' in self.df.columns and not self.df.empty:
+            cutoff = pd.Timestamp.now(tz='UTC') - pd.Timedelta(seconds=self.retention_s)
+            keep = ~(self.df['ts'] < cutoff)
+            if not keep.all():
+                self.df = self.df[keep].reset_index(drop=True)
+        if len(self.df) > self.retention_rows:
+            self.df = self.df.iloc[-self.retention_rows:].reset_index(drop=True)
+
+    def poll(self) -> pd.DataFrame:
+        """Read newly appended records; returns a shallow copy safe for the caller to modify."""
+        with self.lock:
+            self._append(self._read_new())
+            return self.df.copy(deep=False)
+
+class JsonlTail(_Tail):
+    """Follows a JSON-lines file like ``tail -F``.
+
+    A new inode at ``path`` counts as a rotation: the old file is read to its end, then
+    the new one is followed from the start and cached history is kept. A file that shrinks
+    below the read offset counts as a truncation: cached history is dropped and it is re-read.
+    """
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = str(path)
+        self.f = None
+        self.inode = None
+        self.partial = b''
+
+    def _open(self):
+        try:
+            self.f = open(self.path, 'rb')
+        except FileNotFoundError:
+            self.f = self.inode = None
+            return
+        self.inode = os.fstat(self.f.fileno()).st_ino
+        self.partial = b''
+
+    def _drain(self):
+        data = self.partial + self.f.read()
+        lines = data.split(b'\n')
+        self.partial = lines.pop()  # incomplete trailing line, finished by a later write
+        rows = []
+        for line in lines:
+            line = line.strip()
+            if not line: continue
+            try:
+                rows.append(json.loads(line))
+            except Exception:
+                continue  # skip corrupt lines
+        return rows
+
+    def _read_new(self):
+        if self.f is None:
+            self._open()
+            if self.f is None: return []
+        rows = []
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        if st is not None and st.st_ino != self.inode:
+            rows = self._drain()
+            self.f.close()
+            self._open()
+        elif st is not None and st.st_size < self.f.tell():
+            self._reset()
+            self.f.seek(0)
+            self.partial = b''
+        if self.f is not None:
+            rows += self._drain()
+        return rows
+
+class SegmentTail(_Tail):
+    """Follows a ``trust_core.eventstore`` segment directory across rotations."""
+    def __init__(self, root, **kwargs):
+        super().__init__(**kwargs)
+        self.root = str(root)
+        self.seq = None
+        self.offset = 0
+
+    def _read_new(self):
+        segs = [s for s in eventstore.list_segments(self.root) if self.seq is None or s >= self.seq]
+        rows = []
+        for seq in segs:
+            if seq != self.seq:
+                self.seq, self.offset = seq, 0
+            try:
+                f = open(os.path.join(self.root, f"{seq:012d}.seg"), 'rb')
+            except FileNotFoundError:
+                continue  # expired
+            with f:
+                for off, _, payload in eventstore.iter_frames(f, self.offset):
+                    rows.append(eventstore.decode(payload))
+                    self.offset = off + eventstore.FRAME.size + len(payload)
+        return rows
@@ -4,9 +4,29 @@
   function flags(){ return { headless: !!document.getElementById('sim_headless')?.checked, proxy_vpn_tor: !!document.getElementById('sim_proxy')?.checked, lang_mismatch: !!document.getElementById('sim_lang_mismatch')?.checked }; }
   const env = { ua: navigator.userAgent, lang: navigator.language, tz: Intl.DateTimeFormat().resolvedOptions().timeZone, platform: navigator.platform, hwc: navigator.hardwareConcurrency || null, screen: { w: screen.width, h: screen.height, dpr: devicePixelRatio } };
   const mouse = []; const keys = []; let lastMoveTs = 0;
-  document.addEventListener('mousemove', (e) => { const now = performance.now(); const dt = lastMoveTs ? (now - lastMoveTs) : 0; lastMoveTs = now; mouse.push({ x: e.clientX, y: e.clientY, t: now, dt }); if (mouse.length > 1200) mouse.shift(); }, { passive: true });
-  document.addEventListener('keydown', (e) => { keys.push({ k: e.key, t: performance.now() }); if (keys.length > 600) keys.shift(); }, { passive: true });
+  // Streaming (opt in with window.TELEMETRY_STREAM = true): new points go to /telemetry/ws every 500 ms and the
+  // collector keeps running per-session features; /collect then only carries behavior.streamed and the unsent tail.
+  // If the socket fails or never opens (more than STREAM_MAX_PENDING points waiting), streaming stops for the page,
+  // its buffers are dropped and the usual snapshot is sent instead: chunks in flight when a socket closes may be lost.
+  const STREAM_MAX_PENDING = 2400;
+  const stream = { ws: null, timer: null, open: false, failed: false, seq: 0, mouse: [], keys: [] };
+  function startStream(){ if (!window.TELEMETRY_STREAM || stream.ws) return; try { stream.ws = new WebSocket('ws://localhost:8080/telemetry/ws'); } catch (e) { stream.failed = true; return; } stream.ws.onopen = () => { stream.open = true; }; stream.ws.onclose = stream.ws.onerror = abandonStream; stream.timer = setInterval(flushStream, 500); }
+  function abandonStream(){ stream.open = false; stream.failed = true; stream.mouse.length = 0; stream.keys.length = 0; clearInterval(stream.timer); if (stream.ws && stream.ws.readyState < 2) stream.ws.close(); }
+  function streamPush(list, p){ if (!window.TELEMETRY_STREAM || stream.failed) return; list.push(p); if (stream.mouse.length + stream.keys.length > STREAM_MAX_PENDING) abandonStream(); }
+  function streamChunk(){ return { seq: stream.seq++, mouse: stream.mouse.splice(0), keys: stream.keys.splice(0), paste_count: window.__pasteCount || 0 }; }
+  function flushStream(){ if (!stream.open || (!stream.mouse.length && !stream.keys.length)) return; stream.ws.send(JSON.stringify({ session_id: sessionId, ...streamChunk() })); }
+  document.addEventListener('mousemove', (e) => { const now = performance.now(); const dt = lastMoveTs ? (now - lastMoveTs) : 0; lastMoveTs = now; mouse.push({ x: e.clientX, y: e.clientY, t: now, dt }); if (mouse.length > 1200) mouse.shift(); streamPush(stream.mouse, { x: e.clientX, y: e.clientY, t: now }); }, { passive: true });
+  document.addEventListener('keydown', (e) => { const now = performance.now(); keys.push({ k: e.key, t: now }); if (keys.length > 600) keys.shift(); streamPush(stream.keys, e.key === 'Backspace' ? { k: 'Backspace', t: now } : { t: now }); }, { passive: true });
+  startStream();
   document.addEventListener('paste', () => { window.__pasteCount = (window.__pasteCount || 0) + 1; });
+  // Packed wire format (see trust_core/features.py): delta-encoded little-endian int32 columns in base64, with times as
+  // whole microsecond ticks (t0 is the first tick). Opt in with window.TELEMETRY_PACKED = true; the JSON point lists remain the default,
+  // and are also sent when a delta does not fit in int32 (packBehavior returns null).
+  function b64(buf){ const b = new Uint8Array(buf); let s = ''; for (let i = 0; i < b.length; i += 0x8000) s += String.fromCharCode.apply(null, b.subarray(i, i + 0x8000)); return btoa(s); }
+  function deltas(vals, scale = 1, start = 0){ const dv = new DataView(new ArrayBuffer(vals.length*4)); let prev = start; for (let i = 0; i < vals.length; i++){ const q = Math.round(vals[i]*scale), d = q - prev; if (!Number.isFinite(d) || d < -2147483648 || d > 2147483647) return null; dv.setInt32(i*4, d, true); prev = q; } return b64(dv.buffer); }
+  function timeColumn(ps){ const t0 = ps.length ? Math.round(ps[0].t*1000) : 0; return { t0, t: deltas(ps.map(p => p.t), 1000, t0) }; }
+  function packBehavior(ms, ks){ const mouse = { n: ms.length, x: deltas(ms.map(p => p.x)), y: deltas(ms.map(p => p.y)), ...timeColumn(ms) }, keys = { n: ks.length, ...timeColumn(ks), bs: b64(Uint8Array.from(ks, p => p.k === 'Backspace' ? 1 : 0).buffer) }; return [mouse.x, mouse.y, mouse.t, keys.t].includes(null) ? null : { v: 2, mouse, keys }; }
+  function behaviorSnapshot(){ if (stream.open && !stream.failed) return { streamed: true, ...streamChunk() }; const ms = mouse.slice(-800), ks = keys.slice(-400), paste_count = window.__pasteCount || 0; const packed = window.TELEMETRY_PACKED ? packBehavior(ms, ks) : null; return packed ? { packed, paste_count } : { mouse: ms, keys: ks, paste_count }; }
   async function postJSON(url, body){ const res = await fetch(url, { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(body) }); if(!res.ok) throw new Error('HTTP '+res.status); return await res.json(); }
   function dist2(a,b){ const dx=a.x-b.x, dy=a.y-b.y; return Math.sqrt(dx*dx+dy*dy); }
   const modal = { root:null, canvas:null, ctx:null, msg:null, path:null, dragging:false, points:[], started:false };
@@ -70,5 +90,5 @@
     draw();
   }
 
-  window.attachPaymentForm = function(formId){ const form = document.getElementById(formId); form.addEventListener('submit', async (e) => { e.preventDefault(); const formData = Object.fromEntries(new FormData(form).entries()); const snap = { session_id: sessionId, ts: new Date().toISOString(), channel: 'web', env: {...env, flags: flags()}, behavior: { mouse: mouse.slice(-800), keys: keys.slice(-400), paste_count: window.__pasteCount || 0 }, journey: { amount: formData.amount, beneficiary: formData.beneficiary, new_beneficiary: true } }; try{ const res = await postJSON('http://localhost:8080/collect', snap); const dec = res.decision || {}; const el = document.getElementById('decision'); el.textContent = `Action: ${dec.action}  |  Reasons: ${(dec.reasons||[]).join(', ')}`; if (dec.action === 'step_up_behavior_challenge'){ await openChallenge(); } else if (dec.action === 'step_up_webauthn'){ alert('Step-Up suggested: WebAuthn (placeholder in local demo)'); } else { alert('Submitted! Action: '+dec.action+' — Check Dashboard http://localhost:8501'); form.reset(); } } catch(err){ alert('Error: '+err.message); } }); };
+  window.attachPaymentForm = function(formId){ const form = document.getElementById(formId); form.addEventListener('submit', async (e) => { e.preventDefault(); const formData = Object.fromEntries(new FormData(form).entries()); const snap = { session_id: sessionId, ts: new Date().toISOString(), channel: 'web', env: {...env, flags: flags()}, behavior: behaviorSnapshot(), journey: { amount: formData.amount, beneficiary: formData.beneficiary, new_beneficiary: true } }; try{ const res = await postJSON('http://localhost:8080/collect', snap); const dec = res.decision || {}; const el = document.getElementById('decision'); el.textContent = `Action: ${dec.action}  |  Reasons: ${(dec.reasons||[]).join(', ')}`; if (dec.action === 'step_up_behavior_challenge'){ await openChallenge(); } else if (dec.action === 'step_up_webauthn'){ alert('Step-Up suggested: WebAuthn (placeholder in local demo)'); } else { alert('Submitted! Action: '+dec.action+' — Check Dashboard http://localhost:8501'); form.reset(); } } catch(err){ alert('Error: '+err.message); } }); };
 })();
@@ -1,5 +1,6 @@
 
-function startLiveEvents(wsUrl){
+// subscription (optional): {kinds, actions, session_id, min_risk, fields, sample}, sent on connect
+function startLiveEvents(wsUrl, subscription){
   const box = document.getElementById('live');
   function log(o){
     const pre = document.createElement('pre');
@@ -9,7 +10,10 @@ function startLiveEvents(wsUrl){
   }
   try{
     const ws = new WebSocket(wsUrl);
-    ws.onopen = () => log('WS connected');
+    ws.onopen = () => {
+      log('WS connected');
+      if (subscription) ws.send(JSON.stringify(subscription));
+    };
     ws.onmessage = (ev) => { try{ log(JSON.parse(ev.data)); } catch{ log(ev.data); } };
     ws.onclose = () => log('WS closed');
     ws.onerror = () => log('WS error');
@@ -1,25 +1,47 @@
-
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+import time
+from trust_core import metrics, model, tracing
 
 app = FastAPI(title="Models Service")
+app.add_middleware(metrics.ASGIMetrics)
+app.add_middleware(tracing.ServerTiming)  # Server-Timing on calls traced by the collector
+
+# Loaded (and warmed up) once at startup; without MODEL_PATH this is the rule scorer
+scorer = model.scorer()
+
+SCORE = metrics.STAGE_SECONDS.labels('score')
+SCORE_BATCH = metrics.STAGE_SECONDS.labels('score_batch')
+metrics.callback('trust_model_fallbacks_total', 'Batches scored by rules because the model failed', 'counter',
+                 lambda: scorer.fallbacks)
+metrics.callback('trust_model_info', 'Active model version', 'gauge', lambda: {scorer.version: 1}, ['version'])
+
+# Every stage response names the version that produced it (see feature_svc)
+VERSION_HEADER = 'X-Version'
 
 @app.post('/score')
-def score(features: dict):
-    bot_ctx = 0.0
-    if features.get('ua_len', 0) < 50: bot_ctx += 0.1
-    if features.get('flag_headless',0)==1: bot_ctx += 0.5
-    if features.get('flag_proxy',0)==1: bot_ctx += 0.3
-    if features.get('flag_lang_mismatch',0)==1: bot_ctx += 0.2
-    bot_ctx = min(1.0, bot_ctx)
-
-    tremor = features.get('tremor', 0.0)
-    ikd_std = features.get('ikd_std', 0.0)
-    human_motoric = max(0.0, min(1.0, 0.5*min(1.0, tremor) + 0.5*min(1.0, ikd_std/120.0)))
-
-    ctx = 0.0
-    if features.get('new_beneficiary',0)==1: ctx += 0.3
-    if features.get('amount',0) > 10000: ctx += 0.4
-    if features.get('paste_count',0) >= 1: ctx += 0.2
-
-    risk = 0.35*bot_ctx + 0.30*(1-human_motoric) + 0.35*ctx
-    return {'scores': {'bot_context': round(bot_ctx,3), 'human_motoric': round(human_motoric,3), 'contextual_risk': round(ctx,3)}, 'risk_score': round(risk,3)}
+def score(features: dict, response: Response):
+    t0 = time.perf_counter()
+    s = scorer.score(features)
+    SCORE.since(t0)
+    response.headers[VERSION_HEADER] = scorer.version
+    return s
+
+@app.post('/score_batch')
+def score_batch(features: list[dict], response: Response):
+    t0 = time.perf_counter()
+    s = scorer.score_batch(features)
+    SCORE_BATCH.since(t0)
+    response.headers[VERSION_HEADER] = scorer.version
+    return s
+
+@app.get('/version')
+def version():
+    return {'version': scorer.version}
+
+@app.get('/model')
+def model_info():
+    return scorer.stats()
+
+@app.get('/metrics')
+def prometheus():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
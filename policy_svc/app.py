@@ -1,32 +1,48 @@
-
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+import time
+from trust_core import metrics, policy, tracing
 
 app = FastAPI(title="Policy Service")
+app.add_middleware(metrics.ASGIMetrics)
+app.add_middleware(tracing.ServerTiming)  # Server-Timing on calls traced by the collector
+
+DECIDE = metrics.STAGE_SECONDS.labels('decide')
+DECIDE_BATCH = metrics.STAGE_SECONDS.labels('decide_batch')
+metrics.callback('trust_policy_reloads_total', 'Rules file reloads', 'counter', lambda: policy.ruleset().reloads)
+metrics.callback('trust_policy_reload_errors_total', 'Rules files that failed to compile', 'counter',
+                 lambda: policy.ruleset().errors)
+metrics.callback('trust_policy_info', 'Active rules version', 'gauge', lambda: {policy.version(): 1}, ['version'])
+
+# Every stage response names the rules version that produced it (see feature_svc)
+VERSION_HEADER = 'X-Version'
 
 @app.post('/decide')
-def decide(scored: dict):
-    scores = scored.get('scores', {}) or {}
-    r = float(scored.get('risk_score',0))
-
-    # Tuned thresholds
-    if r <= 0.20:
-        action = 'allow'
-    elif r <= 0.45:
-        action = 'step_up_webauthn'
-    elif r <= 0.92:
-        action = 'step_up_behavior_challenge'
-    else:
-        action = 'deny'
-
-    # Hard block condition
-    if scores.get('contextual_risk',0) >= 0.70 and scores.get('bot_context',0) >= 0.80:
-        action = 'deny'
-
-    reasons = []
-    if scores.get('contextual_risk',0) >= 0.5: reasons.append('high_contextual_risk')
-    if scores.get('human_motoric',1) < 0.3: reasons.append('low_human_motoric')
-    if scores.get('bot_context',0) > 0.5: reasons.append('bot_context_signals')
-    if action == 'deny' and scores.get('contextual_risk',0) >= 0.70 and scores.get('bot_context',0) >= 0.80:
-        reasons.append('hard_block_high_bot_and_context')
-
-    return { 'action': action, 'reasons': reasons[:4] }
+def decide(scored: dict, response: Response):
+    t0 = time.perf_counter()
+    d = policy.decide(scored)
+    DECIDE.since(t0)
+    metrics.DECISIONS.labels(d['action']).inc()
+    response.headers[VERSION_HEADER] = policy.version()
+    return d
+
+@app.post('/decide_batch')
+def decide_batch(records: list[dict], response: Response):
+    t0 = time.perf_counter()
+    ds = policy.decide_batch(records)
+    DECIDE_BATCH.since(t0)
+    for d in ds:
+        metrics.DECISIONS.labels(d['action']).inc()
+    response.headers[VERSION_HEADER] = policy.version()
+    return ds
+
+@app.get('/version')
+def version():
+    return {'version': policy.version()}
+
+@app.get('/rules')
+def rules():
+    return policy.ruleset().stats()
+
+@app.get('/metrics')
+def prometheus():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
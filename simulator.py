@@ -11,10 +11,13 @@ from sklearn.metrics import confusion_matrix, accuracy_score
 # Advanced Agent (Red Team)
 # ==============================
 class AdvancedHumanLikeAgent:
-    def __init__(self, username, password, human_like=True):
+    def __init__(self, username, password, human_like=True, clock=None):
         self.username = username
         self.password = password
         self.human_like = human_like
+        # a clock with time()/sleep() (e.g. benchmark.VirtualClock) replays the session without waiting
+        self.time = clock.time if clock else time.time
+        self.sleep = clock.sleep if clock else time.sleep
         self.session_log = []
         self.ip_address = self.get_random_ip()
 
@@ -24,51 +27,51 @@ class AdvancedHumanLikeAgent:
             "203.0.113.12", "198.51.100.34"
         ]
         ip = random.choice(residential_ips)
-        self.session_log.append(("ip_selected", ip, time.time()))
+        self.session_log.append(("ip_selected", ip, self.time()))
         return ip
 
     def simulate_keystrokes(self, text):
         for char in text:
             delay = random.uniform(0.08, 0.3) if self.human_like else random.uniform(0.01, 0.05)
-            time.sleep(delay)
-            self.session_log.append(("keystroke", time.time()))
+            self.sleep(delay)
+            self.session_log.append(("keystroke", self.time()))
 
     def simulate_mouse_movement(self, start, end, steps=20):
         for i in range(steps):
             jitter_x = random.uniform(-2, 2) if self.human_like else 0
             jitter_y = random.uniform(-2, 2) if self.human_like else 0
-            time.sleep(random.uniform(0.01, 0.05))
-            self.session_log.append(("mouse_move", (start[0]+i, start[1]+i), time.time()))
+            self.sleep(random.uniform(0.01, 0.05))
+            self.session_log.append(("mouse_move", (start[0]+i+jitter_x, start[1]+i+jitter_y), self.time()))
 
     def browse_store(self):
         pages = ["home", "category", "product", "cart"]
         noise_pages = ["blog", "faq", "about-us", "terms"]
         for page in pages:
             dwell = random.uniform(2, 6) if self.human_like else random.uniform(0.5, 1.5)
-            time.sleep(dwell)
-            self.session_log.append(("page_view", page, time.time()))
+            self.sleep(dwell)
+            self.session_log.append(("page_view", page, self.time()))
             if self.human_like and random.random() < 0.3:
                 noise_page = random.choice(noise_pages)
-                time.sleep(random.uniform(1, 3))
-                self.session_log.append(("page_view", noise_page, time.time()))
+                self.sleep(random.uniform(1, 3))
+                self.session_log.append(("page_view", noise_page, self.time()))
 
     def solve_captcha(self):
         delay = random.uniform(2, 5) if self.human_like else random.uniform(0.5, 1.0)
-        time.sleep(delay)
-        self.session_log.append(("captcha_solved", delay, time.time()))
+        self.sleep(delay)
+        self.session_log.append(("captcha_solved", delay, self.time()))
 
     def handle_mfa(self):
         delay = random.uniform(3, 6) if self.human_like else random.uniform(0.5, 1.0)
-        time.sleep(delay)
-        self.session_log.append(("mfa_completed", delay, time.time()))
+        self.sleep(delay)
+        self.session_log.append(("mfa_completed", delay, self.time()))
 
     def checkout(self):
         self.simulate_keystrokes(self.username)
         self.simulate_keystrokes(self.password)
         self.solve_captcha()
         self.handle_mfa()
-        time.sleep(random.uniform(1, 3))
-        self.session_log.append(("checkout", time.time()))
+        self.sleep(random.uniform(1, 3))
+        self.session_log.append(("checkout", self.time()))
 
     def run(self):
         self.browse_store()
@@ -168,4 +171,5 @@ def simulate():
     plt.show()
 
 # Run simulation
-simulate()
\ No newline at end of file
+if __name__ == "__main__":
+    simulate()
\ No newline at end of file
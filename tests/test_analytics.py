@@ -0,0 +1,24 @@
+import json, os
+from trust_core import analytics
+
+def _write(path, ids):
+    with open(path, 'a') as f:
+        for i in ids: f.write(json.dumps({'kind': 'attempt', 'ts': 1_700_000_000_000 + i, 'session_id': f's{i}'}) + '\n')
+
+def _sessions(out):
+    return sorted(int(s[1:]) for s in analytics.dataset(str(out)).to_table(columns=['session_id'])['session_id'].to_pylist())
+
+def test_rotated_log_is_drained_before_the_new_one(tmp_path):
+    log, out = tmp_path/'events.jsonl', tmp_path/'an'
+    _write(log, range(10)); analytics.compact(str(log), str(out))
+    _write(log, range(10, 40)); os.rename(log, f'{log}.1'); _write(log, range(40, 45))
+    analytics.compact(str(log), str(out), batch=7)
+    assert _sessions(out) == list(range(45))
+
+def test_lost_rotation_is_recorded(tmp_path):
+    log, out = tmp_path/'events.jsonl', tmp_path/'an'
+    _write(log, range(10)); analytics.compact(str(log), str(out))
+    _write(log, range(10, 15)); os.rename(log, f'{log}.gz'); _write(log, range(15, 20)); os.remove(f'{log}.gz')
+    analytics.compact(str(log), str(out))
+    cp = json.load(open(out/analytics.CHECKPOINT))
+    assert _sessions(out) == [*range(10), *range(15, 20)] and [s['reason'] for s in cp['skipped']] == ['rotated file not found']
@@ -0,0 +1,15 @@
+import pytest
+from trust_core import detection
+
+def test_batch_matches_single_and_fixtures():
+    assert detection.main(['--sessions', '300', '--seed', '2']) == 0
+
+@pytest.mark.parametrize('body', [b'{}', b'[1]', b'[{"keystrokes": 3}]', b'[{"keystrokes": [1]}]',
+                                  b'[{"mouse_movements": [{"x": "1"}]}]', b'[{"env_flags": []}]', b'not json'])
+def test_malformed_body_raises_value_error(body):
+    with pytest.raises(ValueError):
+        detection.analyze_body(body)
+
+def test_body_returns_records():
+    records = detection.analyze_body(b'[{"session_id": "s1", "ts": 5, "keystrokes": [{"ts": 1, "dwell": null}]}]')
+    assert [(r['kind'], r['session_id'], r['ts']) for r in records] == [('behavioral_analysis', 's1', 5)]
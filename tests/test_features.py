@@ -0,0 +1,58 @@
+import random
+import pytest
+from trust_core import features
+
+PLACES = {'mean_vel': 4, 'tremor': 4, 'curv': 4, 'ikd_mean': 2, 'ikd_std': 2, 'backspace_rate': 4}
+
+def _trail(rng, n_mouse, n_keys, repeat=0.01, origin=(0, 0)):
+    """Mouse and key points with a share of repeated timestamps, as coarse timers and fast mice give."""
+    t, mouse = rng.uniform(1e3, 1e7), []
+    for _ in range(n_mouse):
+        t += 0.0 if rng.random() < repeat else rng.uniform(4, 20)
+        mouse.append({'x': origin[0] + rng.randint(0, 1920), 'y': origin[1] + rng.randint(0, 1080), 't': t})
+    t, keys = rng.uniform(1e3, 1e7), []
+    for _ in range(n_keys):
+        t += 0.0 if rng.random() < repeat else rng.uniform(40, 400)
+        keys.append({'k': 'Backspace' if rng.random() < 0.1 else 'a', 't': t})
+    return mouse, keys
+
+def _close(got, want):
+    # Times are packed as whole microseconds: about 1e-4 relative on velocities at 4 ms steps.
+    return all(abs(got[k] - want[k]) <= 1.01*10**-p + 2e-4*abs(want[k]) for k, p in PLACES.items())
+
+@pytest.mark.parametrize('repeat', [0.01, 0.2])
+def test_packed_matches_json_with_repeated_timestamps(repeat):
+    rng = random.Random(7)
+    for _ in range(100):
+        mouse, keys = _trail(rng, rng.choice([2, 50, 800]), rng.choice([2, 40, 400]), repeat)
+        want = features.featurize({'behavior': {'mouse': mouse, 'keys': keys}})
+        got = features.featurize({'behavior': {'packed': features.pack_behavior(mouse, keys)}})
+        assert got['mean_vel'] >= 0 and _close(got, want), (got, want)
+
+def test_packed_keeps_large_coordinates():
+    rng = random.Random(8)
+    mouse, keys = _trail(rng, 200, 0, origin=(40000, -70000))
+    xs, ys, _ = features.unpack_mouse(features.pack_behavior(mouse, keys))
+    assert list(xs) == [p['x'] for p in mouse] and list(ys) == [p['y'] for p in mouse]
+
+def test_pack_rejects_time_gap_over_int32():
+    mouse = [{'x': 0, 'y': 0, 't': 0.0}, {'x': 1, 'y': 1, 't': 3.6e6}]
+    with pytest.raises(ValueError):
+        features.pack_behavior(mouse, [])
+
+def test_old_packed_version_is_rejected():
+    with pytest.raises(ValueError):
+        features.featurize({'behavior': {'packed': {'v': 1, 'mouse': {'n': 0}, 'keys': {'n': 0}}}})
+
+def _event(rng, packed):
+    mouse, keys = _trail(rng, rng.choice([0, 1, 2, 3, 50, 800]), rng.choice([0, 1, 2, 40, 400]), rng.choice([0.0, 0.01, 0.2]))
+    behavior = {'packed': features.pack_behavior(mouse, keys)} if packed else {'mouse': mouse, 'keys': keys}
+    return {'behavior': {**behavior, 'paste_count': rng.randint(0, 3)},
+            'env': {'ua': 'x'*rng.randint(0, 200), 'flags': {'headless': rng.random() < 0.2}},
+            'journey': {'amount': rng.uniform(0, 5000), 'new_beneficiary': rng.random() < 0.5}}
+
+@pytest.mark.parametrize('packed', [False, True, None])
+def test_batch_matches_featurize(packed):
+    rng = random.Random(9)
+    events = [_event(rng, rng.random() < 0.5 if packed is None else packed) for _ in range(300)]
+    assert features.featurize_batch(events) == [features.featurize(e) for e in events]
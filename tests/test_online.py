@@ -0,0 +1,56 @@
+import random
+import pytest
+from trust_core import features
+from trust_core.online import BehaviorAccumulator, TelemetryStore
+from trails import PLACES, close, merge_tree, mismatches, random_session, split
+
+def _chunks(rng, mouse, keys):
+    parts = rng.randint(1, 12)
+    return [{'mouse': m, 'keys': k} for m, k in zip(split(rng, mouse, parts), split(rng, keys, parts))]
+
+def _streamed(chunks):
+    acc = BehaviorAccumulator()
+    for c in chunks: acc.add_chunk(c)
+    return acc
+
+def _shards(chunks):
+    out = [BehaviorAccumulator() for _ in chunks]
+    for acc, c in zip(out, chunks): acc.add_chunk(c)
+    return out
+
+@pytest.mark.parametrize('seed', range(8))
+def test_streamed_and_merged_match_batch(seed):
+    rng = random.Random(seed)
+    for _ in range(250):
+        mouse, keys = random_session(rng)
+        want = {**features.mouse_features(mouse), **features.keystroke_features(keys)}
+        chunks = _chunks(rng, mouse, keys)
+        for acc in (_streamed(chunks), merge_tree(rng, _shards(chunks))):
+            assert mismatches(acc.features(), want) == {}
+
+def test_merge_is_associative_on_neighbours():
+    rng = random.Random(0)
+    mouse = [{'x': rng.randint(0, 1920), 'y': rng.randint(0, 1080), 't': 16.0*i} for i in range(300)]
+    keys = [{'k': 'a', 't': 120.0*i} for i in range(40)]
+    chunks = [{'mouse': m, 'keys': k} for m, k in zip(split(rng, mouse, 3), split(rng, keys, 3))]
+    a, b, c = _shards(chunks)
+    left = a.merge(b).merge(c).features()
+    a, b, c = _shards(chunks)
+    right = a.merge(b.merge(c)).features()
+    assert all(close(left[k], right[k], PLACES[k]) for k in PLACES)
+
+def _coarse(points, step=0.005):
+    """Times on a 5 us grid, like performance.now() in a browser, so packing loses nothing."""
+    return [{**p, 't': round(p['t']/step)*step} for p in points]
+
+@pytest.mark.parametrize('seed', range(4))
+def test_streamed_packed_chunks_match_batch(seed):
+    rng = random.Random(100 + seed)
+    store = TelemetryStore()
+    for i in range(250):
+        mouse, keys = map(_coarse, random_session(rng))
+        want = {**features.mouse_features(mouse), **features.keystroke_features(keys)}
+        for seq, c in enumerate(_chunks(rng, mouse, keys)):
+            store.ingest(f's{i}', {'seq': seq, 'packed': features.pack_behavior(c['mouse'], c['keys'])})
+        if mouse or keys:
+            assert mismatches(store.features(f's{i}'), want) == {}
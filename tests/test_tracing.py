@@ -0,0 +1,25 @@
+from trust_core import tracing
+
+def _tracer(sample):
+    return tracing.Tracer(sample=sample, profile_ms=5.0, trusted_nets=['10.0.0.0/8', '127.0.0.1/32'])
+
+def test_external_trace_id_does_not_force_tracing():
+    tracer = _tracer(1e-9)
+    assert all(tracer.begin('collect', 'abc', '203.0.113.7') is None for _ in range(100))
+    assert tracer.counters['ignored_ids'] == 100 and tracer.sampler.thread is None
+
+def test_external_trace_id_is_replaced_when_sampled():
+    tracer = _tracer(1.0)
+    tr = tracer.begin('collect', 'abc', '203.0.113.7')
+    assert tr.id != 'abc' and tr in tracer.sampler.active
+    tracer.end(tr)
+
+def test_trusted_trace_id_is_traced_without_profiling():
+    tracer = _tracer(1e-9)
+    tr = tracer.begin('collect', 'abc', '10.1.2.3')
+    assert tr.id == 'abc' and tracer.sampler.thread is None
+    tracer.end(tr)
+    assert tracer.counters['forced'] == 1
+
+def test_off_ignores_trusted_ids():
+    assert _tracer(0).begin('collect', 'abc', '127.0.0.1') is None
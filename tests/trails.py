@@ -0,0 +1,36 @@
+"""Random trails and merge helpers shared by the accumulator tests."""
+import random
+
+# Decimal places each feature is rounded to
+PLACES = {'mean_vel': 4, 'tremor': 4, 'curv': 4, 'ikd_mean': 2, 'ikd_std': 2, 'backspace_rate': 4}
+
+def random_session(rng: random.Random):
+    """Mouse and key point lists with random lengths, repeated timestamps and Backspaces."""
+    n = rng.choice([0, 1, 2, 3, 10, 200, 1500])
+    t, mouse = rng.uniform(0, 1e4), []
+    for _ in range(n):
+        t += rng.choice([0.0, 0.5, 8.0, 16.0, rng.uniform(0, 200)])
+        mouse.append({'x': rng.randint(0, 1920), 'y': rng.randint(0, 1080), 't': t})
+    t, keys = rng.uniform(0, 1e4), []
+    for _ in range(rng.choice([0, 1, 2, 30, 400])):
+        t += rng.choice([0.0, rng.uniform(20, 600)])
+        keys.append({'k': 'Backspace' if rng.random() < 0.1 else 'a', 't': t})
+    return mouse, keys
+
+def split(rng: random.Random, seq, parts):
+    cuts = sorted(rng.randint(0, len(seq)) for _ in range(parts - 1))
+    return [seq[a:b] for a, b in zip([0, *cuts], [*cuts, len(seq)])]
+
+def merge_tree(rng: random.Random, accs):
+    """Merge neighbouring accumulators in random order until one is left."""
+    accs = list(accs)
+    while len(accs) > 1:
+        i = rng.randrange(len(accs) - 1)
+        accs[i:i+2] = [accs[i].merge(accs[i+1])]
+    return accs[0]
+
+def close(a, b, places):
+    return abs(a - b) <= 1.01*10**-places + 1e-9*abs(b)
+
+def mismatches(got, want):
+    return {k: (got[k], v) for k, v in want.items() if not close(got[k], v, PLACES[k])}
@@ -0,0 +1,5 @@
+"""Shared pipeline stages used by the services and by the collector's fused mode.
+
+Modules are imported individually (``trust_core.features`` needs NumPy, the others do not)
+so each service image only installs what it uses.
+"""
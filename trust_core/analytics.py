@@ -0,0 +1,375 @@
+"""Columnar (Parquet/Arrow) view of the event log for dashboard aggregates.
+
+``flatten`` turns a raw event into top-level columns: scalar-only sub-dicts such as
+``scores``, ``decision`` or ``features`` become ``scores_bot_context``, ``decision_action``,
+``features_mean_vel``... and ``ts`` becomes a UTC datetime.
+
+Every column has a declared type, so files written at different times always agree and
+one odd record cannot break the dataset. The known record fields are typed in ``SCHEMA``.
+Columns under ``features_``, ``scores_`` and the detection analyses are typed by prefix.
+Any other column is stored as a string (JSON for non-string values). A value that does
+not fit its column's type is stored as null.
+
+``compact`` reads new records from the event log, starting at a checkpoint, and writes them
+under ``root/kind=<kind>/hour=<YYYYMMDDHH>/`` as Parquet files. A rotated JSON-lines log is
+read to its end before the new one (see ``_read_jsonl``). The checkpoint also records
+every column written so far, so ``dataset`` can build the schema without reading file
+footers. Each run adds a file per partition it touches. A partition is merged back into
+a single file once its hour has closed, or once it holds ``merge_files`` files.
+
+Run ``python -m trust_core.analytics --help`` for the compaction job.
+"""
+import argparse, glob, json, os, sys, time, uuid
+from datetime import datetime, timezone
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from trust_core import eventstore
+
+CHECKPOINT = '_checkpoint.json'
+
+def _scalar(v):
+    return v is None or isinstance(v, (str, int, float, bool))
+
+def _point(*names):
+    return pa.struct([(n, pa.float64()) for n in names])
+
+SCHEMA = pa.schema([
+    ('kind', pa.string()), ('ts', pa.timestamp('us', tz='UTC')), ('session_id', pa.string()),
+    ('channel', pa.string()), ('risk_score', pa.float64()), ('model_version', pa.string()),
+    ('latency_ms', pa.float64()), ('cached', pa.string()),
+    ('decision_action', pa.string()), ('decision_reasons', pa.list_(pa.string())),
+    ('passed', pa.bool_()), ('reason', pa.string()), ('adherence_px_median', pa.float64()),
+    ('tremor', pa.float64()), ('accuracy', pa.float64()), ('challenge_type', pa.string()),
+    ('response_time_ms', pa.float64()),
+    ('path_spec', pa.struct([(k, _point('x', 'y')) for k in ('start', 'end', 'c1', 'c2')])),
+    ('trail_sample', pa.list_(_point('x', 'y', 't'))),
+    ('verdict', pa.string()), ('agent_probability', pa.float64()), ('confidence', pa.float64()),
+    ('automation_analysis_score', pa.float64()),
+])
+_TYPES = {f.name: f.type for f in SCHEMA}
+PREFIX_TYPES = (('features_', pa.float64()), ('scores_', pa.float64()), ('keystroke_analysis_', pa.float64()),
+                ('mouse_analysis_', pa.float64()), ('timing_analysis_', pa.float64()),
+                ('automation_analysis_', pa.bool_()))
+
+def column_type(name: str):
+    t = _TYPES.get(name)
+    if t is not None: return t
+    for prefix, t in PREFIX_TYPES:
+        if name.startswith(prefix): return t
+    return pa.string()
+
+def _float(v):
+    return float(v) if isinstance(v, (int, float)) else None
+
+def _coerce(v, t):
+    """``v`` as a Python value of Arrow type ``t``, or None if it does not fit."""
+    if v is None: return None
+    if t == pa.string():
+        return v if isinstance(v, str) else json.dumps(v, default=str)
+    if t == pa.float64(): return _float(v)
+    if t == pa.bool_(): return bool(v) if isinstance(v, (bool, int, float)) else None
+    if pa.types.is_timestamp(t): return v
+    if pa.types.is_list(t):
+        if not isinstance(v, list): return None
+        return [_coerce(x, t.value_type) for x in v]
+    if pa.types.is_struct(t):
+        if not isinstance(v, dict): return None
+        return {f.name: _coerce(v.get(f.name), f.type) for f in t}
+    return None
+
+def parse_ts(v):
+    """Epoch-ms number or ISO-8601 string -> aware UTC datetime, or None."""
+    if v is None or isinstance(v, bool): return None
+    try:
+        if isinstance(v, (int, float)):
+            return datetime.fromtimestamp(v/1000.0, tz=timezone.utc)
+        dt = datetime.fromisoformat(str(v))
+        return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        return None
+
+def flatten(record: dict) -> dict:
+    out = {}
+    for k, v in record.items():
+        if k == 'ts':
+            out['ts'] = parse_ts(v)
+        elif isinstance(v, dict) and all(_scalar(x) or (isinstance(x, list) and all(_scalar(y) for y in x)) for x in v.values()):
+            for sk, sv in v.items():
+                out[f"{k}_{sk}"] = sv
+        else:
+            out[k] = v
+    return {k: _coerce(v, column_type(k)) for k, v in out.items()}
+
+def unflatten(row, prefix: str) -> dict:
+    """Rebuild a flattened sub-dict (e.g. ``features``) from a row mapping."""
+    p = prefix + '_'
+    return {k[len(p):]: v for k, v in row.items() if k.startswith(p)}
+
+def _hour(flat):
+    ts = flat.get('ts') or datetime.now(timezone.utc)
+    return ts.strftime('%Y%m%d%H')
+
+def _table(rows):
+    names = list(dict.fromkeys(k for r in rows for k in r))
+    return pa.Table.from_pylist(rows, schema=pa.schema([(n, column_type(n)) for n in names]))
+
+def _write(table, d):
+    path = os.path.join(d, f"part-{uuid.uuid4().hex}.parquet")
+    tmp = os.path.join(d, f".{uuid.uuid4().hex}.tmp")  # dot files are skipped by dataset discovery
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+    return path
+
+def write_partitions(records, root: str):
+    """Write records as one Parquet file per (kind, hour) partition.
+
+    Returns the files written and the set of columns they contain.
+    """
+    groups = {}
+    for rec in records:
+        flat = flatten(rec)
+        groups.setdefault((str(rec.get('kind')), _hour(flat)), []).append(flat)
+    written, columns = [], set()
+    for (kind, hour), rows in groups.items():
+        d = os.path.join(root, f"kind={kind}", f"hour={hour}")
+        os.makedirs(d, exist_ok=True)
+        t = _table(rows)
+        columns.update(t.column_names)
+        written.append(_write(t, d))
+    return written, columns
+
+def _parts(d):
+    return sorted(glob.glob(os.path.join(d, 'part-*.parquet')))
+
+def merge_partition(root: str, d: str, cp: dict):
+    """Rewrite the part files of partition directory ``d`` as one file; returns the files merged.
+
+    The merge is noted in the checkpoint before the merged file is moved into place, so a
+    crash in between is finished by ``_finish_merge`` rather than leaving duplicate rows.
+    """
+    parts = _parts(d)
+    if len(parts) < 2: return 0
+    try:
+        table = pa.concat_tables([pq.read_table(p) for p in parts], promote_options='default')
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return 0  # files from before the declared schema may not combine; leave them
+    path = os.path.join(d, f"part-{uuid.uuid4().hex}.parquet")
+    tmp = os.path.join(d, f".{uuid.uuid4().hex}.tmp")
+    pq.write_table(table, tmp)
+    cp['merging'] = {'target': path, 'sources': parts}
+    _save_checkpoint(root, cp)
+    os.replace(tmp, path)
+    _finish_merge(root, cp)
+    return len(parts)
+
+def _finish_merge(root, cp):
+    m = cp.pop('merging', None)
+    if m is None: return
+    if os.path.exists(m['target']):
+        for p in m['sources']:
+            try: os.remove(p)
+            except FileNotFoundError: pass
+    _save_checkpoint(root, cp)
+
+PARTITIONING = ds.partitioning(pa.schema([('kind', pa.string()), ('hour', pa.int32())]), flavor='hive')
+
+def dataset_schema(columns):
+    names = [n for n in sorted(columns) if n not in _TYPES and n not in ('hour',)]
+    return pa.schema(list(SCHEMA) + [(n, column_type(n)) for n in names] + [('hour', pa.int32())])
+
+def dataset(root: str):
+    """Open the partitioned dataset, or None if nothing has been compacted yet.
+
+    The schema comes from the declared types and the column list in the checkpoint, so
+    no file footers are read here.
+    """
+    cp = _load_checkpoint(root) if os.path.isdir(root) else {}
+    if not cp.get('columns'): return None
+    return ds.dataset(root, schema=dataset_schema(cp['columns']), format='parquet', partitioning=PARTITIONING,
+                      exclude_invalid_files=False)
+
+def count(d, filter=None) -> int:
+    return d.count_rows(filter=filter) if d is not None else 0
+
+def latest(d, n: int, filter=None, columns=None):
+    """Newest ``n`` rows by ``ts`` as a DataFrame.
+
+    Walks the hour partitions of the matching files newest-first, counting rows from
+    metadata, and reads full columns only for the hours needed to cover ``n`` rows.
+    """
+    import pandas as pd
+    if d is None: return pd.DataFrame()
+    # hours come from the partition directories of the matching files, not from the rows
+    hours = {ds.get_partition_keys(f.partition_expression).get('hour') for f in d.get_fragments(filter=filter)}
+    hours.discard(None)
+    picked, total = [], 0
+    for h in sorted(hours, reverse=True):
+        picked.append(h)
+        total += d.count_rows(filter=(ds.field('hour') == h) if filter is None else (filter & (ds.field('hour') == h)))
+        if total >= n: break
+    if not picked: return pd.DataFrame()
+    f = ds.field('hour').isin(picked)
+    t = d.to_table(columns=columns, filter=f if filter is None else (filter & f))
+    return t.sort_by([('ts', 'descending')]).slice(0, n).to_pandas()
+
+def _load_checkpoint(root):
+    try:
+        with open(os.path.join(root, CHECKPOINT)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def _save_checkpoint(root, cp):
+    p = os.path.join(root, CHECKPOINT)
+    with open(p + '.tmp', 'w') as f:
+        json.dump(cp, f)
+    os.replace(p + '.tmp', p)
+
+def _read_lines(path, off, rows, limit):
+    """Append complete JSON lines from ``off``; returns the new offset and whether the end was reached."""
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return off, True
+    with f:
+        f.seek(off)
+        for line in f:
+            if not line.endswith(b'\n'): break  # incomplete tail, picked up next run
+            off += len(line)
+            line = line.strip()
+            if line:
+                try: rows.append(json.loads(line))
+                except Exception: pass
+            if len(rows) >= limit: return off, False
+    return off, True
+
+def _rotated(path, inode):
+    """The file next to ``path`` that still has ``inode``, i.e. the log renamed by rotation."""
+    d, base = os.path.split(os.path.abspath(path))
+    for name in sorted(os.listdir(d)):
+        if not name.startswith(base) or name == base: continue
+        try:
+            if os.stat(os.path.join(d, name)).st_ino == inode: return os.path.join(d, name)
+        except FileNotFoundError:
+            pass
+    return None
+
+def _skipped(cp, inode, offset, reason):
+    """Note lines that can no longer be read, keeping the last 100 notes in the checkpoint."""
+    note = {'inode': inode, 'offset': offset, 'reason': reason, 'at': datetime.now(timezone.utc).isoformat()}
+    print(f"analytics: lines after offset {offset} of inode {inode} skipped ({reason})", file=sys.stderr, flush=True)
+    return [*cp.get('skipped', []), note][-100:]
+
+def _read_jsonl(path, cp, limit):
+    """New records from a JSON-lines log; a rotated file is read to its end before the new one.
+
+    The checkpoint holds the inode and offset. When ``path`` has a new inode, the old file
+    is looked up by inode next to it (``events.jsonl.1``, ``events.jsonl-<date>``...) and
+    finished from the offset. If it is gone, or the file was truncated, the lost range is
+    recorded under ``skipped`` instead.
+    """
+    rows, pos = [], {}
+    inode, off = cp.get('inode'), cp.get('offset', 0)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        st = None
+    if inode is not None and (st is None or st.st_ino != inode):
+        old = _rotated(path, inode)
+        if old is not None:
+            off, done = _read_lines(old, off, rows, limit)
+            if not done or st is None: return rows, {'inode': inode, 'offset': off}
+        else:
+            pos['skipped'] = _skipped(cp, inode, off, 'rotated file not found')
+        inode, off = None, 0
+    if st is None: return rows, {**pos, 'inode': inode, 'offset': off}
+    if inode is not None and off > st.st_size:
+        pos['skipped'] = _skipped(cp, inode, off, 'truncated')
+        off = 0
+    off, _ = _read_lines(path, off, rows, limit)
+    return rows, {**pos, 'inode': st.st_ino, 'offset': off}
+
+def _read_segments(root, cp, limit):
+    rows = []
+    seq, off = cp.get('seq'), cp.get('offset', 0)
+    for s in eventstore.list_segments(root):
+        if seq is not None and s < seq: continue
+        if s != seq: seq, off = s, 0
+        try:
+            f = open(os.path.join(root, f"{s:012d}.seg"), 'rb')
+        except FileNotFoundError:
+            continue
+        with f:
+            for o, _, payload in eventstore.iter_frames(f, off):
+                rows.append(eventstore.decode(payload))
+                off = o + eventstore.FRAME.size + len(payload)
+                if len(rows) >= limit: return rows, {'seq': seq, 'offset': off}
+    return rows, {'seq': seq, 'offset': off}
+
+def _closed(d, now):
+    return os.path.basename(d) < f"hour={now.strftime('%Y%m%d%H')}"
+
+def _discover_columns(root):
+    """Columns of files written before the checkpoint kept a column list (read once)."""
+    cols = set()
+    for p in glob.glob(os.path.join(root, 'kind=*', 'hour=*', 'part-*.parquet')):
+        try: cols.update(pq.read_schema(p).names)
+        except (OSError, pa.ArrowInvalid): pass
+    return cols
+
+def compact(source: str, root: str, fmt: str = 'jsonl', batch: int = 50000, merge_files: int = 32):
+    """Move records appended since the last run into Parquet partitions; returns the count.
+
+    Partitions written to are then merged into one file once their hour has closed, or
+    earlier when they reach ``merge_files`` files.
+    """
+    os.makedirs(root, exist_ok=True)
+    cp = _load_checkpoint(root)
+    _finish_merge(root, cp)
+    if 'columns' not in cp:
+        cp['columns'] = sorted(_discover_columns(root))
+    total = 0
+    while True:
+        rows, pos = (_read_segments if fmt == 'segments' else _read_jsonl)(source, cp, batch)
+        if rows:
+            written, columns = write_partitions(rows, root)
+            cp['columns'] = sorted(set(cp['columns']) | columns)
+            cp['pending'] = sorted(set(cp.get('pending', [])) | {os.path.relpath(os.path.dirname(p), root) for p in written})
+        cp.update(pos)
+        _save_checkpoint(root, cp)
+        total += len(rows)
+        if len(rows) < batch: break
+    now = datetime.now(timezone.utc)
+    pending = []
+    for rel in cp.get('pending', []):
+        d = os.path.join(root, rel)
+        closed = _closed(d, now)
+        if closed or len(_parts(d)) >= merge_files:
+            merge_partition(root, d, cp)
+        if not closed: pending.append(rel)
+    cp['pending'] = pending
+    _save_checkpoint(root, cp)
+    return total
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Compact the event log into hour/kind Parquet partitions.')
+    ap.add_argument('--format', default=os.getenv('EVENTS_FORMAT', 'jsonl'), choices=['jsonl', 'segments'])
+    ap.add_argument('--source', help='events file (jsonl) or segment directory (segments); '
+                                     'defaults to EVENTS_FILE or EVENTS_DIR')
+    ap.add_argument('--out', default=os.getenv('ANALYTICS_DIR', '/data/analytics'))
+    ap.add_argument('--interval', type=float, default=0, help='keep running, compacting every N seconds')
+    ap.add_argument('--merge-files', type=int, default=int(os.getenv('ANALYTICS_MERGE_FILES', '32')),
+                    help='merge an open hour partition once it holds this many files')
+    args = ap.parse_args(argv)
+    if args.source is None:
+        args.source = (os.getenv('EVENTS_DIR', '/data/events') if args.format == 'segments'
+                       else os.getenv('EVENTS_FILE', '/data/events.jsonl'))
+    while True:
+        n = compact(args.source, args.out, args.format, merge_files=args.merge_files)
+        print(f"compacted {n} records into {args.out}", flush=True)
+        if not args.interval: break
+        time.sleep(args.interval)
+
+if __name__ == '__main__':
+    main()
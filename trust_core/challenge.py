@@ -0,0 +1,157 @@
+"""Behavioural drag-challenge verification.
+
+``verify`` scores a drag trail against the cubic Bezier the frontend drew: the median
+distance from each trail point to the sampled curve (adherence) and the velocity
+coefficient of variation (tremor). Everything is array math, so cost grows with
+trail x samples in C rather than in Python loops.
+
+``verify_reference`` is the original pure-Python implementation, kept as the regression
+oracle. ``python -m trust_core.challenge`` replays a seeded corpus of human-like, bot-like
+and borderline trails through both and reports any pass/fail disagreement.
+"""
+import argparse, json, random, statistics
+import numpy as np
+
+MAX_MEDIAN_DEV_PX = 12.0
+MIN_TREMOR = 0.2
+NO_CURVE_DIST = 1e9
+CHUNK = 1024  # trail rows per distance block, bounds memory at CHUNK x samples
+
+def bezier_samples(ps: dict, steps: int = 100):
+    """``steps + 1`` points along the path_spec curve as (xs, ys), or None if incomplete."""
+    start, end, c1, c2 = ps.get('start'), ps.get('end'), ps.get('c1'), ps.get('c2')
+    if not (start and end and c1 and c2): return None
+    t = np.arange(steps + 1) / float(steps)
+    u = 1 - t
+    a, b, c, d = u**3, 3*u**2*t, 3*u*t**2, t**3
+    xs = a*start['x'] + b*c1['x'] + c*c2['x'] + d*end['x']
+    ys = a*start['y'] + b*c1['y'] + c*c2['y'] + d*end['y']
+    return xs, ys
+
+def nearest_dists(px, py, curve):
+    """Distance from each trail point to its nearest curve sample."""
+    if curve is None: return np.full(px.size, NO_CURVE_DIST)
+    sx, sy = curve
+    out = np.empty(px.size)
+    for i in range(0, px.size, CHUNK):
+        dx = px[i:i+CHUNK, None] - sx[None, :]
+        dy = py[i:i+CHUNK, None] - sy[None, :]
+        out[i:i+CHUNK] = np.sqrt(np.min(dx*dx + dy*dy, axis=1))
+    return out
+
+def verify(trail, ps: dict, steps: int = 100):
+    """Returns ``{'passed', 'reason'}`` plus ``median_dev``/``tremor`` once the trail is long enough."""
+    if not trail:
+        return {'passed': False, 'reason': 'no_trail'}
+    n = len(trail)
+    xs = np.fromiter((p['x'] for p in trail), dtype=np.float64, count=n)
+    ys = np.fromiter((p['y'] for p in trail), dtype=np.float64, count=n)
+    ts = np.fromiter((p['t'] for p in trail), dtype=np.float64, count=n)
+    dists = nearest_dists(xs, ys, bezier_samples(ps or {}, steps))
+    median_dev = float(np.partition(dists, n//2)[n//2])
+    if n < 3:
+        return {'passed': False, 'reason': 'too_short'}
+    dt = np.maximum(1, np.diff(ts))
+    vel = np.hypot(np.diff(xs), np.diff(ys)) / (dt/1000.0)
+    mean_v = float(vel.mean())
+    std_v = float(vel.std()) if vel.size > 1 else 0.0
+    tremor = std_v / (mean_v + 1e-6)
+    passed = (median_dev <= MAX_MEDIAN_DEV_PX) and (tremor >= MIN_TREMOR)
+    return {'passed': passed, 'reason': None, 'median_dev': median_dev, 'tremor': tremor}
+
+def replay_sample(trail):
+    """Every 4th trail point (x, y only), at most 800, for replay storage."""
+    return [{ 'x': p['x'], 'y': p['y'] } for i,p in enumerate(trail) if i % 4 == 0][:800]
+
+def verify_body(body: bytes, steps: int = 100):
+    """Parse a raw /challenge request body and verify it in one call.
+
+    Meant for an executor worker: only the bytes go in and a small result comes back, so
+    neither the JSON parse nor the geometry runs on the caller's event loop. Returns the
+    request fields the collector records, the verify() result and the replay sample.
+    Raises ValueError for a body that is not a JSON object.
+    """
+    payload = json.loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError('challenge body must be a JSON object')
+    trail = payload.get('trail', [])
+    ps = payload.get('path_spec') or {}
+    result = verify(trail, ps, steps)
+    return {'ts': payload.get('ts'), 'session_id': payload.get('session_id'),
+            'flags': payload.get('env_flags') or {}, 'path_spec': ps, 'result': result,
+            'trail_sample': replay_sample(trail) if not result['reason'] else []}
+
+def _nearest_dist(p, samples):
+    best = 1e9
+    for s in samples:
+        dx = p['x']-s['x']; dy = p['y']-s['y']
+        d = (dx*dx+dy*dy)**0.5
+        if d < best: best = d
+    return best
+
+def verify_reference(trail, ps: dict):
+    """The original /challenge computation (101 samples, Python loops)."""
+    ps = ps or {}
+    start, end, c1, c2 = ps.get('start'), ps.get('end'), ps.get('c1'), ps.get('c2')
+    samples = []
+    if start and end and c1 and c2:
+        for k in range(0,101):
+            t = k/100.0
+            x = (1-t)**3*start['x'] + 3*(1-t)**2*t*c1['x'] + 3*(1-t)*t**2*c2['x'] + t**3*end['x']
+            y = (1-t)**3*start['y'] + 3*(1-t)**2*t*c1['y'] + 3*(1-t)*t**2*c2['y'] + t**3*end['y']
+            samples.append({'x':x,'y':y})
+    if not trail:
+        return {'passed': False, 'reason': 'no_trail'}
+    dists = [_nearest_dist(p, samples) for p in trail]
+    median_dev = sorted(dists)[len(dists)//2]
+    ts_arr = [p['t'] for p in trail]
+    xs = [p['x'] for p in trail]
+    ys = [p['y'] for p in trail]
+    if len(ts_arr) < 3:
+        return {'passed': False, 'reason': 'too_short'}
+    dt = [max(1, ts_arr[i]-ts_arr[i-1]) for i in range(1, len(ts_arr))]
+    dx = [xs[i]-xs[i-1] for i in range(1, len(xs))]
+    dy = [ys[i]-ys[i-1] for i in range(1, len(ys))]
+    vel = [ (dx[i]**2+dy[i]**2)**0.5 / (dt[i]/1000.0) for i in range(len(dt)) ]
+    mean_v = sum(vel)/len(vel)
+    std_v = statistics.pstdev(vel) if len(vel)>1 else 0.0
+    tremor = std_v / (mean_v + 1e-6)
+    passed = (median_dev <= 12.0) and (tremor >= 0.2)
+    return {'passed': passed, 'reason': None, 'median_dev': median_dev, 'tremor': tremor}
+
+def synthetic_case(rng: random.Random):
+    """A random path_spec and a trail that follows it with random noise, speed jitter and length."""
+    w, h = 640, 360
+    ps = {'start': {'x': 40, 'y': rng.randint(40, h-40)}, 'end': {'x': w-40, 'y': rng.randint(40, h-40)},
+          'c1': {'x': rng.randint(40, w//2), 'y': rng.randint(40, h-40)}, 'c2': {'x': rng.randint(w//2, w-40), 'y': rng.randint(40, h-40)}}
+    xs, ys = bezier_samples(ps, 400)
+    n = rng.choice([0, 1, 2, 3, 20, 120, 600, 2000])
+    noise = rng.choice([0.0, 2.0, 8.0, 12.0, 16.0, 30.0])
+    jitter = rng.choice([0.0, 0.1, 0.3, 0.8])
+    trail, t = [], 0.0
+    for i in range(n):
+        k = int(i * 400 / max(1, n-1))
+        t += 16.0 * (1 + jitter*rng.uniform(-1, 1))
+        trail.append({'x': float(xs[k]) + rng.gauss(0, noise), 'y': float(ys[k]) + rng.gauss(0, noise), 't': round(t, 1)})
+    if rng.random() < 0.05: ps = {}
+    return trail, ps
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Check verify() against the reference verifier on a seeded corpus.')
+    ap.add_argument('--cases', type=int, default=2000)
+    ap.add_argument('--seed', type=int, default=1)
+    args = ap.parse_args(argv)
+    rng = random.Random(args.seed)
+    mismatches = passed = 0
+    for i in range(args.cases):
+        trail, ps = synthetic_case(rng)
+        a, b = verify(trail, ps), verify_reference(trail, ps)
+        passed += b['passed']
+        if (a['passed'], a['reason']) != (b['passed'], b['reason']):
+            mismatches += 1
+            print(f"case {i}: vectorized={a} reference={b}")
+    print(f"{args.cases} cases, {passed} passing, {mismatches} mismatches")
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,282 @@
+"""Agent detection for ``/behavioral_analysis`` and scoring of ``/contextual_challenge`` answers.
+
+A session payload carries ``keystrokes`` (``key``, ``ts``, ``dwell``), ``mouse_movements``
+(``x``, ``y``, ``t``), ``timing_events`` (clicks with ``ts``) and ``env_flags``. Each of
+four analyses turns its part into signals in [0, 1], where 1 looks scripted:
+- keystroke: regularity of inter-key intervals and of dwell times, and dwell entropy
+  (Shannon entropy of 10 ms dwell bins, normalised by its maximum for that many keys)
+- mouse: path linearity (displacement over path length), and regularity of sampling
+  intervals and of velocity
+- timing: how many intervals across keys, moves and clicks fall on whole 10 ms steps,
+  and clicks that follow each other faster than a person can aim
+- automation: ``webdriver``, ``headless``, a headless user agent, no plugins
+
+Regularity is the coefficient of variation (std/mean) mapped so that 0.05 or less is 1
+and 0.3 or more is 0. A signal needs a minimum number of points and is None otherwise.
+An analysis scores the mean of its signals. The behavioural score is the weighted mean
+of the analyses that have evidence. ``agent_probability`` combines it with the
+automation score as independent evidence: ``1 - (1 - behaviour)(1 - automation)``.
+
+``analyze_batch`` packs every session's points into flat arrays with per-session counts
+(as ``features.featurize_batch`` does), so the per-point math runs once for the batch.
+"""
+import argparse, json, math, random, time
+import numpy as np
+from trust_core.features import _concat, _offsets, _seg_diff, _seg_mean_std, _seg_sum
+
+AGENT_THRESHOLD = 0.7
+SUSPICIOUS_THRESHOLD = 0.4
+WEIGHTS = {'keystroke': 0.35, 'mouse': 0.40, 'timing': 0.25}
+AUTOMATION_FLAGS = {'webdriver': 0.95, 'headless': 0.9, 'headless_ua': 0.9, 'no_plugins': 0.3}
+HEADLESS_UA = ('headless', 'phantomjs', 'puppeteer', 'playwright', 'selenium')
+DWELL_BIN_MS, DWELL_BINS = 10.0, 50
+MIN_CLICK_INTERVAL_MS = 150.0
+# Fastest plausible human answer per contextual challenge type, and the accuracy needed to pass
+MIN_RESPONSE_MS = {'spatial': 800.0, 'emotional': 400.0}
+DEFAULT_MIN_RESPONSE_MS = 300.0
+PASS_ACCURACY = 0.8
+
+def _below(x, lo, hi):
+    """1 at or below ``lo``, 0 at or above ``hi``, linear between; NaN stays NaN."""
+    return np.clip((hi - x)/(hi - lo), 0.0, 1.0)
+
+def _above(x, lo, hi):
+    return np.clip((x - lo)/(hi - lo), 0.0, 1.0)
+
+def _regularity(x, counts, min_n):
+    """Per-segment coefficient of variation and its regularity signal (NaN below ``min_n`` values)."""
+    mean, std = _seg_mean_std(x, counts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cv = np.where(counts >= min_n, np.where(std == 0, 0.0, std/np.abs(mean)), np.nan)
+    return cv, _below(cv, 0.05, 0.3)
+
+def _dwell_entropy(dwell, counts):
+    """Shannon entropy of each segment's dwell histogram, divided by its maximum log2(min(n, bins))."""
+    n = counts.size
+    seg = np.repeat(np.arange(n), counts)
+    bins = np.clip((dwell // DWELL_BIN_MS).astype(np.int64), 0, DWELL_BINS - 1)
+    hist = np.bincount(seg*DWELL_BINS + bins, minlength=n*DWELL_BINS).reshape(n, DWELL_BINS).astype(float)
+    p = hist/np.maximum(counts, 1)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        h = 0.0 - np.where(p > 0, p*np.log2(p), 0.0).sum(axis=1)
+        return np.where(counts >= 3, h/np.log2(np.minimum(counts, DWELL_BINS)), np.nan)
+
+def _on_grid(x, counts):
+    """Per-segment count of intervals that are whole multiples of 10 ms."""
+    return _seg_sum((np.abs(x) % 10.0 == 0).astype(float), counts)
+
+def _mean(*signals):
+    """NaN-ignoring mean of per-session signal arrays; NaN where no signal has evidence."""
+    s = np.vstack(signals)
+    n = (~np.isnan(s)).sum(axis=0)
+    return np.where(n > 0, np.nansum(s, axis=0)/np.maximum(n, 1), np.nan)
+
+def _num(v, places=3):
+    v = float(v)
+    return None if math.isnan(v) or math.isinf(v) else round(v, places)
+
+# Point lists of a session payload and the numeric fields read from their points
+POINT_FIELDS = {'keystrokes': ('ts', 'dwell'), 'mouse_movements': ('x', 'y', 't'), 'timing_events': ('ts',)}
+
+def _check(payload):
+    """Raise ValueError unless ``payload`` has the shape ``analyze_batch`` reads."""
+    if not isinstance(payload, dict): raise ValueError('a session payload must be an object')
+    for name, fields in POINT_FIELDS.items():
+        points = payload.get(name)
+        if points is None: continue
+        if not isinstance(points, list): raise ValueError(f'{name} must be a list')
+        for p in points:
+            if not isinstance(p, dict): raise ValueError(f'{name} must hold objects')
+            for f in fields:
+                v = p.get(f)
+                if v is not None and (isinstance(v, bool) or not isinstance(v, (int, float))):
+                    raise ValueError(f'{name}[].{f} must be a number')
+    flags = payload.get('env_flags')
+    if flags is not None and not isinstance(flags, dict): raise ValueError('env_flags must be an object')
+
+def _points(seq, key):
+    return np.fromiter((p.get(key) or 0 for p in seq), dtype=np.float64, count=len(seq))
+
+def _automation(flags):
+    flags = flags if isinstance(flags, dict) else {}
+    ua = str(flags.get('user_agent') or '').lower()
+    hits = {'webdriver': bool(flags.get('webdriver')), 'headless': bool(flags.get('headless')),
+            'headless_ua': any(m in ua for m in HEADLESS_UA),
+            'no_plugins': flags.get('plugins_enabled') is False}
+    p = 1.0
+    for name, hit in hits.items():
+        if hit: p *= 1 - AUTOMATION_FLAGS[name]
+    return {**hits, 'score': round(1 - p, 3)}, bool(flags)
+
+def analyze_batch(payloads):
+    """Analyse many session payloads at once; returns one result dict per payload, in order.
+
+    Raises ValueError for a payload of the wrong shape.
+    """
+    for p in payloads: _check(p)
+    keys = [p.get('keystrokes') or [] for p in payloads]
+    moves = [p.get('mouse_movements') or [] for p in payloads]
+    clicks = [p.get('timing_events') or [] for p in payloads]
+
+    kts, kcounts = _concat([_points(k, 'ts') for k in keys])
+    dwell, _ = _concat([_points(k, 'dwell') for k in keys])
+    ikd, icounts = _seg_diff(kts, kcounts)
+    ikd_cv, ikd_reg = _regularity(ikd, icounts, 2)
+    dwell_cv, dwell_reg = _regularity(dwell, kcounts, 3)
+    dwell_mean, _ = _seg_mean_std(dwell, kcounts)
+    entropy = _dwell_entropy(dwell, kcounts)
+    key_score = _mean(ikd_reg, dwell_reg, 1 - entropy)
+
+    xs, mcounts = _concat([_points(m, 'x') for m in moves])
+    ys, _ = _concat([_points(m, 'y') for m in moves]); ts, _ = _concat([_points(m, 't') for m in moves])
+    dx, scounts = _seg_diff(xs, mcounts); dy, _ = _seg_diff(ys, mcounts); dt, _ = _seg_diff(ts, mcounts)
+    step = np.sqrt(dx*dx + dy*dy)
+    path = _seg_sum(step, scounts)
+    off = _offsets(mcounts)
+    has = mcounts > 0
+    first, last = off[:-1][has], off[1:][has] - 1
+    disp = np.zeros(mcounts.size)
+    disp[has] = np.hypot(xs[last] - xs[first], ys[last] - ys[first])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        straightness = np.where((mcounts >= 3) & (path > 0), disp/path, np.nan)
+    adt = np.abs(dt)
+    adt[adt == 0] = 1.0
+    dt_cv, dt_reg = _regularity(dt, scounts, 2)
+    vel_cv, vel_reg = _regularity(step/adt*1000.0, scounts, 2)
+    mouse_score = _mean(_above(straightness, 0.85, 0.99), dt_reg, vel_reg)
+
+    cts, ccounts = _concat([_points(c, 'ts') for c in clicks])
+    cdt, cicounts = _seg_diff(cts, ccounts)
+    fast = _seg_sum((np.abs(cdt) < MIN_CLICK_INTERVAL_MS).astype(float), cicounts)
+    intervals = icounts + scounts + cicounts
+    on_grid = (_on_grid(ikd, icounts) + _on_grid(dt, scounts) + _on_grid(cdt, cicounts))/np.maximum(intervals, 1)
+    quantized = np.where(intervals >= 5, on_grid, np.nan)
+    fast_rate = np.where(cicounts > 0, fast/np.maximum(cicounts, 1), np.nan)
+    timing_score = _mean(_above(quantized, 0.3, 0.9), fast_rate)
+
+    out = []
+    for i, p in enumerate(payloads):
+        automation, has_flags = _automation(p.get('env_flags'))
+        parts = {'keystroke': key_score[i], 'mouse': mouse_score[i], 'timing': timing_score[i]}
+        w = sum(WEIGHTS[k] for k, s in parts.items() if not math.isnan(s))
+        behaviour = sum(WEIGHTS[k]*s for k, s in parts.items() if not math.isnan(s))/w if w else 0.0
+        prob = 1 - (1 - behaviour)*(1 - automation['score'])
+        coverage = (sum(not math.isnan(s) for s in parts.values()) + has_flags)/4
+        out.append({
+            'agent_probability': round(prob, 3),
+            'verdict': 'agent' if prob >= AGENT_THRESHOLD else 'suspicious' if prob >= SUSPICIOUS_THRESHOLD else 'human',
+            'confidence': round(coverage*(0.5 + 0.5*abs(2*prob - 1)), 3),
+            'keystroke_analysis': {'keys': int(kcounts[i]), 'interval_cv': _num(ikd_cv[i]), 'dwell_mean_ms': _num(dwell_mean[i], 1) if kcounts[i] else None,
+                                   'dwell_cv': _num(dwell_cv[i]), 'dwell_entropy': _num(entropy[i]), 'score': _num(key_score[i])},
+            'mouse_analysis': {'points': int(mcounts[i]), 'path_px': round(float(path[i]), 1), 'straightness': _num(straightness[i]),
+                               'interval_cv': _num(dt_cv[i]), 'velocity_cv': _num(vel_cv[i]), 'score': _num(mouse_score[i])},
+            'timing_analysis': {'intervals': int(intervals[i]), 'on_10ms_grid': _num(quantized[i]),
+                                'clicks': int(ccounts[i]), 'fast_click_rate': _num(fast_rate[i]), 'score': _num(timing_score[i])},
+            'automation_analysis': automation,
+        })
+    return out
+
+def analyze(payload: dict):
+    return analyze_batch([payload])[0]
+
+def evaluate_challenge(payload: dict):
+    """Score a contextual challenge answer against ``expected``: accuracy and a response-time floor."""
+    kind = payload.get('type') or 'unknown'
+    response = payload.get('response') or {}
+    expected = payload.get('expected') or {}
+    if not isinstance(response, dict) or not isinstance(expected, dict):
+        raise ValueError("response and expected must be objects")
+    if 'order' in expected:
+        want, got = list(expected['order']), list(response.get('order') or [])
+        accuracy = sum(a == b for a, b in zip(want, got))/len(want) if want else 0.0
+    else:
+        accuracy = float(response.get('selected') is not None and response.get('selected') == expected.get('correct'))
+    rt = response.get('response_time_ms')
+    rt = float(rt) if isinstance(rt, (int, float)) else None
+    too_fast = rt is not None and rt < MIN_RESPONSE_MS.get(kind, DEFAULT_MIN_RESPONSE_MS)
+    passed = accuracy >= PASS_ACCURACY and not too_fast
+    reason = None if passed else 'too_fast' if too_fast else 'incorrect'
+    return {'passed': passed, 'reason': reason, 'challenge_type': kind, 'accuracy': round(accuracy, 3),
+            'response_time_ms': rt}
+
+def record(payload: dict, result: dict):
+    """The ``behavioral_analysis`` event record for a payload and its result."""
+    return {'kind': 'behavioral_analysis', 'ts': payload.get('ts') or int(time.time()*1000),
+            'session_id': payload.get('session_id'), **result}
+
+def analyze_body(body: bytes):
+    """Parse a raw JSON list of session payloads and return their event records (for the offload executor).
+
+    Raises ValueError for a body that is not a list of well-formed session objects.
+    """
+    payloads = json.loads(body)
+    if not isinstance(payloads, list): raise ValueError('body must be a JSON list of session objects')
+    return [record(p, r) for p, r in zip(payloads, analyze_batch(payloads))]
+
+def bot_payload(rng: random.Random):
+    """A scripted session: evenly spaced keys with a fixed dwell, a straight 10 ms-sampled drag, webdriver set."""
+    t0 = rng.randint(0, 10**6)
+    return {'keystrokes': [{'key': 'a', 'ts': t0 + 100*i, 'dwell': 50} for i in range(20)],
+            'mouse_movements': [{'x': 100 + 10*i, 'y': 100 + 5*i, 't': t0 + 10*i} for i in range(50)],
+            'timing_events': [{'ts': t0 + 100*i} for i in range(5)],
+            'env_flags': {'webdriver': True, 'plugins_enabled': False, 'user_agent': 'Mozilla/5.0 HeadlessChrome'}}
+
+def human_payload(rng: random.Random):
+    """A person-like session: uneven keys and dwells, a curved drag with jittered sampling, a normal browser."""
+    t, keys = float(rng.randint(0, 10**6)), []
+    for _ in range(rng.randint(15, 40)):
+        t += rng.gauss(180, 70) + rng.random()
+        keys.append({'key': 'a', 'ts': round(t, 1), 'dwell': round(max(20.0, rng.gauss(95, 30)), 1)})
+    t, moves = float(rng.randint(0, 10**6)), []
+    for i in range(rng.randint(40, 120)):
+        t += max(1.0, rng.gauss(16, 7)) + rng.random()
+        moves.append({'x': round(300 + 200*math.sin(i/15) + rng.gauss(0, 3), 1),
+                      'y': round(300 + 4*i + rng.gauss(0, 3), 1), 't': round(t, 1)})
+    clicks = [{'ts': round(t + 400*i + rng.uniform(0, 900), 1)} for i in range(rng.randint(2, 6))]
+    return {'keystrokes': keys, 'mouse_movements': moves, 'timing_events': clicks,
+            'env_flags': {'webdriver': False, 'plugins_enabled': True, 'user_agent': 'Mozilla/5.0 (X11; Linux x86_64) Chrome/120.0'}}
+
+def _random_payload(rng: random.Random):
+    """A bot or person session with lists randomly dropped, emptied or cut short."""
+    p = (bot_payload if rng.random() < 0.5 else human_payload)(rng)
+    for name in POINT_FIELDS:
+        r = rng.random()
+        if r < 0.15: p.pop(name)
+        elif r < 0.4: p[name] = p[name][:rng.randint(0, 4)]
+    if rng.random() < 0.2: p.pop('env_flags')
+    return p
+
+def _same(a, b):
+    """Results equal up to the last rounded digit."""
+    if isinstance(a, dict): return a.keys() == b.keys() and all(_same(a[k], b[k]) for k in a)
+    if isinstance(a, float) and isinstance(b, float): return abs(a - b) <= 1.01e-3 + 1e-9*abs(b)
+    return a == b
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Check analyze_batch against per-session analysis and the bot/human fixtures.')
+    ap.add_argument('--sessions', type=int, default=2000)
+    ap.add_argument('--batch', type=int, default=64)
+    ap.add_argument('--seed', type=int, default=1)
+    args = ap.parse_args(argv)
+    rng = random.Random(args.seed)
+    payloads = [_random_payload(rng) for _ in range(args.sessions)]
+    mismatches = 0
+    for start in range(0, len(payloads), args.batch):
+        chunk = payloads[start:start + args.batch]
+        for i, (a, p) in enumerate(zip(analyze_batch(chunk), chunk)):
+            b = analyze(p)
+            if not _same(a, b):
+                mismatches += 1
+                print(f"session {start + i}: batch={a} single={b}")
+    wrong = 0
+    for name, make, want in (('bot', bot_payload, 'agent'), ('human', human_payload, 'human')):
+        for _ in range(100):
+            got = analyze(make(rng))
+            if got['verdict'] != want:
+                wrong += 1
+                print(f"{name} fixture: {got['verdict']} ({got['agent_probability']}), expected {want}")
+    print(f"{args.sessions} sessions, {mismatches} mismatches, {wrong} wrong fixture verdicts")
+    return 1 if mismatches or wrong else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,217 @@
+"""Segmented, append-only event log.
+
+Layout under ``root``::
+
+    000000000001.seg    frames: <u32 payload length><u64 append ts ms><msgpack record>
+    000000000001.idx    sparse time index: <u64 offset><u64 ts ms> every ``index_every`` frames
+    000000000001.meta   written when the segment is sealed: count, min/max ts, kind counts
+                        and session_id -> frame offsets
+
+The newest segment without a ``.meta`` is the active one. Segments rotate on size or age,
+and sealed segments are expired by count or age. Readers use the metadata to skip whole
+segments and the sparse index to seek into a time range, so a time-range or session query
+does not scan the full history.
+"""
+import bisect, os, struct, time
+import msgpack
+
+FRAME = struct.Struct('<IQ')
+INDEX = struct.Struct('<QQ')
+
+def _now_ms():
+    return int(time.time()*1000)
+
+def _path(root, seq, ext):
+    return os.path.join(root, f"{seq:012d}.{ext}")
+
+def list_segments(root):
+    """Sequence numbers of all segments under ``root``, oldest first."""
+    if not os.path.isdir(root): return []
+    return sorted(int(n[:-4]) for n in os.listdir(root) if n.endswith('.seg') and n[:-4].isdigit())
+
+def encode(record: dict) -> bytes:
+    return msgpack.packb(record, use_bin_type=True, default=str)
+
+def decode(payload: bytes) -> dict:
+    return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+def read_meta(root, seq):
+    p = _path(root, seq, 'meta')
+    if not os.path.exists(p): return None
+    with open(p, 'rb') as f:
+        return decode(f.read())
+
+def read_index(root, seq):
+    p = _path(root, seq, 'idx')
+    if not os.path.exists(p): return []
+    with open(p, 'rb') as f:
+        data = f.read()
+    n = len(data)//INDEX.size
+    return [INDEX.unpack_from(data, i*INDEX.size) for i in range(n)]
+
+def iter_frames(f, start=0, end=None):
+    """Yield (offset, ts_ms, payload) from an open segment; stops at a torn trailing frame."""
+    f.seek(start)
+    off = start
+    while end is None or off < end:
+        head = f.read(FRAME.size)
+        if len(head) < FRAME.size: return
+        n, ts = FRAME.unpack(head)
+        payload = f.read(n)
+        if len(payload) < n: return
+        yield off, ts, payload
+        off += FRAME.size + n
+
+def _scan_meta(root, seq):
+    """Rebuild a segment's metadata from its frames; returns (meta, valid_length)."""
+    meta = {'count': 0, 'min_ts': None, 'max_ts': None, 'kinds': {}, 'sessions': {}}
+    end = 0
+    with open(_path(root, seq, 'seg'), 'rb') as f:
+        for off, ts, payload in iter_frames(f):
+            rec = decode(payload)
+            _meta_add(meta, off, ts, rec)
+            end = off + FRAME.size + len(payload)
+    return meta, end
+
+def _meta_add(meta, off, ts, rec):
+    meta['count'] += 1
+    meta['min_ts'] = ts if meta['min_ts'] is None else min(meta['min_ts'], ts)
+    meta['max_ts'] = ts if meta['max_ts'] is None else max(meta['max_ts'], ts)
+    kind = rec.get('kind')
+    meta['kinds'][kind] = meta['kinds'].get(kind, 0) + 1
+    sid = rec.get('session_id')
+    if sid is not None:
+        meta['sessions'].setdefault(str(sid), []).append(off)
+
+def _write_meta(root, seq, meta):
+    tmp = _path(root, seq, 'meta.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(encode(meta))
+        f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, _path(root, seq, 'meta'))
+
+def remove_segment(root, seq):
+    for ext in ('seg', 'idx', 'meta'):
+        try: os.remove(_path(root, seq, ext))
+        except FileNotFoundError: pass
+
+class SegmentWriter:
+    """Single-writer appender. Not thread-safe; callers serialize ``append``."""
+    def __init__(self, root: str, max_bytes: int = 64*1024*1024, max_age_s: float = 3600,
+                 index_every: int = 64, retention_segments: int = 0, retention_age_s: float = 0):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.index_every = index_every
+        self.retention_segments = retention_segments
+        self.retention_age_s = retention_age_s
+        self.seg = self.idx = None
+        self.seq = 0
+        os.makedirs(root, exist_ok=True)
+        self._recover()
+        self._open(self.seq + 1)
+
+    def _recover(self):
+        # Seal whatever a previous process left active, dropping a torn trailing frame.
+        segs = list_segments(self.root)
+        for seq in segs:
+            if read_meta(self.root, seq) is None:
+                meta, end = _scan_meta(self.root, seq)
+                with open(_path(self.root, seq, 'seg'), 'r+b') as f:
+                    f.truncate(end)
+                if meta['count']: _write_meta(self.root, seq, meta)
+                else: remove_segment(self.root, seq)
+        self.seq = segs[-1] if segs else 0
+
+    def _open(self, seq):
+        self.seq = seq
+        self.seg = open(_path(self.root, seq, 'seg'), 'ab')
+        self.idx = open(_path(self.root, seq, 'idx'), 'ab')
+        self.offset = 0
+        self.opened_at = time.time()
+        self.meta = {'count': 0, 'min_ts': None, 'max_ts': None, 'kinds': {}, 'sessions': {}}
+
+    def _seal(self):
+        self.seg.flush(); os.fsync(self.seg.fileno())
+        self.seg.close(); self.idx.close()
+        if self.meta['count']: _write_meta(self.root, self.seq, self.meta)
+        else: remove_segment(self.root, self.seq)
+
+    def rotate(self):
+        self._seal()
+        self._open(self.seq + 1)
+        self.expire()
+
+    def append(self, records, payloads, sync: str = 'group'):
+        """Append already-encoded ``payloads`` (with their source ``records`` for indexing).
+
+        ``sync`` is ``record`` (fsync every frame), ``group`` (one fsync) or ``os`` (none).
+        Returns the number of fsyncs issued.
+        """
+        if self.offset >= self.max_bytes or (self.meta['count'] and time.time()-self.opened_at >= self.max_age_s):
+            self.rotate()
+        fsyncs = 0
+        ts = _now_ms()
+        for rec, payload in zip(records, payloads):
+            if self.meta['count'] % self.index_every == 0:
+                self.idx.write(INDEX.pack(self.offset, ts))
+            self.seg.write(FRAME.pack(len(payload), ts)); self.seg.write(payload)
+            _meta_add(self.meta, self.offset, ts, rec)
+            self.offset += FRAME.size + len(payload)
+            if sync == 'record':
+                self.seg.flush(); os.fsync(self.seg.fileno()); fsyncs += 1
+        self.seg.flush(); self.idx.flush()
+        if sync == 'group':
+            os.fsync(self.seg.fileno()); fsyncs += 1
+        return fsyncs
+
+    def expire(self):
+        """Drop the oldest sealed segments beyond the retention count or age."""
+        sealed = [s for s in list_segments(self.root) if s != self.seq]
+        if self.retention_segments and len(sealed) > self.retention_segments:
+            for seq in sealed[:len(sealed)-self.retention_segments]:
+                remove_segment(self.root, seq)
+            sealed = sealed[len(sealed)-self.retention_segments:]
+        if self.retention_age_s:
+            cutoff = _now_ms() - int(self.retention_age_s*1000)
+            for seq in sealed:
+                meta = read_meta(self.root, seq)
+                if meta is None or meta['max_ts'] >= cutoff: break
+                remove_segment(self.root, seq)
+
+    def close(self):
+        if self.seg is not None:
+            self._seal()
+            self.seg = self.idx = None
+
+def read_events(root: str, start_ms: int = None, end_ms: int = None, session_id: str = None, kinds=None):
+    """Yield records appended in ``[start_ms, end_ms]``, optionally for one session and/or kinds."""
+    kinds = set(kinds) if kinds else None
+    for seq in list_segments(root):
+        meta = read_meta(root, seq)
+        if meta is not None:
+            if start_ms is not None and meta['max_ts'] < start_ms: continue
+            if end_ms is not None and meta['min_ts'] > end_ms: continue
+            if kinds is not None and not kinds.intersection(meta['kinds']): continue
+            if session_id is not None and str(session_id) not in meta['sessions']: continue
+        try:
+            f = open(_path(root, seq, 'seg'), 'rb')
+        except FileNotFoundError:
+            continue  # expired while we were listing
+        with f:
+            if meta is not None and session_id is not None:
+                frames = (fr for off in meta['sessions'][str(session_id)] for fr in iter_frames(f, off, off+1))
+            else:
+                start = 0
+                if start_ms is not None:
+                    idx = read_index(root, seq)
+                    i = bisect.bisect_right([ts for _, ts in idx], start_ms) - 1
+                    if i >= 0: start = idx[i][0]
+                frames = iter_frames(f, start)
+            for _, ts, payload in frames:
+                if start_ms is not None and ts < start_ms: continue
+                if end_ms is not None and ts > end_ms: break
+                rec = decode(payload)
+                if kinds is not None and rec.get('kind') not in kinds: continue
+                if session_id is not None and str(rec.get('session_id')) != str(session_id): continue
+                yield rec
@@ -0,0 +1,247 @@
+import base64
+import numpy as np
+
+# Bump when feature definitions change; caches key on it
+VERSION = "1"
+
+ZERO_MOUSE = {"mean_vel":0,"tremor":0,"curv":0}
+ZERO_KEYS = {"ikd_mean":0,"ikd_std":0,"backspace_rate":0}
+
+def mouse_features(m):
+    if not m: return dict(ZERO_MOUSE)
+    xs = np.array([p.get("x",0) for p in m]); ys = np.array([p.get("y",0) for p in m]); ts = np.array([p.get("t",0) for p in m])
+    return mouse_features_arrays(xs, ys, ts)
+
+def mouse_features_arrays(xs, ys, ts):
+    if xs.size==0: return dict(ZERO_MOUSE)
+    dt = np.diff(ts)/1000.0
+    if dt.size==0: return dict(ZERO_MOUSE)
+    dt[dt==0]=1e-3
+    dx = np.diff(xs); dy = np.diff(ys)
+    vel = np.sqrt(dx*dx+dy*dy)/dt
+    mean_vel = float(np.mean(vel)) if len(vel)>0 else 0
+    tremor = float(np.std(vel)/(np.mean(vel)+1e-6))
+    angle = np.arctan2(dy, dx)
+    dang = np.abs(np.diff(angle))
+    curv = float(np.mean(dang)) if len(dang)>0 else 0
+    return {"mean_vel":round(mean_vel,4), "tremor":round(tremor,4), "curv":round(curv,4)}
+
+def keystroke_features(k):
+    if not k: return dict(ZERO_KEYS)
+    ts = np.array([p.get("t",0) for p in k])
+    return keystroke_features_arrays(ts, sum(1 for p in k if p.get("k")=="Backspace"))
+
+def keystroke_features_arrays(ts, n_backspace):
+    if ts.size==0: return dict(ZERO_KEYS)
+    ikd = np.diff(ts)
+    ikd_mean = float(np.mean(ikd)) if len(ikd)>0 else 0
+    ikd_std = float(np.std(ikd)) if len(ikd)>0 else 0
+    backspace_rate = float(n_backspace/max(1,len(ts)))
+    return {"ikd_mean":round(ikd_mean,2),"ikd_std":round(ikd_std,2),"backspace_rate":round(backspace_rate,4)}
+
+# Packed wire format (behavior.packed, v=2), sent by telemetry.js when packing is enabled:
+#   {"v": 2,
+#    "mouse": {"n": N, "x": b64(int32 deltas), "y": b64(int32 deltas), "t0": first tick, "t": b64(int32 tick deltas)},
+#    "keys":  {"n": M, "t0": first tick, "t": b64(int32 tick deltas), "bs": b64(uint8 1 if Backspace else 0)}}
+# All arrays are little-endian. x and y are rounded to whole pixels, and times (ms) to whole
+# microsecond ticks; t0 is the first tick as an integer. Each delta is taken between rounded
+# values (x and y from 0, times from t0), so a cumulative sum restores the column, and equal
+# timestamps decode to exactly equal times, also across separately packed chunks. A delta
+# that does not fit in int32 (a time gap over ~35 minutes) cannot be packed, and the encoders
+# send point lists instead.
+PACKED_VERSION = 2
+TICKS_PER_MS = 1000
+_I32 = np.iinfo(np.int32)
+
+def _column(b64, dtype, n):
+    return np.frombuffer(base64.b64decode(b64), dtype=dtype, count=n) if n else np.zeros(0, dtype=dtype)
+
+def _ticks(b64, n):
+    return np.cumsum(_column(b64, "<i4", n), dtype=np.int64)
+
+def _times(col: dict, n):
+    return (int(col.get("t0", 0)) + _ticks(col["t"], n))/TICKS_PER_MS
+
+def unpack_mouse(packed: dict):
+    """Packed mouse trail -> (xs, ys, ts) float64 arrays."""
+    m = packed.get("mouse") or {}
+    n = int(m.get("n", 0))
+    if not n: return np.zeros(0), np.zeros(0), np.zeros(0)
+    return _ticks(m["x"], n).astype(np.float64), _ticks(m["y"], n).astype(np.float64), _times(m, n)
+
+def unpack_keys(packed: dict):
+    """Packed key trail -> (ts float64 array, backspace count)."""
+    k = packed.get("keys") or {}
+    n = int(k.get("n", 0))
+    if not n: return np.zeros(0), 0
+    return _times(k, n), int(np.count_nonzero(_column(k["bs"], "u1", n)))
+
+def _rounded(vals, scale=1):
+    # Half up, as Math.round
+    q = np.floor(np.asarray(vals, dtype=np.float64)*scale + 0.5)
+    if not np.all(np.isfinite(q)): raise ValueError("packed telemetry values must be finite")
+    return q
+
+def _deltas(q, start=0):
+    d = np.diff(q, prepend=float(start))
+    if d.size and (d.min() < _I32.min or d.max() > _I32.max):
+        raise ValueError("a packed telemetry delta does not fit in int32")
+    return base64.b64encode(d.astype("<i4").tobytes()).decode('ascii')
+
+def _time_column(points):
+    q = _rounded([p.get("t",0) for p in points], TICKS_PER_MS)
+    t0 = int(q[0]) if q.size else 0
+    return {"t0": t0, "t": _deltas(q, t0)}
+
+def pack_behavior(mouse, keys):
+    """Encode JSON mouse/key trails into the packed wire format (mirrors telemetry.js).
+
+    Raises ValueError for a trail that cannot be packed (see the format note above).
+    """
+    return {"v": PACKED_VERSION,
+            "mouse": {"n": len(mouse), "x": _deltas(_rounded([p.get("x",0) for p in mouse])),
+                      "y": _deltas(_rounded([p.get("y",0) for p in mouse])), **_time_column(mouse)},
+            "keys": {"n": len(keys), **_time_column(keys),
+                     "bs": base64.b64encode(bytes(int(p.get("k")=="Backspace") for p in keys)).decode('ascii')}}
+
+def _check_packed(packed):
+    if packed.get("v") != PACKED_VERSION:
+        raise ValueError(f"unsupported packed telemetry version {packed.get('v')!r}")
+
+def featurize(event: dict):
+    packed = event.get("behavior",{}).get("packed")
+    if packed:
+        _check_packed(packed)
+        f_mouse = mouse_features_arrays(*unpack_mouse(packed))
+        f_keys = keystroke_features_arrays(*unpack_keys(packed))
+    else:
+        f_mouse = mouse_features(event.get("behavior",{}).get("mouse",[]))
+        f_keys = keystroke_features(event.get("behavior",{}).get("keys",[]))
+    env = event.get("env",{})
+    journey = event.get("journey",{})
+    flags = (env.get('flags') or {})
+    out = {**f_mouse, **f_keys,
+           "paste_count": int(event.get("behavior",{}).get("paste_count",0)),
+           "ua_len": len(env.get("ua","")),
+           "flag_headless": int(bool(flags.get("headless", False))),
+           "flag_proxy": int(bool(flags.get("proxy_vpn_tor", False))),
+           "flag_lang_mismatch": int(bool(flags.get("lang_mismatch", False))),
+           "amount": float(journey.get("amount",0) or 0),
+           "new_beneficiary": int(journey.get("new_beneficiary",False))}
+    return out
+
+# Batch path: every event's points are packed into flat arrays with per-event counts, so
+# the per-point math runs once for the whole batch. Reductions use np.add.reduceat per
+# segment, which sums each segment the same way np.mean/np.std sum a standalone array,
+# so the results are bit-identical to mouse_features/keystroke_features.
+
+def _offsets(counts):
+    off = np.zeros(counts.size + 1, dtype=np.int64)
+    np.cumsum(counts, out=off[1:])
+    return off
+
+def _seg_diff(a, counts):
+    """First differences within each segment of the packed array ``a``."""
+    d = np.diff(a)
+    keep = np.ones(d.size, dtype=bool)
+    b = _offsets(counts)[1:-1]
+    b = b[(b > 0) & (b <= d.size)]
+    keep[b - 1] = False
+    return d[keep], np.maximum(counts - 1, 0)
+
+def _seg_sum(x, counts):
+    out = np.zeros(counts.size)
+    nz = counts > 0
+    if x.size:
+        out[nz] = np.add.reduceat(x, _offsets(counts)[:-1][nz])
+    return out
+
+def _seg_mean_std(x, counts):
+    nz = counts > 0
+    n = np.where(nz, counts, 1)
+    mean = _seg_sum(x, counts) / n
+    dev = x - np.repeat(mean[nz], counts[nz])
+    std = np.sqrt(_seg_sum(dev*dev, counts) / n)
+    return mean, std
+
+def _points(seq, key):
+    return np.fromiter((p.get(key, 0) for p in seq), dtype=np.float64, count=len(seq))
+
+def _concat(cols):
+    counts = np.fromiter((c.size for c in cols), dtype=np.int64, count=len(cols))
+    return (np.concatenate(cols) if cols else np.zeros(0)), counts
+
+def mouse_features_batch(mice):
+    mice = [m or [] for m in mice]
+    return _mouse_batch([(_points(m, "x"), _points(m, "y"), _points(m, "t")) for m in mice])
+
+def _mouse_batch(cols):
+    xs, counts = _concat([c[0] for c in cols]); ys, _ = _concat([c[1] for c in cols]); ts, _ = _concat([c[2] for c in cols])
+    dt, vcounts = _seg_diff(ts, counts)
+    dt = dt/1000.0
+    dt[dt==0] = 1e-3
+    dx, _ = _seg_diff(xs, counts); dy, _ = _seg_diff(ys, counts)
+    vel = np.sqrt(dx*dx+dy*dy)/dt
+    mean_vel, std_vel = _seg_mean_std(vel, vcounts)
+    dang, acounts = _seg_diff(np.arctan2(dy, dx), vcounts)
+    curv, _ = _seg_mean_std(np.abs(dang), acounts)
+    out = []
+    for i in range(len(cols)):
+        if vcounts[i] == 0:
+            out.append(dict(ZERO_MOUSE))
+            continue
+        c = float(curv[i]) if acounts[i] > 0 else 0
+        out.append({"mean_vel":round(float(mean_vel[i]),4),
+                    "tremor":round(float(std_vel[i]/(mean_vel[i]+1e-6)),4),
+                    "curv":round(c,4)})
+    return out
+
+def keystroke_features_batch(keys):
+    keys = [k or [] for k in keys]
+    return _keys_batch([(_points(k, "t"), sum(1 for p in k if p.get("k")=="Backspace")) for k in keys])
+
+def _keys_batch(cols):
+    ts, counts = _concat([c[0] for c in cols])
+    ikd, icounts = _seg_diff(ts, counts)
+    mean, std = _seg_mean_std(ikd, icounts)
+    out = []
+    for i, (_, nbs) in enumerate(cols):
+        if counts[i] == 0:
+            out.append(dict(ZERO_KEYS))
+            continue
+        has = icounts[i] > 0
+        out.append({"ikd_mean":round(float(mean[i]) if has else 0,2),
+                    "ikd_std":round(float(std[i]) if has else 0,2),
+                    "backspace_rate":round(float(nbs/max(1,int(counts[i]))),4)})
+    return out
+
+def _behavior_columns(b):
+    packed = b.get("packed")
+    if packed:
+        _check_packed(packed)
+        return unpack_mouse(packed), unpack_keys(packed)
+    m = b.get("mouse",[]) or []
+    k = b.get("keys",[]) or []
+    return ((_points(m, "x"), _points(m, "y"), _points(m, "t")),
+            (_points(k, "t"), sum(1 for p in k if p.get("k")=="Backspace")))
+
+def featurize_batch(events):
+    """featurize() for many events at once; returns one feature dict per event, in order."""
+    behaviors = [e.get("behavior",{}) for e in events]
+    cols = [_behavior_columns(b) for b in behaviors]
+    f_mouse = _mouse_batch([c[0] for c in cols])
+    f_keys = _keys_batch([c[1] for c in cols])
+    out = []
+    for event, b, fm, fk in zip(events, behaviors, f_mouse, f_keys):
+        env = event.get("env",{})
+        journey = event.get("journey",{})
+        flags = (env.get('flags') or {})
+        out.append({**fm, **fk,
+                    "paste_count": int(b.get("paste_count",0)),
+                    "ua_len": len(env.get("ua","")),
+                    "flag_headless": int(bool(flags.get("headless", False))),
+                    "flag_proxy": int(bool(flags.get("proxy_vpn_tor", False))),
+                    "flag_lang_mismatch": int(bool(flags.get("lang_mismatch", False))),
+                    "amount": float(journey.get("amount",0) or 0),
+                    "new_beneficiary": int(journey.get("new_beneficiary",False))})
+    return out
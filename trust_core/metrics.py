@@ -0,0 +1,192 @@
+"""Prometheus text-format metrics, without a client library.
+
+Metrics are created once, at import time, on the process-wide ``REGISTRY``:
+
+    STAGE = metrics.histogram('trust_stage_seconds', 'Time spent per pipeline stage', ['stage'])
+    FEATURIZE = STAGE.labels('featurize')   # bind the child once, outside the hot path
+    ...
+    FEATURIZE.observe(time.perf_counter() - t0)
+
+A bound child's ``observe`` is a bisect into fixed buckets and two additions, and
+``inc``/``dec`` on counters and gauges are single additions. Nothing is allocated per
+call. Updates are not locked: under the GIL a rare lost increment from a worker thread
+is the accepted price.
+
+Values that are already kept elsewhere (queue depths, counters in ``stats()``) are
+exported with ``callback``. The function runs only when ``/metrics`` is scraped.
+``ASGIMetrics`` adds request counts, latency and in-flight requests per route to any
+ASGI app, and ``render()`` produces the text for the ``/metrics`` endpoint.
+"""
+import bisect, math, time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+
+def _num(v) -> str:
+    if v == math.inf: return '+Inf'
+    if isinstance(v, float) and v.is_integer(): return str(int(v))
+    return repr(v)
+
+def _escape(v) -> str:
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra='') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra: parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+class Value:
+    """A counter or gauge child."""
+    __slots__ = ('value',)
+    def __init__(self):
+        self.value = 0.0
+    def inc(self, n: float = 1.0):
+        self.value += n
+    def dec(self, n: float = 1.0):
+        self.value -= n
+    def set(self, v: float):
+        self.value = v
+
+class Histogram:
+    """A histogram child: per-bucket counts (the last one is +Inf), sum and count."""
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0]*(len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+    def observe(self, v: float):
+        self.counts[bisect.bisect_left(self.bounds, v)] += 1
+        self.sum += v
+        self.count += 1
+    def since(self, t0: float):
+        """Observe the seconds elapsed since ``t0`` (a ``time.perf_counter()`` reading)."""
+        self.observe(time.perf_counter() - t0)
+
+class Metric:
+    def __init__(self, name: str, help: str, kind: str, labelnames=(), buckets=None):
+        self.name, self.help, self.kind = name, help, kind
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(float(b) for b in buckets) if buckets else None
+        self.children = {}
+        if not self.labelnames:
+            child = self.labels()
+            for attr in ('inc', 'dec', 'set', 'observe', 'since'):
+                if hasattr(child, attr): setattr(self, attr, getattr(child, attr))
+
+    def labels(self, *values):
+        """The child for these label values, created on first use."""
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self.children[key] = Histogram(self.buckets) if self.kind == 'histogram' else Value()
+        return child
+
+    def samples(self):
+        for key, child in list(self.children.items()):
+            if self.kind != 'histogram':
+                yield self.name + _labels(self.labelnames, key), child.value
+                continue
+            total = 0
+            for bound, n in zip((*child.bounds, math.inf), child.counts):
+                total += n
+                yield self.name + '_bucket' + _labels(self.labelnames, key, f'le="{_num(bound)}"'), total
+            yield self.name + '_sum' + _labels(self.labelnames, key), child.sum
+            yield self.name + '_count' + _labels(self.labelnames, key), child.count
+
+class Callback:
+    """A metric read from ``fn()`` at scrape time: a number, or ``{label value(s): number}``."""
+    def __init__(self, name: str, help: str, kind: str, fn, labelnames=()):
+        self.name, self.help, self.kind, self.fn = name, help, kind, fn
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        v = self.fn()
+        if v is None: return
+        if not self.labelnames:
+            yield self.name, v
+            return
+        for key, n in v.items():
+            yield self.name + _labels(self.labelnames, key if isinstance(key, tuple) else (key,)), n
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _add(self, m):
+        if m.name in self.metrics:
+            raise ValueError(f"metric {m.name} is already registered")
+        self.metrics[m.name] = m
+        return m
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Metric(name, help, 'counter', labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Metric(name, help, 'gauge', labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Metric(name, help, 'histogram', labelnames, buckets))
+
+    def callback(self, name, help, kind, fn, labelnames=()):
+        return self._add(Callback(name, help, kind, fn, labelnames))
+
+    def render(self) -> str:
+        lines = []
+        for m in self.metrics.values():
+            try:
+                samples = list(m.samples())
+            except Exception:
+                continue  # a failing callback hides its metric, not the whole scrape
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(f"{name} {_num(v)}" for name, v in samples)
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+callback = REGISTRY.callback
+render = REGISTRY.render
+
+STAGE_SECONDS = histogram('trust_stage_seconds', 'Time spent per pipeline stage', ['stage'])
+DECISIONS = counter('trust_decisions_total', 'Policy decisions by action', ['action'])
+
+HTTP_IN_FLIGHT = gauge('http_requests_in_flight', 'HTTP requests being handled')
+HTTP_SECONDS = histogram('http_request_duration_seconds', 'HTTP request latency by route', ['method', 'route'])
+HTTP_REQUESTS = counter('http_requests_total', 'HTTP responses by route and status', ['method', 'route', 'status'])
+
+class ASGIMetrics:
+    """ASGI middleware that records HTTP request latency, status and in-flight count.
+
+    Routes are labelled by their path when it is one of the app's routes, and as
+    ``other`` otherwise, so unknown URLs cannot grow the label set.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.routes = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        if self.routes is None:
+            self.routes = {getattr(r, 'path', None) for r in getattr(scope.get('app'), 'routes', ())}
+        route = scope['path'] if scope['path'] in self.routes else 'other'
+        status = '500'
+        def on_send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = str(message['status'])
+            return send(message)
+        HTTP_IN_FLIGHT.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, on_send)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            method = scope['method']
+            HTTP_SECONDS.labels(method, route).since(t0)
+            HTTP_REQUESTS.labels(method, route, status).inc()
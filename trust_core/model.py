@@ -0,0 +1,250 @@
+"""Learned risk model: an Isolation Forest over the ``featurize`` output.
+
+Training (``python -m trust_core.model train``) needs scikit-learn. It fits
+``sklearn.ensemble.IsolationForest`` on feature vectors of normal traffic, which can be
+synthetic human sessions and/or allowed attempts from the event log. It then exports
+every tree into flat NumPy arrays in one ``.npz`` artifact. Serving needs NumPy only:
+``IsolationForestModel.anomaly`` walks all trees for all rows at once, one level per step,
+and matches ``IsolationForest.score_samples`` to float tolerance.
+
+``Scorer`` wraps the rule scorer (``trust_core.scoring``). Without a model it returns the
+rule scores unchanged. With one it adds ``scores.anomaly`` and blends the calibrated
+anomaly into ``risk_score``. If inference fails, it falls back to the rule scores for
+that call. Every result carries ``model_version``.
+"""
+import argparse, hashlib, json, math, os, random, time
+import numpy as np
+from trust_core import features as features_mod, scoring
+
+FEATURE_ORDER = ('mean_vel', 'tremor', 'curv', 'ikd_mean', 'ikd_std', 'backspace_rate', 'paste_count',
+                 'ua_len', 'flag_headless', 'flag_proxy', 'flag_lang_mismatch', 'amount', 'new_beneficiary')
+MODEL_PATH = os.getenv('MODEL_PATH', '')
+
+def vectorize(feature_dicts) -> np.ndarray:
+    """Feature dicts -> (n, len(FEATURE_ORDER)) float64 matrix; missing or null values are 0."""
+    return np.array([[float(f.get(k) or 0) for k in FEATURE_ORDER] for f in feature_dicts],
+                    dtype=np.float64).reshape(-1, len(FEATURE_ORDER))
+
+def average_path_length(n):
+    """Expected isolation depth of ``n`` points (unsuccessful BST search), elementwise."""
+    n = np.asarray(n, dtype=np.float64)
+    out = np.zeros_like(n)
+    out[n == 2] = 1.0
+    big = n > 2
+    out[big] = 2.0*(np.log(n[big] - 1.0) + np.euler_gamma) - 2.0*(n[big] - 1.0)/n[big]
+    return out
+
+class IsolationForestModel:
+    """All trees of a forest as flat arrays; leaves have ``left == -1``."""
+    def __init__(self, arrays: dict, meta: dict, version: str):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.leaf_value = arrays['leaf_value']  # leaf depth + average_path_length(leaf samples)
+        self.roots = arrays['roots']
+        self.max_depth = int(meta['max_depth'])
+        self.denominator = len(self.roots) * float(average_path_length([meta['max_samples']])[0])
+        self.meta = meta
+        self.version = version
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, 'rb') as f:
+            data = f.read()
+        with np.load(path, allow_pickle=False) as z:
+            arrays = {k: z[k] for k in z.files if k != 'meta'}
+            meta = json.loads(str(z['meta']))
+        if tuple(meta['feature_order']) != FEATURE_ORDER:
+            raise ValueError(f"model was trained on features {meta['feature_order']}, expected {FEATURE_ORDER}")
+        return cls(arrays, meta, 'iforest-' + hashlib.sha256(data).hexdigest()[:12])
+
+    def anomaly(self, X: np.ndarray) -> np.ndarray:
+        """Isolation Forest anomaly score per row (about 0.5 for normal points, towards 1 for outliers)."""
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)  # trees split on float32 inputs
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.roots.size)).copy()
+        for _ in range(self.max_depth):
+            left = self.left[node]
+            inner = left >= 0
+            if not inner.any(): break
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(inner, np.where(go_left, left, self.right[node]), node)
+        depths = self.leaf_value[node].sum(axis=1)
+        if self.denominator == 0: return np.ones(X.shape[0])
+        return 2.0 ** (-depths/self.denominator)
+
+    def risk(self, anomaly: np.ndarray) -> np.ndarray:
+        """Anomaly score -> [0, 1] using the training-set calibration points."""
+        lo, hi = self.meta['calibration']
+        return np.clip((anomaly - lo)/max(hi - lo, 1e-9), 0.0, 1.0)
+
+class Scorer:
+    def __init__(self, model: IsolationForestModel = None, blend: float = None, weights: dict = None,
+                 load_error: str = None):
+        self.model = model
+        self.blend = float(model.meta.get('blend', 0.5) if blend is None and model is not None else blend or 0.0)
+        self.weights = weights
+        self.load_error = load_error
+        self.fallbacks = 0
+
+    @property
+    def version(self):
+        return self.model.version if self.model is not None else f"rules-{scoring.VERSION}"
+
+    def _blend(self, rule: dict, anomaly: float, risk: float):
+        s = dict(rule['scores'], anomaly=round(anomaly, 3))
+        r = min(1.0, (1 - self.blend)*rule['risk_score'] + self.blend*risk)
+        return {'scores': s, 'risk_score': round(r, 3), 'model_version': self.model.version}
+
+    def _rules(self, f: dict):
+        return {**scoring.score(f, self.weights), 'model_version': f"rules-{scoring.VERSION}"}
+
+    def score(self, f: dict):
+        return self.score_batch([f])[0]
+
+    def score_batch(self, fs):
+        rules = [scoring.score(f, self.weights) for f in fs]
+        if self.model is not None:
+            try:
+                a = self.model.anomaly(vectorize(fs))
+                risk = self.model.risk(a)
+                return [self._blend(rule, float(x), float(r)) for rule, x, r in zip(rules, a, risk)]
+            except Exception:
+                self.fallbacks += 1
+        return [{**rule, 'model_version': f"rules-{scoring.VERSION}"} for rule in rules]
+
+    def stats(self):
+        return {'version': self.version, 'blend': self.blend, 'fallbacks': self.fallbacks,
+                'load_error': self.load_error,
+                'trees': int(self.model.roots.size) if self.model is not None else None,
+                'trained_at': self.model.meta.get('trained_at') if self.model is not None else None}
+
+def load_scorer(path: str, blend: float = None, weights: dict = None) -> Scorer:
+    """A Scorer for the artifact at ``path``; a missing or unreadable artifact gives the rule scorer."""
+    if not path: return Scorer(blend=blend, weights=weights)
+    try:
+        s = Scorer(IsolationForestModel.load(path), blend=blend, weights=weights)
+    except (OSError, ValueError, KeyError) as e:
+        return Scorer(blend=blend, weights=weights, load_error=f"{type(e).__name__}: {e}")
+    s.score({})  # warm up the inference path
+    return s
+
+_scorer = None
+
+def scorer() -> Scorer:
+    """The process-wide scorer for ``MODEL_PATH`` (``MODEL_BLEND`` overrides the artifact's blend)."""
+    global _scorer
+    if _scorer is None:
+        blend = os.getenv('MODEL_BLEND')
+        _scorer = load_scorer(MODEL_PATH, float(blend) if blend else None)
+    return _scorer
+
+# Training
+
+def export_forest(forest, path: str, calibration, blend: float, extra: dict):
+    """Write a fitted ``sklearn.ensemble.IsolationForest`` as a flat-array artifact."""
+    feature, threshold, left, right, leaf_value, roots = [], [], [], [], [], []
+    off, max_depth = 0, 0
+    for est, feats in zip(forest.estimators_, forest.estimators_features_):
+        t = est.tree_
+        n = t.node_count
+        depth = np.zeros(n, dtype=np.int64)
+        for i in range(n):  # parents precede children in sklearn's node order
+            for c in (t.children_left[i], t.children_right[i]):
+                if c >= 0: depth[c] = depth[i] + 1
+        is_leaf = t.children_left < 0
+        feats = np.asarray(feats)
+        feature.append(np.where(is_leaf, 0, feats[np.maximum(t.feature, 0)]))
+        threshold.append(np.where(is_leaf, 0.0, t.threshold))
+        left.append(np.where(is_leaf, -1, t.children_left + off))
+        right.append(np.where(is_leaf, -1, t.children_right + off))
+        leaf_value.append(np.where(is_leaf, depth + average_path_length(t.n_node_samples), 0.0))
+        roots.append(off)
+        max_depth = max(max_depth, int(depth.max()))
+        off += n
+    meta = {'feature_order': list(FEATURE_ORDER), 'max_samples': int(forest.max_samples_), 'max_depth': max_depth,
+            'calibration': [float(x) for x in calibration], 'blend': blend,
+            'trained_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), **extra}
+    with open(path, 'wb') as f:  # np.savez would append .npz to a path without it
+        np.savez_compressed(f, feature=np.concatenate(feature).astype(np.int32),
+                            threshold=np.concatenate(threshold).astype(np.float64),
+                            left=np.concatenate(left).astype(np.int32), right=np.concatenate(right).astype(np.int32),
+                            leaf_value=np.concatenate(leaf_value).astype(np.float64),
+                            roots=np.asarray(roots, dtype=np.int32), meta=np.array(json.dumps(meta)))
+
+def synthetic_human_event(rng: random.Random) -> dict:
+    """A payment attempt with human-like pointer and typing telemetry and a clean environment."""
+    x0, y0, x1, y1 = rng.uniform(0, 400), rng.uniform(0, 300), rng.uniform(400, 900), rng.uniform(100, 600)
+    cx, cy = rng.uniform(0, 900), rng.uniform(0, 600)
+    n, t, mouse = rng.randint(30, 400), 0.0, []
+    for i in range(n):
+        u = i/(n - 1)
+        x = (1-u)**2*x0 + 2*(1-u)*u*cx + u*u*x1 + rng.gauss(0, 1.5)
+        y = (1-u)**2*y0 + 2*(1-u)*u*cy + u*u*y1 + rng.gauss(0, 1.5)
+        t += max(4.0, rng.gauss(16, 5))
+        mouse.append({'x': round(x), 'y': round(y), 't': round(t, 1)})
+    keys, t = [], 0.0
+    for _ in range(rng.randint(8, 60)):
+        t += max(30.0, rng.lognormvariate(math.log(140), 0.45))
+        keys.append({'k': 'Backspace' if rng.random() < 0.05 else 'a', 't': round(t, 1)})
+    ua = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+    return {'env': {'ua': ua, 'flags': {}},
+            'behavior': {'mouse': mouse, 'keys': keys, 'paste_count': int(rng.random() < 0.1)},
+            'journey': {'amount': str(round(rng.lognormvariate(math.log(150), 1.0), 2)),
+                        'new_beneficiary': rng.random() < 0.2}}
+
+def _logged_features(path: str, limit: int):
+    out = []
+    with open(path) as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if rec.get('kind') == 'attempt' and (rec.get('decision') or {}).get('action') == 'allow' and rec.get('features'):
+                out.append(rec['features'])
+                if len(out) >= limit: break
+    return out
+
+def train(argv):
+    from sklearn.ensemble import IsolationForest
+    ap = argparse.ArgumentParser(prog='python -m trust_core.model train',
+                                 description='Fit an Isolation Forest on normal traffic and export it.')
+    ap.add_argument('--out', required=True)
+    ap.add_argument('--synthetic', type=int, default=5000, help='synthetic human sessions to include')
+    ap.add_argument('--events', help='also train on allowed attempts from this JSON-lines event log')
+    ap.add_argument('--events-limit', type=int, default=200000)
+    ap.add_argument('--trees', type=int, default=100)
+    ap.add_argument('--max-samples', type=int, default=256)
+    ap.add_argument('--blend', type=float, default=0.5, help='weight of the anomaly risk in risk_score')
+    ap.add_argument('--seed', type=int, default=1)
+    args = ap.parse_args(argv)
+    rng = random.Random(args.seed)
+    rows = features_mod.featurize_batch([synthetic_human_event(rng) for _ in range(args.synthetic)])
+    if args.events:
+        rows += _logged_features(args.events, args.events_limit)
+    X = vectorize(rows)
+    forest = IsolationForest(n_estimators=args.trees, max_samples=min(args.max_samples, len(X)),
+                             random_state=args.seed).fit(X)
+    train_scores = -forest.score_samples(X)
+    calibration = (float(np.quantile(train_scores, 0.5)), float(np.quantile(train_scores, 0.995)))
+    export_forest(forest, args.out, calibration, args.blend,
+                  {'n_train': len(X), 'synthetic': args.synthetic, 'events': args.events})
+    model = IsolationForestModel.load(args.out)
+    diff = float(np.max(np.abs(model.anomaly(X) - train_scores)))
+    one = X[:1]
+    t0 = time.perf_counter()
+    for _ in range(200): model.anomaly(one)
+    us = (time.perf_counter()-t0)/200*1e6
+    print(f"{model.version}: {len(X)} rows, {args.trees} trees, max |diff| vs sklearn {diff:.2e}, "
+          f"{us:.0f} us per single-row inference")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Learned risk model tools.')
+    ap.add_argument('command', choices=['train'])
+    args, rest = ap.parse_known_args(argv)
+    return train(rest)
+
+if __name__ == '__main__':
+    main()
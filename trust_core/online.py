@@ -0,0 +1,248 @@
+"""Behaviour features maintained incrementally from telemetry that arrives in chunks.
+
+``BehaviorAccumulator`` takes mouse and key points a chunk at a time, in the same
+shapes as ``event['behavior']`` (point lists or ``packed``), and keeps O(1) state:
+- the last point and last movement angle, which stitch each chunk to the previous one
+- running moments (count, mean, sum of squared deviations) of pointer velocity and of
+  inter-key delay, combined per chunk with Chan et al.'s parallel update
+- the sum and count of absolute angle changes
+- key and Backspace counts
+
+``features()`` gives the ``mean_vel``, ``tremor``, ``curv``, ``ikd_mean``, ``ikd_std`` and
+``backspace_rate`` that ``trust_core.features`` computes over all points seen so far,
+equal up to floating-point rounding. The per-chunk math is vectorized.
+
+Accumulators also keep their first point and first angle, so ``a.merge(b)`` can join two
+partial accumulators where ``b`` covers the points that come after ``a``'s. This lets a
+trail be split into shards, accumulated in parallel and combined in any tree shape.
+``tests/test_online.py`` checks both ingestion and merging against the batch functions
+on random trails with random chunking and merge orders.
+
+``TelemetryStore`` keeps one accumulator per session, with the same idle-TTL and
+least-recently-seen eviction as ``trust_core.sessions.SessionStore``.
+"""
+import collections, math, time
+import numpy as np
+from trust_core import features as _features
+
+class Moments:
+    """Count, mean and sum of squared deviations of a stream of values."""
+    __slots__ = ('n', 'mean', 'm2')
+    def __init__(self):
+        self.n, self.mean, self.m2 = 0, 0.0, 0.0
+
+    def add(self, values: np.ndarray):
+        if values.size == 0: return
+        mb = float(values.mean())
+        self._combine(int(values.size), mb, float(((values - mb)**2).sum()))
+
+    def merge(self, other: 'Moments'):
+        if other.n: self._combine(other.n, other.mean, other.m2)
+
+    def _combine(self, nb, mb, m2b):
+        n = self.n + nb
+        delta = mb - self.mean
+        self.mean += delta*nb/n
+        self.m2 += m2b + delta*delta*self.n*nb/n
+        self.n = n
+
+    def std(self) -> float:
+        return math.sqrt(self.m2/self.n) if self.n else 0.0
+
+class MouseAccumulator:
+    __slots__ = ('first', 'first_angle', 'last', 'last_angle', 'vel', 'dang_sum', 'dang_n', 'points')
+    def __init__(self):
+        self.first = self.last = None              # (x, y, t) of the earliest and latest point
+        self.first_angle = self.last_angle = None  # direction of the earliest and latest movement
+        self.vel = Moments()
+        self.dang_sum, self.dang_n = 0.0, 0
+        self.points = 0
+
+    def add(self, xs: np.ndarray, ys: np.ndarray, ts: np.ndarray):
+        if xs.size == 0: return
+        self.points += int(xs.size)
+        if self.last is not None:
+            xs, ys, ts = (np.concatenate(([v], a)) for v, a in zip(self.last, (xs, ys, ts)))
+        else:
+            self.first = (float(xs[0]), float(ys[0]), float(ts[0]))
+        self.last = (float(xs[-1]), float(ys[-1]), float(ts[-1]))
+        if xs.size < 2: return
+        dt = np.diff(ts)/1000.0
+        dt[dt==0] = 1e-3
+        dx = np.diff(xs); dy = np.diff(ys)
+        self.vel.add(np.sqrt(dx*dx+dy*dy)/dt)
+        angle = np.arctan2(dy, dx)
+        if self.last_angle is not None:
+            angle = np.concatenate(([self.last_angle], angle))
+        else:
+            self.first_angle = float(angle[0])
+        dang = np.abs(np.diff(angle))
+        self.dang_sum += float(dang.sum())
+        self.dang_n += int(dang.size)
+        self.last_angle = float(angle[-1])
+
+    def merge(self, other: 'MouseAccumulator'):
+        """Append ``other``, which holds the points that follow this accumulator's."""
+        if other.points == 0: return self
+        if self.points == 0:
+            for k in self.__slots__: setattr(self, k, getattr(other, k))
+            self.vel = Moments(); self.vel.merge(other.vel)
+            return self
+        # the segment from our last point to other's first is in neither accumulator
+        (x0, y0, t0), (x1, y1, t1) = self.last, other.first
+        dt = (t1 - t0)/1000.0 or 1e-3
+        dx, dy = x1 - x0, y1 - y0
+        self.vel.add(np.array([math.sqrt(dx*dx+dy*dy)/dt]))
+        self.vel.merge(other.vel)
+        angle = math.atan2(dy, dx)
+        for a, b in ((self.last_angle, angle), (angle, other.first_angle)):
+            if a is not None and b is not None:
+                self.dang_sum += abs(b - a)
+                self.dang_n += 1
+        self.dang_sum += other.dang_sum
+        self.dang_n += other.dang_n
+        if self.first_angle is None: self.first_angle = angle
+        self.last_angle = angle if other.last_angle is None else other.last_angle
+        self.last = other.last
+        self.points += other.points
+        return self
+
+    def features(self):
+        v = self.vel
+        if v.n == 0: return dict(_features.ZERO_MOUSE)
+        curv = self.dang_sum/self.dang_n if self.dang_n else 0
+        return {"mean_vel": round(v.mean, 4), "tremor": round(v.std()/(v.mean+1e-6), 4), "curv": round(curv, 4)}
+
+class KeyAccumulator:
+    __slots__ = ('first_t', 'last_t', 'ikd', 'keys', 'backspaces')
+    def __init__(self):
+        self.first_t = self.last_t = None
+        self.ikd = Moments()
+        self.keys, self.backspaces = 0, 0
+
+    def add(self, ts: np.ndarray, n_backspace: int):
+        if ts.size == 0: return
+        self.keys += int(ts.size)
+        self.backspaces += int(n_backspace)
+        if self.last_t is not None:
+            ts = np.concatenate(([self.last_t], ts))
+        else:
+            self.first_t = float(ts[0])
+        self.last_t = float(ts[-1])
+        self.ikd.add(np.diff(ts))
+
+    def merge(self, other: 'KeyAccumulator'):
+        """Append ``other``, which holds the keys that follow this accumulator's."""
+        if other.keys == 0: return self
+        if self.keys == 0:
+            self.first_t = other.first_t
+        else:
+            self.ikd.add(np.array([other.first_t - self.last_t]))
+        self.ikd.merge(other.ikd)
+        self.last_t = other.last_t
+        self.keys += other.keys
+        self.backspaces += other.backspaces
+        return self
+
+    def features(self):
+        if self.keys == 0: return dict(_features.ZERO_KEYS)
+        k = self.ikd
+        return {"ikd_mean": round(k.mean if k.n else 0, 2), "ikd_std": round(k.std(), 2),
+                "backspace_rate": round(self.backspaces/max(1, self.keys), 4)}
+
+class BehaviorAccumulator:
+    __slots__ = ('mouse', 'keys', 'paste_count', 'chunks', 'last_seq', 'last_seen')
+    def __init__(self):
+        self.mouse = MouseAccumulator()
+        self.keys = KeyAccumulator()
+        self.paste_count = 0
+        self.chunks = 0
+        self.last_seq = None
+        self.last_seen = 0.0
+
+    def add_chunk(self, chunk: dict):
+        """Ingest ``{"mouse": [...], "keys": [...], "paste_count": n}`` or ``{"packed": ..., "paste_count": n}``.
+
+        ``paste_count`` is the client's running total, so the largest value seen wins.
+        """
+        (xs, ys, ts), (kts, nbs) = _features._behavior_columns(chunk)
+        self.mouse.add(xs, ys, ts)
+        self.keys.add(kts, nbs)
+        self.paste_count = max(self.paste_count, int(chunk.get('paste_count', 0) or 0))
+        self.chunks += 1
+
+    def merge(self, other: 'BehaviorAccumulator'):
+        """Append ``other``, which holds the chunks that follow this accumulator's."""
+        self.mouse.merge(other.mouse)
+        self.keys.merge(other.keys)
+        self.paste_count = max(self.paste_count, other.paste_count)
+        self.chunks += other.chunks
+        return self
+
+    def features(self):
+        return {**self.mouse.features(), **self.keys.features(), 'paste_count': self.paste_count}
+
+class TelemetryStore:
+    """One ``BehaviorAccumulator`` per session.
+
+    A chunk may carry a ``seq`` number. Chunks with a ``seq`` at or below the last one
+    accepted for the session are dropped as duplicates, so client retries are safe.
+    """
+    def __init__(self, ttl_s: float = 1800.0, max_sessions: int = 100_000, clock=time.monotonic):
+        self.ttl_s = ttl_s
+        self.max_sessions = max_sessions
+        self.clock = clock
+        self.sessions = collections.OrderedDict()  # least recently seen first
+        self.counters = {'chunks': 0, 'duplicates': 0, 'errors': 0, 'served': 0, 'missing': 0,
+                         'evicted_ttl': 0, 'evicted_capacity': 0}
+
+    def _evict(self, now):
+        cutoff = now - self.ttl_s
+        while self.sessions:
+            sid, acc = next(iter(self.sessions.items()))
+            if acc.last_seen < cutoff:
+                self.counters['evicted_ttl'] += 1
+            elif len(self.sessions) > self.max_sessions:
+                self.counters['evicted_capacity'] += 1
+            else:
+                break
+            del self.sessions[sid]
+
+    def ingest(self, session_id, chunk: dict) -> dict:
+        """Add one chunk to its session; returns the session's running point counts."""
+        if not session_id or not isinstance(session_id, str):
+            raise ValueError("telemetry chunks need a string session_id")
+        now = self.clock()
+        acc = self.sessions.get(session_id)
+        if acc is None:
+            acc = self.sessions[session_id] = BehaviorAccumulator()
+        else:
+            self.sessions.move_to_end(session_id)
+        acc.last_seen = now
+        self._evict(now)
+        seq = chunk.get('seq')
+        if seq is not None and acc.last_seq is not None and seq <= acc.last_seq:
+            self.counters['duplicates'] += 1
+            return {'session_id': session_id, 'duplicate': True, 'seq': acc.last_seq}
+        try:
+            acc.add_chunk(chunk)
+        except (ValueError, TypeError, KeyError):
+            self.counters['errors'] += 1
+            raise
+        if seq is not None: acc.last_seq = seq
+        self.counters['chunks'] += 1
+        return {'session_id': session_id, 'seq': acc.last_seq, 'mouse_points': acc.mouse.points,
+                'keys': acc.keys.keys}
+
+    def features(self, session_id):
+        """The session's behaviour features, or None if it has streamed nothing."""
+        acc = self.sessions.get(session_id) if isinstance(session_id, str) else None
+        if acc is None:
+            self.counters['missing'] += 1
+            return None
+        self.counters['served'] += 1
+        return acc.features()
+
+    def stats(self):
+        return {**self.counters, 'sessions': len(self.sessions), 'max_sessions': self.max_sessions,
+                'ttl_s': self.ttl_s}
@@ -0,0 +1,223 @@
+"""Policy decisions from a declarative, hot-reloadable rules file.
+
+The rules file (``POLICY_RULES``, default ``policy_rules.json`` next to this module) is JSON:
+
+    {"thresholds": [{"max": 0.20, "action": "allow"}, ..., {"action": "deny"}],
+     "reasons":    [{"when": <cond>, "reason": "high_contextual_risk"}, ...],
+     "overrides":  [{"when": <cond>, "action": "deny", "reason": "hard_block_..."}, ...],
+     "max_reasons": 4}
+
+``thresholds`` map ``risk_score`` to an action: the first band whose ``max`` is >= the score
+wins, and the last band has no ``max``. ``reasons`` are checked in order. ``overrides`` are
+then applied in order: each one that matches replaces the action and appends its reason.
+A condition is ``{"field": "scores.bot_context", "op": ">=", "value": 0.8, "default": 0}``
+(ops ``< <= > >= == != in``; fields are ``risk_score``, ``scores.<name>`` or
+``features.<name>``; ``default`` applies when the field is missing, 0 if not given), or
+``{"all": [...]}``, ``{"any": [...]}`` or ``{"not": <cond>}``.
+
+Rules are compiled once into closures. The file is re-checked at most every
+``POLICY_RELOAD_S`` seconds, and a changed file is compiled and swapped in as one object.
+A file that fails to compile leaves the previous rules in place. ``version()`` is a
+content hash of the active rules, so caches keyed on it follow every change.
+
+``decide_reference`` is the original hard-coded decision, kept as the regression oracle;
+``python -m trust_core.policy`` checks the active rules against it on a seeded corpus.
+"""
+import argparse, bisect, hashlib, json, operator, os, random, threading, time
+
+RULES_PATH = os.getenv('POLICY_RULES', os.path.join(os.path.dirname(__file__), 'policy_rules.json'))
+RELOAD_S = float(os.getenv('POLICY_RELOAD_S', '1.0'))
+
+OPS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+       '==': operator.eq, '!=': operator.ne, 'in': lambda a, b: a in b}
+
+def _getter(field: str, default):
+    if field == 'risk_score':
+        return lambda rec: rec.get('risk_score', default)
+    parent, _, name = field.partition('.')
+    if parent not in ('scores', 'features') or not name:
+        raise ValueError(f"unknown field {field!r}: use risk_score, scores.<name> or features.<name>")
+    def get(rec):
+        d = rec.get(parent)
+        return d.get(name, default) if d else default
+    return get
+
+def _compile_cond(c):
+    if not isinstance(c, dict):
+        raise ValueError(f"condition must be an object, got {c!r}")
+    if 'all' in c or 'any' in c:
+        parts = [_compile_cond(x) for x in c.get('all', c.get('any'))]
+        if 'all' in c: return lambda rec: all(p(rec) for p in parts)
+        return lambda rec: any(p(rec) for p in parts)
+    if 'not' in c:
+        inner = _compile_cond(c['not'])
+        return lambda rec: not inner(rec)
+    op = OPS.get(c.get('op'))
+    if op is None:
+        raise ValueError(f"unknown op {c.get('op')!r}, expected one of {sorted(OPS)}")
+    if 'value' not in c:
+        raise ValueError(f"condition on {c.get('field')!r} has no value")
+    get, value = _getter(c.get('field', ''), c.get('default', 0)), c['value']
+    def test(rec):
+        try:
+            return op(get(rec), value)
+        except TypeError:
+            return False  # incomparable (e.g. None vs number): the condition does not hold
+    return test
+
+class Rules:
+    """A compiled rules file: ``decide(scored)`` and ``decide_batch(records)``."""
+    def __init__(self, spec: dict, version: str):
+        bands = spec.get('thresholds') or []
+        if not bands or 'max' in bands[-1] or any('max' not in b for b in bands[:-1]):
+            raise ValueError("thresholds need ascending 'max' bands and a final band without 'max'")
+        self.maxes = [float(b['max']) for b in bands[:-1]]
+        if self.maxes != sorted(self.maxes):
+            raise ValueError("threshold 'max' values must be ascending")
+        self.actions = [str(b['action']) for b in bands]
+        self.reasons = [(_compile_cond(r['when']), str(r['reason'])) for r in spec.get('reasons', [])]
+        self.overrides = [(_compile_cond(o['when']), str(o['action']), o.get('reason'))
+                          for o in spec.get('overrides', [])]
+        self.max_reasons = int(spec.get('max_reasons', 4))
+        self.version = version
+
+    def decide(self, scored: dict):
+        r = float(scored.get('risk_score', 0))
+        action = self.actions[bisect.bisect_left(self.maxes, r)]
+        reasons = [reason for test, reason in self.reasons if test(scored)]
+        for test, override, reason in self.overrides:
+            if test(scored):
+                action = override
+                if reason: reasons.append(reason)
+        return {'action': action, 'reasons': reasons[:self.max_reasons]}
+
+    def decide_batch(self, records):
+        decide = self.decide
+        return [decide(rec) for rec in records]
+
+def compile_rules(text: str) -> Rules:
+    return Rules(json.loads(text), hashlib.sha256(text.encode()).hexdigest()[:12])
+
+class RuleSet:
+    """The active ``Rules`` for a file, recompiled when the file changes."""
+    def __init__(self, path: str, reload_s: float = 1.0):
+        self.path = path
+        self.reload_s = reload_s
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.next_check = 0.0
+        self.loaded_at = None
+        self.reloads = 0
+        self.errors = 0
+        self.last_error = None
+        self.rules = self._load(self._stamp())  # fail fast on a bad file at startup
+
+    def _stamp(self):
+        st = os.stat(self.path)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _load(self, stamp):
+        with open(self.path) as f:
+            rules = compile_rules(f.read())
+        self.stamp, self.loaded_at = stamp, time.time()
+        return rules
+
+    def current(self) -> Rules:
+        now = time.monotonic()
+        if now < self.next_check: return self.rules
+        with self.lock:
+            if now < self.next_check: return self.rules
+            self.next_check = now + self.reload_s
+            try:
+                stamp = self._stamp()
+                if stamp != self.stamp:
+                    self.rules = self._load(stamp)
+                    self.reloads += 1
+                    self.last_error = None
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+        return self.rules
+
+    def stats(self):
+        return {'path': self.path, 'version': self.rules.version, 'loaded_at': self.loaded_at,
+                'reloads': self.reloads, 'errors': self.errors, 'last_error': self.last_error}
+
+_ruleset = None
+
+def ruleset() -> RuleSet:
+    global _ruleset
+    if _ruleset is None:
+        _ruleset = RuleSet(RULES_PATH, RELOAD_S)
+    return _ruleset
+
+def version() -> str:
+    return ruleset().current().version
+
+def decide(scored: dict):
+    return ruleset().current().decide(scored)
+
+def decide_batch(records):
+    return ruleset().current().decide_batch(records)
+
+def decide_reference(scored: dict):
+    """The original hard-coded policy."""
+    scores = scored.get('scores', {}) or {}
+    r = float(scored.get('risk_score',0))
+
+    # Tuned thresholds
+    if r <= 0.20:
+        action = 'allow'
+    elif r <= 0.45:
+        action = 'step_up_webauthn'
+    elif r <= 0.92:
+        action = 'step_up_behavior_challenge'
+    else:
+        action = 'deny'
+
+    # Hard block condition
+    if scores.get('contextual_risk',0) >= 0.70 and scores.get('bot_context',0) >= 0.80:
+        action = 'deny'
+
+    reasons = []
+    if scores.get('contextual_risk',0) >= 0.5: reasons.append('high_contextual_risk')
+    if scores.get('human_motoric',1) < 0.3: reasons.append('low_human_motoric')
+    if scores.get('bot_context',0) > 0.5: reasons.append('bot_context_signals')
+    if scores.get('session_risk',0) >= 0.4: reasons.append('session_velocity')
+    if action == 'deny' and scores.get('contextual_risk',0) >= 0.70 and scores.get('bot_context',0) >= 0.80:
+        reasons.append('hard_block_high_bot_and_context')
+
+    return { 'action': action, 'reasons': reasons[:4] }
+
+def synthetic_scored(rng: random.Random):
+    """A random score record, with values drawn near the default thresholds as often as not."""
+    edges = [0.20, 0.45, 0.92, 0.5, 0.3, 0.70, 0.80, 0.4]
+    def v():
+        return rng.choice(edges) if rng.random() < 0.3 else round(rng.random(), 3)
+    scores = {k: v() for k in ('bot_context', 'human_motoric', 'contextual_risk', 'session_risk') if rng.random() < 0.9}
+    return {'scores': scores, 'risk_score': v()}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Check the active policy rules against decide_reference on a seeded corpus.')
+    ap.add_argument('--rules', default=RULES_PATH)
+    ap.add_argument('--cases', type=int, default=20000)
+    ap.add_argument('--seed', type=int, default=1)
+    args = ap.parse_args(argv)
+    with open(args.rules) as f:
+        rules = compile_rules(f.read())
+    rng = random.Random(args.seed)
+    corpus = [synthetic_scored(rng) for _ in range(args.cases)]
+    t0 = time.perf_counter()
+    got = rules.decide_batch(corpus)
+    us = (time.perf_counter()-t0)*1e6/max(1, args.cases)
+    mismatches = 0
+    for i, (rec, a) in enumerate(zip(corpus, got)):
+        b = decide_reference(rec)
+        if a != b:
+            mismatches += 1
+            if mismatches <= 10: print(f"case {i}: {rec} rules={a} reference={b}")
+    print(f"rules {rules.version}: {args.cases} cases, {mismatches} mismatches, {us:.2f} us/decision")
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
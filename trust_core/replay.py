@@ -0,0 +1,229 @@
+"""Re-decide historical attempts with candidate features/model/policy and report what changes.
+
+    python -m trust_core.replay --source /data/events.jsonl --rules new_rules.json \\
+        --model models/iforest.npz --workers 4 --report replay.json --changes changed.jsonl
+
+The reader streams the log (jsonl or segments) as raw payloads in chunks of ``--batch``.
+Each chunk goes to a worker process that decodes it and re-runs the stages batched:
+``features.featurize_batch`` for records that carry raw ``behavior``, and otherwise the
+logged feature vector (with its ``sess_*`` aggregates), followed by ``Scorer.score_batch``
+and ``Rules.decide_batch``. Workers return only aggregates plus the changed rows, and at most
+``2 x workers`` chunks are in flight, so memory does not grow with the size of the log.
+
+The report compares each replayed decision with the logged one. It counts action
+transitions and the actions before and after. For the overall risk delta, and for each
+reason code present before or after, it gives the count, changed actions, mean/min/max
+delta and how often the reason was added or removed.
+"""
+import argparse, json, os, sys, time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from trust_core import eventstore, features, model, policy
+
+def _iter_jsonl(path):
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.endswith(b'\n') and line.strip():  # an incomplete tail is still being written
+                yield line
+
+def _iter_segments(root):
+    for s in eventstore.list_segments(root):
+        try:
+            f = open(os.path.join(root, f"{s:012d}.seg"), 'rb')
+        except FileNotFoundError:
+            continue
+        with f:
+            for _, _, payload in eventstore.iter_frames(f):
+                yield payload
+
+def iter_chunks(source: str, fmt: str, batch: int, limit: int = 0):
+    """Raw payload chunks of up to ``batch`` records; decoding is left to the workers."""
+    chunk, n = [], 0
+    for payload in (_iter_segments if fmt == 'segments' else _iter_jsonl)(source):
+        chunk.append(payload)
+        n += 1
+        if len(chunk) >= batch or n == limit:
+            yield chunk
+            chunk = []
+            if n == limit: return
+    if chunk: yield chunk
+
+def _delta():
+    return {'count': 0, 'changed': 0, 'sum': 0.0, 'sum_abs': 0.0, 'min': None, 'max': None,
+            'added': 0, 'removed': 0}
+
+def _add_delta(d, delta, changed):
+    d['count'] += 1
+    d['changed'] += changed
+    d['sum'] += delta
+    d['sum_abs'] += abs(delta)
+    d['min'] = delta if d['min'] is None else min(d['min'], delta)
+    d['max'] = delta if d['max'] is None else max(d['max'], delta)
+
+def _merge_delta(a, b):
+    for k in ('count', 'changed', 'sum', 'sum_abs', 'added', 'removed'):
+        a[k] += b[k]
+    for k, pick in (('min', min), ('max', max)):
+        if b[k] is not None:
+            a[k] = b[k] if a[k] is None else pick(a[k], b[k])
+
+def _count(d, key, n=1):
+    d[key] = d.get(key, 0) + n
+
+def empty_report():
+    return {'records': 0, 'attempts': 0, 'refeaturized': 0, 'skipped': 0, 'errors': 0, 'changed': 0,
+            'transitions': {}, 'actions_before': {}, 'actions_after': {},
+            'risk_delta': _delta(), 'reasons': {}}
+
+def merge_report(a, b):
+    for k in ('records', 'attempts', 'refeaturized', 'skipped', 'errors', 'changed'):
+        a[k] += b[k]
+    for k in ('transitions', 'actions_before', 'actions_after'):
+        for key, n in b[k].items():
+            _count(a[k], key, n)
+    _merge_delta(a['risk_delta'], b['risk_delta'])
+    for reason, d in b['reasons'].items():
+        _merge_delta(a['reasons'].setdefault(reason, _delta()), d)
+    return a
+
+def finish_report(r):
+    """Replace running sums with means, in place."""
+    for d in [r['risk_delta'], *r['reasons'].values()]:
+        n = d['count']
+        d['mean'] = round(d.pop('sum')/n, 4) if n else None
+        d['mean_abs'] = round(d.pop('sum_abs')/n, 4) if n else None
+    r['reasons'] = dict(sorted(r['reasons'].items(), key=lambda kv: -kv[1]['count']))
+    return r
+
+_state = {}
+
+def _init_worker(model_path, rules_path, blend, weights):
+    _state['scorer'] = model.load_scorer(model_path, blend, weights)
+    with open(rules_path) as f:
+        _state['rules'] = policy.compile_rules(f.read())
+
+def replay_chunk(fmt, chunk, keep_changes):
+    """Decode and re-decide one chunk; returns ``(partial report, changed rows)``."""
+    report, changes = empty_report(), []
+    report['records'] = len(chunk)
+    decode = eventstore.decode if fmt == 'segments' else json.loads
+    logged = []
+    for payload in chunk:
+        try:
+            rec = decode(payload)
+        except Exception:
+            report['errors'] += 1
+            continue
+        if rec.get('kind') != 'attempt' or (not rec.get('features') and not rec.get('behavior')):
+            report['skipped'] += 1
+            continue
+        logged.append(rec)
+    raw = [rec for rec in logged if rec.get('behavior')]
+    if raw:
+        for rec, f in zip(raw, features.featurize_batch(raw)):
+            # keep the logged session aggregates: they cannot be rebuilt from one record
+            rec['_features'] = {**{k: v for k, v in (rec.get('features') or {}).items() if k.startswith('sess_')}, **f}
+        report['refeaturized'] = len(raw)
+    fs = [rec.pop('_features', None) or rec['features'] for rec in logged]
+    scored = _state['scorer'].score_batch(fs)
+    decisions = _state['rules'].decide_batch([{**s, 'features': f} for s, f in zip(scored, fs)])
+    report['attempts'] = len(logged)
+    for rec, s, d in zip(logged, scored, decisions):
+        old = rec.get('decision') or {}
+        before, after = old.get('action'), d['action']
+        changed = before != after
+        delta = round(float(s['risk_score']) - float(rec.get('risk_score') or 0), 6)
+        _count(report['actions_before'], str(before))
+        _count(report['actions_after'], after)
+        if changed:
+            report['changed'] += 1
+            _count(report['transitions'], f"{before}->{after}")
+        _add_delta(report['risk_delta'], delta, changed)
+        old_reasons, new_reasons = set(old.get('reasons') or []), set(d['reasons'])
+        for reason in old_reasons | new_reasons:
+            rd = report['reasons'].setdefault(reason, _delta())
+            _add_delta(rd, delta, changed)
+            rd['added'] += reason not in old_reasons
+            rd['removed'] += reason not in new_reasons
+        if changed and keep_changes:
+            changes.append({'ts': rec.get('ts'), 'session_id': rec.get('session_id'),
+                            'before': {'action': before, 'reasons': old.get('reasons'),
+                                       'risk_score': rec.get('risk_score'), 'model_version': rec.get('model_version')},
+                            'after': {'action': after, 'reasons': d['reasons'],
+                                      'risk_score': s['risk_score'], 'model_version': s.get('model_version')}})
+    return report, changes
+
+def replay(source, fmt='jsonl', model_path='', rules_path=policy.RULES_PATH, workers=None, batch=5000,
+           limit=0, blend=None, weights=None, changes_out=None, progress_s=5.0, log=sys.stderr):
+    """Replay ``source`` and return the finished report."""
+    workers = workers or os.cpu_count() or 1
+    report = empty_report()
+    t0 = last = time.perf_counter()
+    def progress(final=False):
+        el = time.perf_counter() - t0
+        print(f"{'done' if final else 'replayed'} {report['records']} records "
+              f"({report['attempts']} attempts, {report['changed']} changed) "
+              f"in {el:.1f}s, {report['records']/max(el, 1e-9):.0f} records/s", file=log, flush=True)
+    def collect(done):
+        nonlocal last
+        for fut in done:
+            part, changes = fut.result()
+            merge_report(report, part)
+            for row in changes:
+                changes_out.write(json.dumps(row) + '\n')
+        if progress_s and time.perf_counter() - last >= progress_s:
+            last = time.perf_counter()
+            progress()
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(model_path, rules_path, blend, weights)) as pool:
+        pending = set()
+        for chunk in iter_chunks(source, fmt, batch, limit):
+            if len(pending) >= 2*workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(pool.submit(replay_chunk, fmt, chunk, changes_out is not None))
+        collect(pending)
+    el = time.perf_counter() - t0
+    progress(final=True)
+    with open(rules_path) as f:
+        rules_version = policy.compile_rules(f.read()).version
+    report.update({'source': source, 'format': fmt, 'elapsed_s': round(el, 3),
+                   'records_per_s': round(report['records']/max(el, 1e-9), 1), 'workers': workers,
+                   'candidate': {'features_version': features.VERSION, 'policy_version': rules_version,
+                                 'model_version': model.load_scorer(model_path, blend, weights).version}})
+    return finish_report(report)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Replay the event log through candidate features/model/policy '
+                                             'and report changed decisions.')
+    ap.add_argument('--format', default=os.getenv('EVENTS_FORMAT', 'jsonl'), choices=['jsonl', 'segments'])
+    ap.add_argument('--source', help='events file (jsonl) or segment directory (segments); '
+                                     'defaults to EVENTS_FILE or EVENTS_DIR')
+    ap.add_argument('--rules', default=policy.RULES_PATH, help='candidate policy rules file')
+    ap.add_argument('--model', default=model.MODEL_PATH, help="candidate model artifact; '' for the rule scorer")
+    ap.add_argument('--blend', type=float, help="override the artifact's blend")
+    ap.add_argument('--weights', type=json.loads, help='candidate scoring weights as JSON')
+    ap.add_argument('--workers', type=int, default=os.cpu_count())
+    ap.add_argument('--batch', type=int, default=5000, help='records per worker chunk')
+    ap.add_argument('--limit', type=int, default=0, help='stop after N records')
+    ap.add_argument('--report', help='write the JSON report here instead of stdout')
+    ap.add_argument('--changes', help='write every changed decision here as JSONL')
+    ap.add_argument('--progress', type=float, default=5.0, help='seconds between progress lines')
+    args = ap.parse_args(argv)
+    if args.source is None:
+        args.source = (os.getenv('EVENTS_DIR', '/data/events') if args.format == 'segments'
+                       else os.getenv('EVENTS_FILE', '/data/events.jsonl'))
+    changes_out = open(args.changes, 'w') if args.changes else None
+    try:
+        report = replay(args.source, args.format, args.model, args.rules, args.workers, args.batch, args.limit,
+                        args.blend, args.weights, changes_out, args.progress)
+    finally:
+        if changes_out: changes_out.close()
+    text = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    main()
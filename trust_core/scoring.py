@@ -0,0 +1,40 @@
+# Bump when weights or score definitions change; caches key on it
+VERSION = '1'
+
+# Blend of the component scores into risk_score; 'session' scales session_risk on top
+WEIGHTS = {'bot_context': 0.35, 'human_motoric': 0.30, 'contextual_risk': 0.35, 'session': 0.30}
+
+def score(features: dict, weights: dict = None):
+    w = WEIGHTS if weights is None else {**WEIGHTS, **weights}
+    bot_ctx = 0.0
+    if features.get('ua_len', 0) < 50: bot_ctx += 0.1
+    if features.get('flag_headless',0)==1: bot_ctx += 0.5
+    if features.get('flag_proxy',0)==1: bot_ctx += 0.3
+    if features.get('flag_lang_mismatch',0)==1: bot_ctx += 0.2
+    bot_ctx = min(1.0, bot_ctx)
+
+    tremor = features.get('tremor', 0.0)
+    ikd_std = features.get('ikd_std', 0.0)
+    human_motoric = max(0.0, min(1.0, 0.5*min(1.0, tremor) + 0.5*min(1.0, ikd_std/120.0)))
+
+    ctx = 0.0
+    if features.get('new_beneficiary',0)==1: ctx += 0.3
+    if features.get('amount',0) > 10000: ctx += 0.4
+    if features.get('paste_count',0) >= 1: ctx += 0.2
+
+    risk = w['bot_context']*bot_ctx + w['human_motoric']*(1-human_motoric) + w['contextual_risk']*ctx
+    scores = {'bot_context': round(bot_ctx,3), 'human_motoric': round(human_motoric,3), 'contextual_risk': round(ctx,3)}
+
+    # Session window aggregates (trust_core.sessions); absent for stateless callers,
+    # which then score exactly as before.
+    if 'sess_attempts' in features:
+        sess = 0.0
+        if features.get('sess_attempts',0) > 10: sess += 0.4
+        if features.get('sess_high_amount',0) >= 3: sess += 0.3
+        if features.get('sess_denies',0) >= 2: sess += 0.2
+        if features.get('sess_challenge_fails',0) >= 2: sess += 0.3
+        sess = min(1.0, sess)
+        risk = min(1.0, risk + w['session']*sess)
+        scores['session_risk'] = round(sess,3)
+
+    return {'scores': scores, 'risk_score': round(risk,3)}
@@ -0,0 +1,112 @@
+"""Per-session sliding-window state for streaming risk features.
+
+``SessionStore`` keeps, per ``session_id``, a ring buffer of recent events (attempts with
+their amount, decisions, challenge outcomes) and running totals over them. Events older
+than ``window_s`` fall off the front as time moves, and so does the oldest event once a
+session holds ``capacity`` of them, so every update is O(1) amortized and counts saturate
+at ``capacity``. Sessions idle for ``ttl_s`` are evicted, and the store never holds more
+than ``max_sessions`` (least recently seen go first).
+
+``observe_attempt`` returns the window aggregates, including the attempt just observed,
+as ``sess_*`` features for ``trust_core.scoring.score``.
+"""
+import collections, time
+
+ATTEMPT, DENY, STEP_UP, CHALLENGE_FAIL, CHALLENGE_PASS = range(5)
+SESSION_FEATURES = ('sess_attempts', 'sess_amount_sum', 'sess_high_amount', 'sess_denies',
+                    'sess_step_ups', 'sess_challenge_fails', 'sess_challenge_passes')
+
+class _Session:
+    __slots__ = ('events', 'counts', 'amount_sum', 'high_amount', 'last_seen')
+    def __init__(self):
+        self.events = collections.deque()  # (t, kind, amount)
+        self.counts = [0, 0, 0, 0, 0]
+        self.amount_sum = 0.0
+        self.high_amount = 0
+        self.last_seen = 0.0
+
+class SessionStore:
+    def __init__(self, window_s: float = 60.0, ttl_s: float = 1800.0, max_sessions: int = 100_000,
+                 capacity: int = 64, high_amount: float = 10000.0, clock=time.monotonic):
+        self.window_s = window_s
+        self.ttl_s = ttl_s
+        self.max_sessions = max_sessions
+        self.capacity = capacity
+        self.high_amount = high_amount
+        self.clock = clock
+        self.sessions = collections.OrderedDict()  # least recently seen first
+        self.counters = {'observed': 0, 'evicted_ttl': 0, 'evicted_capacity': 0}
+
+    def _pop(self, s: _Session):
+        _, kind, amount = s.events.popleft()
+        s.counts[kind] -= 1
+        if kind == ATTEMPT:
+            s.amount_sum = s.amount_sum - amount if s.counts[ATTEMPT] else 0.0  # no float drift once empty
+            if amount > self.high_amount: s.high_amount -= 1
+
+    def _session(self, session_id, now):
+        s = self.sessions.get(session_id)
+        if s is None:
+            s = self.sessions[session_id] = _Session()
+        else:
+            self.sessions.move_to_end(session_id)
+        s.last_seen = now
+        self._evict(now)
+        cutoff = now - self.window_s
+        while s.events and s.events[0][0] < cutoff:
+            self._pop(s)
+        return s
+
+    def _evict(self, now):
+        cutoff = now - self.ttl_s
+        while self.sessions:
+            sid, s = next(iter(self.sessions.items()))
+            if s.last_seen < cutoff:
+                self.counters['evicted_ttl'] += 1
+            elif len(self.sessions) > self.max_sessions:
+                self.counters['evicted_capacity'] += 1
+            else:
+                break
+            del self.sessions[sid]
+
+    def _add(self, s: _Session, now, kind, amount=0.0):
+        if len(s.events) >= self.capacity:
+            self._pop(s)
+        s.events.append((now, kind, amount))
+        s.counts[kind] += 1
+        if kind == ATTEMPT:
+            s.amount_sum += amount
+            if amount > self.high_amount: s.high_amount += 1
+
+    def observe_attempt(self, session_id, amount=0.0) -> dict:
+        """Record an attempt and return the session's ``sess_*`` aggregates ({} without a string session id)."""
+        if not session_id or not isinstance(session_id, str): return {}
+        now = self.clock()
+        s = self._session(session_id, now)
+        try:
+            amount = float(amount or 0)
+        except (TypeError, ValueError):
+            amount = 0.0
+        self._add(s, now, ATTEMPT, amount)
+        self.counters['observed'] += 1
+        c = s.counts
+        return {'sess_attempts': c[ATTEMPT], 'sess_amount_sum': round(s.amount_sum, 2),
+                'sess_high_amount': s.high_amount, 'sess_denies': c[DENY], 'sess_step_ups': c[STEP_UP],
+                'sess_challenge_fails': c[CHALLENGE_FAIL], 'sess_challenge_passes': c[CHALLENGE_PASS]}
+
+    def record_decision(self, session_id, action: str):
+        if not session_id or not isinstance(session_id, str): return
+        if action == 'deny': kind = DENY
+        elif action and action.startswith('step_up'): kind = STEP_UP
+        else: return
+        now = self.clock()
+        self._add(self._session(session_id, now), now, kind)
+
+    def record_challenge(self, session_id, passed: bool):
+        if not session_id or not isinstance(session_id, str): return
+        now = self.clock()
+        self._add(self._session(session_id, now), now, CHALLENGE_PASS if passed else CHALLENGE_FAIL)
+
+    def stats(self):
+        return {**self.counters, 'sessions': len(self.sessions), 'max_sessions': self.max_sessions,
+                'window_s': self.window_s, 'ttl_s': self.ttl_s, 'capacity': self.capacity}
@@ -0,0 +1,256 @@
+"""Opt-in request tracing with span timings and a stack-sampled profile of slow requests.
+
+A ``Tracer`` decides per request whether to trace. A traced request gets a ``Trace``
+holding a trace ID and a list of spans, and the trace is made current through a
+context variable, so ``span(name)`` anywhere below it records a timing. ``headers()``
+returns the ``X-Trace-Id`` header to forward downstream. Services wrapped in
+``ServerTiming`` answer traced calls with a ``Server-Timing`` header, so a hop span can
+be split into server time and network/queueing time.
+
+While any sampled trace is open, a sampler thread snapshots every thread's stack every
+``profile_ms`` milliseconds and counts the samples per trace in collapsed form
+(``thread;file:function:line;...``, root first), ready for flamegraph tools. Asyncio
+interleaves requests on one thread, so a sample shows what the process was doing
+while the request was open, not only the request's own frames. Traces that take at
+least ``slow_ms`` are kept in a ring buffer of ``capacity`` entries, and faster ones are
+dropped.
+
+When a request is not traced, ``span()`` is a context-variable read that returns a
+shared no-op object, and ``headers()`` returns None. The sampler thread sleeps until a
+trace starts.
+"""
+import collections, contextvars, ipaddress, os, random, sys, threading, time, uuid
+
+HEADER = 'x-trace-id'
+
+_current = contextvars.ContextVar('trace', default=None)
+
+class Trace:
+    def __init__(self, trace_id: str, name: str):
+        self.id = trace_id
+        self.name = name
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.spans = []  # (name, start_ms, duration_ms, attrs, error)
+        self.attrs = {}
+        self.profile = collections.Counter()
+        self.samples = 0
+        self.duration_ms = None
+        self.token = None
+
+    def to_dict(self, top: int = 50):
+        return {'trace_id': self.id, 'name': self.name, 'started_at': self.started_at,
+                'duration_ms': round(self.duration_ms, 3), 'attrs': self.attrs,
+                'spans': [{'name': n, 'start_ms': round(s, 3), 'duration_ms': round(d, 3), **a,
+                           **({'error': True} if e else {})} for n, s, d, a, e in self.spans],
+                'profile': {'samples': self.samples,
+                            'stacks': [{'stack': k, 'count': c} for k, c in self.profile.most_common(top)]}}
+
+class Span:
+    __slots__ = ('trace', 'name', 't0', 'attrs')
+    def __init__(self, trace: Trace, name: str):
+        self.trace, self.name, self.attrs = trace, name, {}
+
+    def set(self, key, value):
+        self.attrs[key] = value
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        t = self.trace
+        t.spans.append((self.name, (self.t0 - t.t0)*1000, (time.perf_counter() - self.t0)*1000, self.attrs,
+                        exc_type is not None))
+        return False
+
+class _NoSpan:
+    __slots__ = ()
+    def set(self, key, value): pass
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc, tb): return False
+
+NO_SPAN = _NoSpan()
+
+def current():
+    return _current.get()
+
+def span(name: str):
+    """A span under the current trace, or the shared no-op when the request is not traced."""
+    tr = _current.get()
+    return NO_SPAN if tr is None else Span(tr, name)
+
+def headers():
+    tr = _current.get()
+    return None if tr is None else {HEADER: tr.id}
+
+def server_ms(response_headers):
+    """Total ``dur`` in a ``Server-Timing`` response header, or None."""
+    v = response_headers.get('server-timing')
+    if not v: return None
+    total = 0.0
+    for metric in v.split(','):
+        for param in metric.split(';')[1:]:
+            k, _, d = param.strip().partition('=')
+            if k == 'dur':
+                try: total += float(d)
+                except ValueError: pass
+    return total
+
+def _collapse(frame, limit=64):
+    parts = []
+    while frame is not None and len(parts) < limit:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ';'.join(reversed(parts))
+
+_IDLE = ('threading.py', 'queue.py', 'thread.py', 'selectors.py', 'connection.py')
+
+class StackSampler:
+    """Samples all thread stacks into every open trace; idle only while no trace is open."""
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms/1000
+        self.active = set()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def add(self, trace: Trace):
+        with self.lock:
+            self.active.add(trace)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='trace-sampler', daemon=True)
+                self.thread.start()
+            self.wake.set()
+
+    def discard(self, trace: Trace):
+        with self.lock:
+            self.active.discard(trace)
+            if not self.active: self.wake.clear()
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            self.wake.wait()
+            with self.lock:
+                traces = list(self.active)
+            if not traces: continue
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = []
+            for tid, frame in sys._current_frames().items():
+                if tid == me: continue
+                # parked and waiting helper threads add nothing but noise; the main thread is always kept
+                if tid != threading.main_thread().ident and frame.f_code.co_filename.endswith(_IDLE): continue
+                stacks.append(f"{names.get(tid, tid)};{_collapse(frame)}")
+            for tr in traces:
+                tr.samples += 1
+                tr.profile.update(stacks)
+            time.sleep(self.interval)
+
+class Tracer:
+    """Decides which requests to trace and keeps the slow ones.
+
+    ``sample`` is the fraction of requests traced (0 turns tracing off). An inbound
+    ``X-Trace-Id`` is honoured only from a client in ``trusted_nets`` (internal hops): that
+    request is always traced under the ID while tracing is on, but records spans only and
+    never starts the stack sampler. Any other client's ID is ignored and the sample rate
+    applies, so callers cannot force tracing or profiling. ``profile_ms`` of 0 disables
+    the stack sampler.
+    """
+    def __init__(self, sample: float = 0.0, slow_ms: float = 250.0, profile_ms: float = 5.0, capacity: int = 100,
+                 trusted_nets=()):
+        self.sample = sample
+        self.trusted_nets = [ipaddress.ip_network(n, strict=False) for n in trusted_nets]
+        self.slow_ms = slow_ms
+        self.profile_ms = profile_ms
+        self.buffer = collections.deque(maxlen=capacity)
+        self.sampler = StackSampler(profile_ms) if profile_ms > 0 else None
+        self.counters = {'traced': 0, 'kept': 0, 'forced': 0, 'ignored_ids': 0}
+
+    @property
+    def enabled(self):
+        return self.sample > 0
+
+    def trusts(self, host) -> bool:
+        if not host or not self.trusted_nets: return False
+        try: addr = ipaddress.ip_address(host)
+        except ValueError: return False
+        return any(addr in net for net in self.trusted_nets)
+
+    def begin(self, name: str, trace_id: str = None, client: str = None):
+        """Start a trace for this request and make it current, or return None if it is not sampled.
+
+        ``client`` is the peer address, checked against ``trusted_nets`` before ``trace_id`` is honoured.
+        """
+        if self.sample <= 0: return None
+        forced = trace_id is not None and self.trusts(client)
+        if trace_id is not None and not forced: self.counters['ignored_ids'] += 1
+        if not forced:
+            if self.sample < 1 and random.random() >= self.sample: return None
+            trace_id = uuid.uuid4().hex[:16]
+        tr = Trace(trace_id[:64], name)
+        tr.token = _current.set(tr)
+        if forced:
+            self.counters['forced'] += 1
+        elif self.sampler is not None:
+            self.sampler.add(tr)
+        return tr
+
+    def end(self, tr: Trace, **attrs):
+        if tr is None: return
+        if self.sampler is not None:
+            self.sampler.discard(tr)
+        _current.reset(tr.token)
+        tr.duration_ms = (time.perf_counter() - tr.t0)*1000
+        tr.attrs.update(attrs)
+        self.counters['traced'] += 1
+        if tr.duration_ms >= self.slow_ms:
+            self.counters['kept'] += 1
+            self.buffer.append(tr)
+
+    def configure(self, sample: float = None, slow_ms: float = None):
+        if sample is not None: self.sample = float(sample)
+        if slow_ms is not None: self.slow_ms = float(slow_ms)
+
+    def traces(self, limit: int = 20, min_ms: float = 0.0):
+        """Summaries of kept traces, newest first."""
+        out = []
+        for tr in reversed(self.buffer):
+            if tr.duration_ms < min_ms: continue
+            out.append({'trace_id': tr.id, 'name': tr.name, 'started_at': tr.started_at,
+                        'duration_ms': round(tr.duration_ms, 3), 'attrs': tr.attrs,
+                        'slowest_span': max(((n, round(d, 3)) for n, _, d, _, _ in tr.spans),
+                                            key=lambda x: x[1], default=None)})
+            if len(out) >= limit: break
+        return out
+
+    def get(self, trace_id: str):
+        for tr in reversed(self.buffer):
+            if tr.id == trace_id: return tr.to_dict()
+        return None
+
+    def stats(self):
+        return {**self.counters, 'sample': self.sample, 'slow_ms': self.slow_ms, 'profile_ms': self.profile_ms,
+                'trusted_nets': [str(n) for n in self.trusted_nets], 'buffered': len(self.buffer),
+                'capacity': self.buffer.maxlen}
+
+class ServerTiming:
+    """ASGI middleware: answers requests carrying ``X-Trace-Id`` with ``Server-Timing: app;dur=<ms>``.
+
+    Requests without the header pass straight through.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not any(k == b'x-trace-id' for k, _ in scope['headers']):
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        async def timed_send(message):
+            if message['type'] == 'http.response.start':
+                dur = (time.perf_counter() - t0)*1000
+                message = {**message, 'headers': [*message.get('headers', []),
+                                                  (b'server-timing', f'app;dur={dur:.3f}'.encode())]}
+            await send(message)
+        await self.app(scope, receive, timed_send)